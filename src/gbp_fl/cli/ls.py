@@ -20,7 +20,7 @@ class ContentFileDict(TypedDict):
     """ContentFiles dict returned from queries"""
 
     path: str
-    size: int
+    size: int | None
     timestamp: str
 
 
@@ -81,7 +81,7 @@ def format_row(item: ContentFileDict) -> tuple[str, str, str]:
         dt.datetime.fromisoformat(item["timestamp"]).astimezone(render.LOCAL_TIMEZONE)
     )
     return (
-        f"[filesize]{item['size']}[/filesize]",
+        f"[filesize]{utils.format_size(item['size'])}[/filesize]",
         f"[timestamp]{timestamp}[/timestamp]",
         f"[tag]{item['path']}[/tag]",
     )
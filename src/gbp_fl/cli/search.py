@@ -11,8 +11,13 @@ from gbpcli.types import Console
 from rich import box
 from rich.table import Table
 
+from gbp_fl.utils import format_size
+
 HELP = "Search for files in packages"
 
+# The number of results fetched (and printed) at a time
+PAGE_SIZE = 500
+
 
 def handler(args: argparse.Namespace, gbp: GBP, console: Console) -> int:
     """Search for files in packages"""
@@ -25,30 +30,108 @@ def handler(args: argparse.Namespace, gbp: GBP, console: Console) -> int:
     else:
         machines = None
 
-    data, _ = gbp.query.gbp_fl.searchv2(key=args.key, machines=machines)  # type: ignore
+    after: str | None = None
+    show_header = True
+
+    while True:
+        data, errors = gbp.query.gbp_fl.searchpage(  # type: ignore
+            key=args.key,
+            machines=machines,
+            regex=args.regex,
+            first=PAGE_SIZE,
+            after=after,
+        )
+
+        if errors and after is None and is_unknown_field(errors, "flSearchPage"):
+            # The server predates flSearchPage
+            return search_v2(args, machines, gbp, console)
+
+        if errors:
+            console.err.print(f"[red]{errors[0]['message']}[/red]")
+            return 1
+
+        page = data["flSearchPage"]
+
+        if content_files := page["contentFiles"]:
+            print_content_files(content_files, args, console, show_header=show_header)
+            show_header = False
+
+        if not page["hasNextPage"]:
+            return 0
+
+        after = page["endCursor"]
+
+
+def search_v2(
+    args: argparse.Namespace, machines: list[str] | None, gbp: GBP, console: Console
+) -> int:
+    """Search for files in packages using the (unpaged) flSearchV2 query"""
+    data, errors = gbp.query.gbp_fl.searchv2(  # type: ignore
+        key=args.key, machines=machines, regex=args.regex
+    )
+
+    if errors:
+        console.err.print(f"[red]{errors[0]['message']}[/red]")
+        return 1
 
     if content_files := data["flSearchV2"]:
-        table = create_table()
-        row = table.add_row
+        print_content_files(content_files, args, console)
 
-        for item in content_files:
-            row(*format_content_file(item, args))
-        console.out.print(table)
     return 0
 
 
+def is_unknown_field(errors: list[dict[str, Any]], field_name: str) -> bool:
+    """Return True if the GraphQL errors say the server has no such Query field"""
+    prefixes = tuple(
+        f"Cannot query field {quote}{field_name}{quote}" for quote in "'\""
+    )
+
+    return any(error["message"].startswith(prefixes) for error in errors)
+
+
+def print_content_files(
+    content_files: list[dict[str, Any]],
+    args: argparse.Namespace,
+    console: Console,
+    *,
+    show_header: bool = True,
+) -> None:
+    """Print a table of the given content files to the console's standard output"""
+    table = create_table(show_header=show_header)
+    row = table.add_row
+
+    for item in content_files:
+        row(*format_content_file(item, args))
+    console.out.print(table)
+
+
 def parse_args(parser: argparse.ArgumentParser) -> None:
     """Set subcommand arguments"""
     parser.add_argument(
         "--machine", "-m", default=None, help="Restrict search to the given machine"
     )
     parser.add_argument("--mine", action="store_true", default=False)
-    parser.add_argument("key")
+    parser.add_argument(
+        "--regex",
+        "-r",
+        action="store_true",
+        default=False,
+        help="Search file names matching the key as a regular expression",
+    )
+    parser.add_argument(
+        "key",
+        help='File name to search for. Use a trailing "/" to list the files under a'
+        " directory",
+    )
+
 
+def create_table(*, show_header: bool = True) -> Table:
+    """Create table for displaying ContentFiles
 
-def create_table() -> Table:
-    """Create table for displaying ContentFiles"""
-    table = Table(box=box.ROUNDED, style="box")
+    Results are printed a page at a time, so the tables of the pages after the first
+    have no header.
+    """
+    table = Table(box=box.ROUNDED, style="box", show_header=show_header)
     table.add_column("Size", justify="right", header_style="header")
     table.add_column("Timestamp", header_style="header")
     table.add_column("Package", header_style="header", overflow="fold")
@@ -70,7 +153,7 @@ def format_content_file(
         dt.datetime.fromisoformat(cf.timestamp).astimezone(render.LOCAL_TIMEZONE)
     )
     return (
-        f"[filesize]{cf.size}[/filesize]",
+        f"[filesize]{format_size(cf.size)}[/filesize]",
         f"[timestamp]{timestamp}[/timestamp]",
         (
             f"[machine]{machine}[/machine]"
@@ -0,0 +1,173 @@
+"""Streaming decompressors for binpkg tarballs
+
+The inner tarballs of a gpkg are compressed according to Portage's BINPKG_COMPRESS.
+Python's tarfile module handles gzip, bzip2 and xz itself. Other formats are handled
+by decompressors registered under the "gbp_fl.decompressors" entry point group, named
+by the file suffix they handle (without the dot). A decompressor is a callable that is
+given the compressed file object and returns a readable file object of the
+decompressed data.
+
+Large tarballs can instead be piped through an external (multithreaded) decompressor
+program. See EXTERNAL_DECOMPRESSORS.
+"""
+
+import importlib.metadata
+import shutil
+import subprocess as sp
+import threading
+from contextlib import ExitStack, contextmanager
+from functools import cache
+from pathlib import PurePath as Path
+from tarfile import TarFile
+from typing import IO, Callable, Iterator, cast
+
+Decompressor = Callable[[IO[bytes]], IO[bytes]]
+
+BUFSIZE = 1024 * 1024
+
+# External decompressor commands by file suffix. The commands read the compressed data
+# from stdin and write the decompressed data to stdout
+EXTERNAL_DECOMPRESSORS: dict[str, tuple[str, ...]] = {
+    "bz2": ("pbzip2", "-d", "-c"),
+    "gz": ("pigz", "-d", "-c"),
+    "lz4": ("lz4", "-d", "-c"),
+    "xz": ("xz", "-d", "-c", "-T0"),
+    "zst": ("zstd", "-d", "-c", "-T0"),
+}
+
+
+class UnsupportedCompression(Exception):
+    """No backend is available for the compression format"""
+
+
+class ExternalDecompressorError(Exception):
+    """The external decompressor failed"""
+
+
+@cache
+def get_decompressor(suffix: str) -> Decompressor | None:
+    """Return the Decompressor registered for the given suffix
+
+    If there is none, return None.
+    """
+    eps = importlib.metadata.entry_points(group="gbp_fl.decompressors", name=suffix)
+
+    for ep in eps:
+        return cast(Decompressor, ep.load())
+
+    return None
+
+
+@cache
+def get_external_decompressor(suffix: str) -> tuple[str, ...] | None:
+    """Return the external decompressor command for the given suffix
+
+    If there is none, or it is not installed, return None.
+    """
+    command = EXTERNAL_DECOMPRESSORS.get(suffix)
+
+    if command is None or shutil.which(command[0]) is None:
+        return None
+
+    return command
+
+
+@contextmanager
+def open_tarfile(
+    name: str, fileobj: IO[bytes], *, external: bool = False
+) -> Iterator[TarFile]:
+    """Open the (possibly compressed) tarball in fileobj for reading
+
+    `name` is the tarball's name and its suffix determines the decompressor used. If
+    `external` is True and there is an external decompressor installed for the suffix
+    then that is used. Else if there is a registered Decompressor for the suffix then
+    that is used. In either case the tarball is read as a stream so its members should
+    only be accessed in order. Otherwise tarfile's own decompression is used.
+    """
+    suffix = Path(name).suffix.removeprefix(".")
+
+    with ExitStack() as stack:
+        if external and (command := get_external_decompressor(suffix)):
+            stream = stack.enter_context(external_stream(command, fileobj))
+            tarfile = TarFile.open(mode="r|", fileobj=stream)
+        elif (decompressor := get_decompressor(suffix)) is None:
+            tarfile = TarFile.open(mode="r", fileobj=fileobj)
+        else:
+            stream = stack.enter_context(decompressor(fileobj))
+            tarfile = TarFile.open(mode="r|", fileobj=stream)
+
+        try:
+            yield tarfile
+        finally:
+            tarfile.close()
+
+
+@contextmanager
+def external_stream(
+    command: tuple[str, ...], fileobj: IO[bytes]
+) -> Iterator[IO[bytes]]:
+    """Pipe fileobj through the given external decompressor command
+
+    Yield the command's stdout. The data is fed to the command from a separate thread.
+    If the context is exited without error and the command fails, raise
+    ExternalDecompressorError.
+    """
+    proc = sp.Popen(command, stdin=sp.PIPE, stdout=sp.PIPE, stderr=sp.DEVNULL)
+    stdin, stdout = cast(IO[bytes], proc.stdin), cast(IO[bytes], proc.stdout)
+    feeder = threading.Thread(target=feed, args=(fileobj, stdin), daemon=True)
+    feeder.start()
+
+    try:
+        yield stdout
+
+        # tarfile stops reading at the end-of-archive marker. Drain the rest so that
+        # the command can exit cleanly
+        while stdout.read(BUFSIZE):
+            pass
+    finally:
+        stdout.close()
+        returncode = proc.wait()
+        feeder.join()
+
+    if returncode != 0:
+        raise ExternalDecompressorError(f"{command[0]} exited with status {returncode}")
+
+
+def feed(source: IO[bytes], dest: IO[bytes]) -> None:
+    """Copy source to dest and close dest
+
+    Stop early if dest is closed from the other end.
+    """
+    try:
+        shutil.copyfileobj(source, dest, BUFSIZE)
+    except (BrokenPipeError, ValueError):
+        pass
+    finally:
+        try:
+            dest.close()
+        except BrokenPipeError:
+            pass
+
+
+def zstd(fileobj: IO[bytes]) -> IO[bytes]:
+    """Zstandard Decompressor
+
+    Uses compression.zstd from the standard library (Python 3.14+) if available,
+    otherwise the zstandard package.
+    """
+    try:
+        # pylint: disable=import-outside-toplevel
+        from compression.zstd import ZstdFile  # type: ignore[import-not-found]
+    except ImportError:
+        pass
+    else:
+        return cast(IO[bytes], ZstdFile(fileobj))
+
+    try:
+        import zstandard  # pylint: disable=import-outside-toplevel
+    except ImportError as error:
+        raise UnsupportedCompression(
+            "zstd requires Python 3.14 or the zstandard package"
+        ) from error
+
+    return cast(IO[bytes], zstandard.ZstdDecompressor().stream_reader(fileobj))
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+def zero_unknown_sizes(apps, schema_editor):
+    """Give the files of unknown size a size of 0 so the column can be NOT NULL"""
+    db = schema_editor.connection.alias
+    content_files = apps.get_model("gbp_fl", "ContentFile").objects.using(db)
+
+    content_files.filter(size=None).update(size=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("gbp_fl", "0001_initial")]
+
+    operations = [
+        migrations.AlterField(
+            model_name="contentfile", name="size", field=models.IntegerField(null=True)
+        ),
+        migrations.RunPython(migrations.RunPython.noop, zero_unknown_sizes),
+    ]
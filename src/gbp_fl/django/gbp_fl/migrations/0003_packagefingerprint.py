@@ -0,0 +1,39 @@
+# Generated by Django 5.1.5 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("gbp_fl", "0002_alter_contentfile_size")]
+
+    operations = [
+        migrations.CreateModel(
+            name="PackageFingerprint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("machine", models.CharField(max_length=255)),
+                ("build_id", models.CharField(max_length=255)),
+                ("cpvb", models.CharField(max_length=255)),
+                ("fingerprint", models.CharField(db_index=True, max_length=255)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        models.F("machine"),
+                        models.F("build_id"),
+                        models.F("cpvb"),
+                        name="unique_fingerprint_package",
+                    )
+                ]
+            },
+        )
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.5 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("gbp_fl", "0003_packagefingerprint")]
+
+    operations = [
+        migrations.CreateModel(
+            name="PackageIndex",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("machine", models.CharField(max_length=255)),
+                ("build_id", models.CharField(max_length=255)),
+                ("cpvb", models.CharField(max_length=255)),
+                (
+                    "state",
+                    models.CharField(
+                        choices=[
+                            ("pending", "pending"),
+                            ("done", "done"),
+                            ("failed", "failed"),
+                        ],
+                        max_length=16,
+                    ),
+                ),
+                ("file_count", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        models.F("machine"),
+                        models.F("build_id"),
+                        models.F("cpvb"),
+                        name="unique_package_index",
+                    )
+                ]
+            },
+        )
+    ]
@@ -0,0 +1,182 @@
+# Generated by Django 5.1.5 on 2026-10-17 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Create a Build and BinPkg row for each distinct build and package of the existing
+# ContentFiles and point the ContentFiles at their BinPkg
+POPULATE_SQL = [
+    """
+    INSERT INTO gbp_fl_build (machine, build_id)
+    SELECT DISTINCT machine, build_id FROM gbp_fl_contentfile
+    """,
+    """
+    INSERT INTO gbp_fl_binpkg (build_id, cpvb, repo, build_time)
+    SELECT b.id, f.cpvb, MAX(f.repo), MAX(f.timestamp)
+    FROM gbp_fl_contentfile f
+    JOIN gbp_fl_build b ON b.machine = f.machine AND b.build_id = f.build_id
+    GROUP BY b.id, f.cpvb
+    """,
+    """
+    UPDATE gbp_fl_contentfile SET binpkg_id = (
+        SELECT p.id FROM gbp_fl_binpkg p
+        JOIN gbp_fl_build b ON b.id = p.build_id
+        WHERE b.machine = gbp_fl_contentfile.machine
+        AND b.build_id = gbp_fl_contentfile.build_id
+        AND p.cpvb = gbp_fl_contentfile.cpvb
+    )
+    """,
+]
+
+# The reverse of POPULATE_SQL: copy the Build and BinPkg fields back to the ContentFiles
+DEPOPULATE_SQL = [
+    """
+    UPDATE gbp_fl_contentfile SET
+    machine = (
+        SELECT b.machine FROM gbp_fl_binpkg p
+        JOIN gbp_fl_build b ON b.id = p.build_id
+        WHERE p.id = gbp_fl_contentfile.binpkg_id
+    ),
+    build_id = (
+        SELECT b.build_id FROM gbp_fl_binpkg p
+        JOIN gbp_fl_build b ON b.id = p.build_id
+        WHERE p.id = gbp_fl_contentfile.binpkg_id
+    ),
+    cpvb = (
+        SELECT p.cpvb FROM gbp_fl_binpkg p WHERE p.id = gbp_fl_contentfile.binpkg_id
+    ),
+    repo = (
+        SELECT p.repo FROM gbp_fl_binpkg p WHERE p.id = gbp_fl_contentfile.binpkg_id
+    )
+    """
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("gbp_fl", "0004_packageindex")]
+
+    operations = [
+        migrations.CreateModel(
+            name="Build",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("machine", models.CharField(max_length=255)),
+                ("build_id", models.CharField(max_length=255)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        models.F("machine"),
+                        models.F("build_id"),
+                        name="unique_fl_build",
+                    )
+                ]
+            },
+        ),
+        migrations.CreateModel(
+            name="BinPkg",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("cpvb", models.CharField(max_length=255)),
+                ("repo", models.CharField(max_length=127)),
+                ("build_time", models.DateTimeField()),
+                (
+                    "build",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="binpkgs",
+                        to="gbp_fl.build",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        models.F("build"), models.F("cpvb"), name="unique_binpkg"
+                    )
+                ]
+            },
+        ),
+        migrations.RemoveConstraint(model_name="contentfile", name="unique_path"),
+        migrations.RemoveIndex(model_name="contentfile", name="idx_build"),
+        migrations.RemoveIndex(model_name="contentfile", name="idx_build_cpvb"),
+        migrations.AddField(
+            model_name="contentfile",
+            name="binpkg",
+            field=models.ForeignKey(
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="files",
+                to="gbp_fl.binpkg",
+            ),
+        ),
+        migrations.RunSQL(POPULATE_SQL, DEPOPULATE_SQL),
+        # Give the removed fields a default so that they can be re-added when the
+        # migration is reversed
+        migrations.AlterField(
+            model_name="contentfile",
+            name="machine",
+            field=models.CharField(default="", max_length=255),
+        ),
+        migrations.AlterField(
+            model_name="contentfile",
+            name="build_id",
+            field=models.CharField(default="", max_length=255),
+        ),
+        migrations.AlterField(
+            model_name="contentfile",
+            name="cpvb",
+            field=models.CharField(default="", max_length=255),
+        ),
+        migrations.AlterField(
+            model_name="contentfile",
+            name="repo",
+            field=models.CharField(default="", max_length=127),
+        ),
+        migrations.RemoveField(model_name="contentfile", name="machine"),
+        migrations.RemoveField(model_name="contentfile", name="build_id"),
+        migrations.RemoveField(model_name="contentfile", name="cpvb"),
+        migrations.RemoveField(model_name="contentfile", name="repo"),
+        migrations.AlterField(
+            model_name="contentfile",
+            name="binpkg",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="files",
+                to="gbp_fl.binpkg",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="contentfile",
+            constraint=models.UniqueConstraint(
+                models.F("binpkg"), models.F("path"), name="unique_path"
+            ),
+        ),
+        migrations.AlterModelOptions(
+            name="contentfile",
+            options={
+                "get_latest_by": ["timestamp"],
+                "ordering": ["binpkg__build__machine", "timestamp"],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.5 on 2026-10-17 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("gbp_fl", "0005_build_binpkg")]
+
+    operations = [
+        migrations.CreateModel(
+            name="Directory",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("path", models.CharField(max_length=1023)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(models.F("path"), name="unique_directory")
+                ]
+            },
+        ),
+        migrations.RemoveConstraint(model_name="contentfile", name="unique_path"),
+        migrations.AddField(
+            model_name="contentfile",
+            name="directory",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="files",
+                to="gbp_fl.directory",
+            ),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.1.5 on 2026-10-17 12:00
+
+import posixpath
+
+from django.db import migrations, transaction
+
+# The number of ContentFile rows converted per transaction
+BATCH_SIZE = 10_000
+
+
+def populate_directories(apps, schema_editor):
+    """Point each ContentFile at the Directory of its path
+
+    The rows are converted in batches, each in its own transaction, so the table is
+    not locked for the whole conversion.
+    """
+    db = schema_editor.connection.alias
+    content_files = apps.get_model("gbp_fl", "ContentFile").objects.using(db)
+    directories = apps.get_model("gbp_fl", "Directory")
+    last_id = 0
+
+    while True:
+        with transaction.atomic(using=db):
+            rows = list(
+                content_files.filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", "path")[:BATCH_SIZE]
+            )
+            if not rows:
+                break
+
+            paths = {row_id: posixpath.split(path)[0] for row_id, path in rows}
+            directories.objects.using(db).bulk_create(
+                [directories(path=path) for path in set(paths.values())],
+                ignore_conflicts=True,
+            )
+            ids = dict(
+                directories.objects.using(db)
+                .filter(path__in=set(paths.values()))
+                .values_list("path", "id")
+            )
+            content_files.bulk_update(
+                [
+                    content_files.model(id=row_id, directory_id=ids[path])
+                    for row_id, path in paths.items()
+                ],
+                ["directory"],
+                batch_size=1_000,
+            )
+            last_id = rows[-1][0]
+
+
+def depopulate_directories(apps, schema_editor):
+    """The reverse of populate_directories(): fill in the ContentFile paths"""
+    db = schema_editor.connection.alias
+    content_files = apps.get_model("gbp_fl", "ContentFile").objects.using(db)
+    last_id = 0
+
+    while True:
+        with transaction.atomic(using=db):
+            rows = list(
+                content_files.filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", "directory__path", "basename")[:BATCH_SIZE]
+            )
+            if not rows:
+                break
+
+            content_files.bulk_update(
+                [
+                    content_files.model(
+                        id=row_id, path=posixpath.join(directory, basename)
+                    )
+                    for row_id, directory, basename in rows
+                ],
+                ["path"],
+                batch_size=1_000,
+            )
+            last_id = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    # Each batch of populate_directories() is committed separately
+    atomic = False
+
+    dependencies = [("gbp_fl", "0006_directory")]
+
+    operations = [migrations.RunPython(populate_directories, depopulate_directories)]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.5 on 2026-10-17 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("gbp_fl", "0007_populate_directories")]
+
+    operations = [
+        # Give the removed field a default so that it can be re-added when the
+        # migration is reversed
+        migrations.AlterField(
+            model_name="contentfile",
+            name="path",
+            field=models.CharField(default="", max_length=1023),
+        ),
+        migrations.RemoveField(model_name="contentfile", name="path"),
+        migrations.AlterField(
+            model_name="contentfile",
+            name="directory",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="files",
+                to="gbp_fl.directory",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="contentfile",
+            constraint=models.UniqueConstraint(
+                models.F("binpkg"),
+                models.F("directory"),
+                models.F("basename"),
+                name="unique_path",
+            ),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.1.5 on 2026-10-17 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("gbp_fl", "0008_remove_contentfile_path")]
+
+    operations = [
+        migrations.CreateModel(
+            name="PackageContents",
+            fields=[
+                (
+                    "binpkg",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="contents",
+                        serialize=False,
+                        to="gbp_fl.binpkg",
+                    ),
+                ),
+                ("file_count", models.PositiveIntegerField()),
+                ("files", models.BinaryField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="PackageBasename",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("basename", models.CharField(db_index=True, max_length=255)),
+                (
+                    "binpkg",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="basenames",
+                        to="gbp_fl.binpkg",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        models.F("binpkg"),
+                        models.F("basename"),
+                        name="unique_package_basename",
+                    )
+                ]
+            },
+        ),
+    ]
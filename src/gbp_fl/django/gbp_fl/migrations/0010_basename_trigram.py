@@ -0,0 +1,101 @@
+# Generated by Django 5.1.5 on 2026-10-17 12:00
+
+from django.db import DatabaseError, migrations, transaction
+
+# The trigram index for infix and suffix searches of ContentFile basenames.
+#
+# On PostgreSQL this is a pg_trgm GIN index on gbp_fl_contentfile.basename, which the
+# planner uses for LIKE '%...%' directly. On SQLite it's an FTS5 trigram table whose
+# content is gbp_fl_contentfile and which is kept up to date by triggers.
+#
+# Creating the index is skipped when the database doesn't support it (e.g. pg_trgm is
+# not available or SQLite was built without FTS5). Searches then fall back to
+# scanning.
+POSTGRESQL_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE INDEX IF NOT EXISTS gbp_fl_contentfile_basename_trgm
+    ON gbp_fl_contentfile USING gin (basename gin_trgm_ops)
+    """,
+]
+POSTGRESQL_REVERSE_SQL = ["DROP INDEX IF EXISTS gbp_fl_contentfile_basename_trgm"]
+
+# The triggers are dropped along with gbp_fl_contentfile when SQLite remakes the table
+# (e.g. to add a column), so migrations doing so need to re-create them
+SQLITE_TRIGGERS_SQL = [
+    """
+    CREATE TRIGGER gbp_fl_basename_trigram_insert AFTER INSERT ON gbp_fl_contentfile
+    BEGIN
+        INSERT INTO gbp_fl_basename_trigram (rowid, basename)
+        VALUES (new.id, new.basename);
+    END
+    """,
+    """
+    CREATE TRIGGER gbp_fl_basename_trigram_delete AFTER DELETE ON gbp_fl_contentfile
+    BEGIN
+        INSERT INTO gbp_fl_basename_trigram (gbp_fl_basename_trigram, rowid, basename)
+        VALUES ('delete', old.id, old.basename);
+    END
+    """,
+    """
+    CREATE TRIGGER gbp_fl_basename_trigram_update
+    AFTER UPDATE OF basename ON gbp_fl_contentfile
+    BEGIN
+        INSERT INTO gbp_fl_basename_trigram (gbp_fl_basename_trigram, rowid, basename)
+        VALUES ('delete', old.id, old.basename);
+        INSERT INTO gbp_fl_basename_trigram (rowid, basename)
+        VALUES (new.id, new.basename);
+    END
+    """,
+]
+SQLITE_DROP_TRIGGERS_SQL = [
+    "DROP TRIGGER IF EXISTS gbp_fl_basename_trigram_insert",
+    "DROP TRIGGER IF EXISTS gbp_fl_basename_trigram_delete",
+    "DROP TRIGGER IF EXISTS gbp_fl_basename_trigram_update",
+]
+
+SQLITE_SQL = [
+    """
+    CREATE VIRTUAL TABLE gbp_fl_basename_trigram USING fts5(
+        basename, tokenize='trigram', content='gbp_fl_contentfile', content_rowid='id'
+    )
+    """,
+    *SQLITE_TRIGGERS_SQL,
+    "INSERT INTO gbp_fl_basename_trigram (gbp_fl_basename_trigram) VALUES ('rebuild')",
+]
+SQLITE_REVERSE_SQL = [
+    *SQLITE_DROP_TRIGGERS_SQL,
+    "DROP TABLE IF EXISTS gbp_fl_basename_trigram",
+]
+
+SQL = {
+    "postgresql": (POSTGRESQL_SQL, POSTGRESQL_REVERSE_SQL),
+    "sqlite": (SQLITE_SQL, SQLITE_REVERSE_SQL),
+}
+
+
+def create_trigram_index(apps, schema_editor):
+    """Create the trigram index if the database supports it"""
+    sql, _ = SQL.get(schema_editor.connection.vendor, ([], []))
+
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            for statement in sql:
+                schema_editor.execute(statement)
+    except DatabaseError:
+        pass
+
+
+def drop_trigram_index(apps, schema_editor):
+    """Drop the trigram index, if any"""
+    _, sql = SQL.get(schema_editor.connection.vendor, ([], []))
+
+    for statement in sql:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("gbp_fl", "0009_packagecontents_packagebasename")]
+
+    operations = [migrations.RunPython(create_trigram_index, drop_trigram_index)]
@@ -0,0 +1,76 @@
+# Generated by Django 5.1.5 on 2026-10-17 12:00
+
+from importlib import import_module
+
+from django.db import migrations, models, transaction
+
+# The number of ContentFile rows converted per transaction
+BATCH_SIZE = 10_000
+
+trigram = import_module("gbp_fl.django.gbp_fl.migrations.0010_basename_trigram")
+
+
+def populate_reversed_basenames(apps, schema_editor):
+    """Fill in the reversed_basename of each ContentFile
+
+    The rows are converted in batches, each in its own transaction, so the table is
+    not locked for the whole conversion.
+    """
+    db = schema_editor.connection.alias
+    content_files = apps.get_model("gbp_fl", "ContentFile").objects.using(db)
+    last_id = 0
+
+    while True:
+        with transaction.atomic(using=db):
+            rows = list(
+                content_files.filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", "basename")[:BATCH_SIZE]
+            )
+            if not rows:
+                break
+
+            content_files.bulk_update(
+                [
+                    content_files.model(id=row_id, reversed_basename=basename[::-1])
+                    for row_id, basename in rows
+                ],
+                ["reversed_basename"],
+                batch_size=1_000,
+            )
+            last_id = rows[-1][0]
+
+
+def restore_trigram_triggers(apps, schema_editor):
+    """Re-create the trigram table's triggers if SQLite dropped them
+
+    SQLite adds and removes the column by remaking gbp_fl_contentfile, which drops
+    its triggers.
+    """
+    connection = schema_editor.connection
+
+    if (
+        connection.vendor == "sqlite"
+        and "gbp_fl_basename_trigram" in connection.introspection.table_names()
+    ):
+        for statement in trigram.SQLITE_DROP_TRIGGERS_SQL + trigram.SQLITE_TRIGGERS_SQL:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [("gbp_fl", "0010_basename_trigram")]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_trigram_triggers),
+        migrations.AddField(
+            model_name="contentfile",
+            name="reversed_basename",
+            field=models.CharField(db_index=True, default="", max_length=255),
+            preserve_default=False,
+        ),
+        migrations.RunPython(restore_trigram_triggers, migrations.RunPython.noop),
+        migrations.RunPython(populate_reversed_basenames, migrations.RunPython.noop),
+    ]
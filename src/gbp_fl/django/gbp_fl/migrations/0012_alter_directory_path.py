@@ -0,0 +1,16 @@
+# Generated by Django 5.1.5 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("gbp_fl", "0011_contentfile_reversed_basename")]
+
+    operations = [
+        migrations.AlterField(
+            model_name="directory",
+            name="path",
+            field=models.CharField(db_index=True, max_length=1023),
+        )
+    ]
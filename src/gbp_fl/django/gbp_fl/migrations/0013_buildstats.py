@@ -0,0 +1,92 @@
+# Generated by Django 5.1.5 on 2026-10-17 12:00
+
+import json
+import zlib
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_build_stats(apps, schema_editor):
+    """Store the stats of the builds already indexed
+
+    The stats are aggregated from the ContentFile rows of the django records backend
+    and the PackageContents blobs of the django_blob backend. The builds' index
+    durations are unknown.
+    """
+    db = schema_editor.connection.alias
+    content_files = apps.get_model("gbp_fl", "ContentFile").objects.using(db)
+    contents = apps.get_model("gbp_fl", "PackageContents").objects.using(db)
+    build_stats = apps.get_model("gbp_fl", "BuildStats")
+    stats = defaultdict(lambda: {"file_count": 0, "total_size": 0, "package_count": 0})
+    build_fields = ("binpkg__build__machine", "binpkg__build__build_id")
+
+    for row in (
+        content_files.order_by()
+        .values(*build_fields)
+        .annotate(
+            file_count=Count("id"),
+            total_size=Sum("size"),
+            package_count=Count("binpkg", distinct=True),
+        )
+    ):
+        build_stat = stats[row[build_fields[0]], row[build_fields[1]]]
+        for field in ("file_count", "total_size", "package_count"):
+            build_stat[field] += row[field]
+
+    for *build, file_count, blob in contents.values_list(
+        *build_fields, "file_count", "files"
+    ).iterator():
+        build_stat = stats[tuple(build)]
+        build_stat["file_count"] += file_count
+        build_stat["total_size"] += sum(
+            size or 0 for _, size, _ in json.loads(zlib.decompress(blob))
+        )
+        build_stat["package_count"] += 1
+
+    build_stats.objects.using(db).bulk_create(
+        [
+            build_stats(machine=machine, build_id=build_id, **fields)
+            for (machine, build_id), fields in stats.items()
+        ],
+        batch_size=1_000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("gbp_fl", "0012_alter_directory_path")]
+
+    operations = [
+        migrations.CreateModel(
+            name="BuildStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("machine", models.CharField(max_length=255)),
+                ("build_id", models.CharField(max_length=255)),
+                ("file_count", models.PositiveBigIntegerField(default=0)),
+                ("total_size", models.PositiveBigIntegerField(default=0)),
+                ("package_count", models.PositiveIntegerField(default=0)),
+                ("index_duration", models.FloatField(null=True)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        models.F("machine"),
+                        models.F("build_id"),
+                        name="unique_build_stats",
+                    )
+                ]
+            },
+        ),
+        migrations.RunPython(populate_build_stats, migrations.RunPython.noop),
+    ]
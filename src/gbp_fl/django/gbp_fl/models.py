@@ -1,37 +1,168 @@
 """Django Models for gbp-fl"""
 
-import os.path
-from typing import Any
+import posixpath
 
 from django.db import models
 
 
-class ContentFile(models.Model):
-    """DB backend for gbp-fl ContentFiles"""
+class Build(models.Model):
+    """A GBP build having indexed files"""
 
     machine = models.CharField(max_length=255)
     build_id = models.CharField(max_length=255)
-    path = models.CharField(max_length=1023)
-    basename = models.CharField(max_length=255, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint("machine", "build_id", name="unique_fl_build")
+        ]
+
+
+class BinPkg(models.Model):
+    """A binpkg in a Build having indexed files"""
+
+    # The unique constraint's index covers lookups by build
+    build = models.ForeignKey(
+        Build, on_delete=models.CASCADE, related_name="binpkgs", db_index=False
+    )
     cpvb = models.CharField(max_length=255)
     repo = models.CharField(max_length=127)
-    size = models.IntegerField()
+    build_time = models.DateTimeField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint("build", "cpvb", name="unique_binpkg")]
+
+
+class Directory(models.Model):
+    """A directory of ContentFiles
+
+    Each directory path is stored once and shared by all the files in it.
+    """
+
+    # Indexed (in addition to the unique constraint) for directory prefix searches
+    path = models.CharField(max_length=1023, db_index=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint("path", name="unique_directory")]
+
+
+class ContentFile(models.Model):
+    """DB backend for gbp-fl ContentFiles"""
+
+    # The unique constraint's index covers lookups by binpkg
+    binpkg = models.ForeignKey(
+        BinPkg, on_delete=models.CASCADE, related_name="files", db_index=False
+    )
+    directory = models.ForeignKey(
+        Directory, on_delete=models.PROTECT, related_name="files"
+    )
+    basename = models.CharField(max_length=255, db_index=True)
+    # The basename spelled backwards, so that suffix searches are (indexed) prefix
+    # lookups
+    reversed_basename = models.CharField(max_length=255, db_index=True)
+    size = models.IntegerField(null=True)
     timestamp = models.DateTimeField()
 
     class Meta:
         constraints = [
             models.UniqueConstraint(
-                "machine", "build_id", "cpvb", "path", name="unique_path"
+                "binpkg", "directory", "basename", name="unique_path"
             )
         ]
-        indexes = [
-            models.Index("machine", "build_id", name="idx_build"),
-            models.Index("machine", "build_id", "cpvb", name="idx_build_cpvb"),
-        ]
         get_latest_by = ["timestamp"]
-        ordering = ["machine", "timestamp"]
+        ordering = ["binpkg__build__machine", "timestamp"]
+
+    @property
+    def path(self) -> str:
+        """The file's full path"""
+        return posixpath.join(self.directory.path, self.basename)
+
+
+class PackageContents(models.Model):
+    """The files of a BinPkg stored as a single compressed blob
+
+    This is used by the django_blob records backend instead of ContentFile rows.
+    """
 
-    def save(self, *args: Any, **kwargs: Any) -> None:
-        self.basename = os.path.basename(self.path)
+    binpkg = models.OneToOneField(
+        BinPkg, on_delete=models.CASCADE, primary_key=True, related_name="contents"
+    )
+    file_count = models.PositiveIntegerField()
+    files = models.BinaryField()
 
-        super().save(*args, **kwargs)
+
+class PackageBasename(models.Model):
+    """The basename of a file in a PackageContents blob
+
+    This indexes the blobs for searches.
+    """
+
+    # The unique constraint's index covers lookups by binpkg
+    binpkg = models.ForeignKey(
+        BinPkg, on_delete=models.CASCADE, related_name="basenames", db_index=False
+    )
+    basename = models.CharField(max_length=255, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                "binpkg", "basename", name="unique_package_basename"
+            )
+        ]
+
+
+class PackageFingerprint(models.Model):
+    """Fingerprint of an indexed binpkg file
+
+    This is used to find identical binpkgs that have already been indexed.
+    """
+
+    machine = models.CharField(max_length=255)
+    build_id = models.CharField(max_length=255)
+    cpvb = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=255, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                "machine", "build_id", "cpvb", name="unique_fingerprint_package"
+            )
+        ]
+
+
+class PackageIndex(models.Model):
+    """The indexing state of a binpkg in a build"""
+
+    STATE_CHOICES = [("pending", "pending"), ("done", "done"), ("failed", "failed")]
+
+    machine = models.CharField(max_length=255)
+    build_id = models.CharField(max_length=255)
+    cpvb = models.CharField(max_length=255)
+    state = models.CharField(max_length=16, choices=STATE_CHOICES)
+    file_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                "machine", "build_id", "cpvb", name="unique_package_index"
+            )
+        ]
+
+
+class BuildStats(models.Model):
+    """Summary stats of a build's indexed files
+
+    These are stored when the build is indexed so that the counts don't have to be
+    aggregated from the build's ContentFiles.
+    """
+
+    machine = models.CharField(max_length=255)
+    build_id = models.CharField(max_length=255)
+    file_count = models.PositiveBigIntegerField(default=0)
+    total_size = models.PositiveBigIntegerField(default=0)
+    package_count = models.PositiveIntegerField(default=0)
+    index_duration = models.FloatField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint("machine", "build_id", name="unique_build_stats")
+        ]
@@ -16,12 +16,12 @@ access gbp-local attributes or else type checkers will holler.
 
 from contextlib import contextmanager
 from pathlib import PurePath as Path
-from tarfile import TarFile, TarInfo
 from typing import TYPE_CHECKING, Any, Callable, Iterator, ParamSpec, cast
 
 from gbp_fl import utils
 from gbp_fl.records import Repo
-from gbp_fl.types import Build, BuildLike, FileStats, MissingPackageIdentifier, Package
+from gbp_fl.settings import Settings
+from gbp_fl.types import Build, BuildLike, ContentFileInfo, FileStats, Package
 
 if TYPE_CHECKING:
     from gentoo_build_publisher import signals
@@ -66,6 +66,19 @@ class GBPGateway:
 
         return repo.build_records.list_machines()
 
+    def get_build_counts(self) -> dict[str, int]:
+        """Return the number of builds of each machine that GBP holds builds for"""
+        return {
+            machine: self.get_build_count(machine)
+            for machine in self.list_machine_names()
+        }
+
+    def get_build_count(self, machine: str) -> int:
+        """Return the number of builds GBP holds for the given machine"""
+        from gentoo_build_publisher import publisher
+
+        return publisher.repo.build_records.count(machine)
+
     def get_builds_for_machine(self, machine: str) -> Iterator[Build]:
         """Return the builds for the given machine"""
         from gentoo_build_publisher import publisher
@@ -95,6 +108,17 @@ class GBPGateway:
         # I dont' think you should need to cast but mypy begs to differ
         return cast(BuildLike, record)
 
+    def build_exists(self, build: Build) -> bool:
+        """Return True if the given build (still) exists in GBP"""
+        from gentoo_build_publisher import publisher
+        from gentoo_build_publisher.types import Build as GBPBuild
+
+        build_records = publisher.repo.build_records
+
+        return build_records.exists(
+            GBPBuild(machine=build.machine, build_id=build.build_id)
+        )
+
     def get_full_package_path(self, build: Build, package: Package) -> Path:
         """Return the full path of the given Package"""
         from gentoo_build_publisher import publisher, types
@@ -123,33 +147,31 @@ class GBPGateway:
             for p in storage.get_packages(gbp_build)
         ]
 
-    def get_package_contents(self, build: Build, package: Package) -> Iterator[TarInfo]:
+    def get_package_contents(
+        self, build: Build, package: Package
+    ) -> Iterator[ContentFileInfo]:
         """Given the build and binary package, return the packages contents
 
         This scours the binary tarball for package files.
-        Generates tarfile.TarInfo objects.
+        Generates ContentFileInfo objects.
         """
         package_path = self.get_full_package_path(build, package)
+        settings = Settings.from_environ()
+
+        yield from utils.read_package_contents(
+            package_path,
+            package,
+            use_contents=settings.INDEX_FROM_CONTENTS,
+            size_lookup_size=settings.INDEX_SIZE_LOOKUP_SIZE,
+            external_decompress_size=settings.INDEX_EXTERNAL_DECOMPRESS_SIZE,
+        )
 
-        with TarFile.open(package_path, "r") as tarfile:
-            try:
-                utils.ensure_package_identifier(package, tarfile)
-            except MissingPackageIdentifier:
-                yield from tarfile.getmembers()
-
-            # We're not sure of the exact filename of the inner tarfile because of
-            # available compression options, but we know what the name starts with.
-            # https://www.gentoo.org/glep/glep-0078.html#the-container-format
-            pv = package.cpv.partition("/")[2]
-            prefix = f"{pv}-{package.build_id}/image.tar"
-
-            for item in tarfile:  # pragma: no branch
-                if item.name.startswith(prefix):
-                    image_fp = tarfile.extractfile(item)
-                    # this is also a tarfile
-                    with TarFile.open(mode="r", fileobj=image_fp) as image:
-                        yield from image.getmembers()
-                    break
+    def get_package_fingerprint(self, build: Build, package: Package) -> str:
+        """Return the fingerprint of the given Package's binpkg file
+
+        Identical binpkg files, even in different builds, have the same fingerprint.
+        """
+        return utils.file_fingerprint(self.get_full_package_path(build, package))
 
     def run_task(
         self, func: Callable[P, Any], *args: P.args, **kwargs: P.kwargs
@@ -187,11 +209,7 @@ class GBPGateway:
 
     def get_file_stats(self, repo: Repo) -> FileStats:
         """Calculate the current file stats from the Repo"""
-        builds_per_machine = {
-            machine: sum(1 for _ in self.get_builds_for_machine(machine))
-            for machine in self.list_machine_names()
-        }
-        return FileStats.collect(repo.files, builds_per_machine)
+        return FileStats.collect(repo.files, self.get_build_counts())
 
     def get_cached_stats(self) -> FileStats | None:
         """Return the cached FileStats
@@ -1,19 +1,21 @@
 """The Query GraphQL type for gbp-fl"""
 
 import datetime as dt
+import itertools
 from functools import partial
-from typing import Any, TypeAlias, TypedDict
+from typing import Any, Iterable, TypeAlias, TypedDict
 
-from ariadne import ObjectType, convert_kwargs_to_snake_case
+from ariadne import EnumType, ObjectType, convert_kwargs_to_snake_case
 from graphql import GraphQLResolveInfo
 
 from gbp_fl.gateway import gateway
 from gbp_fl.records import Repo
 from gbp_fl.settings import Settings
-from gbp_fl.types import BinPkg, Build, ContentFile
+from gbp_fl.types import BinPkg, Build, ContentFile, SearchGroup, SearchPage
 
 Info: TypeAlias = GraphQLResolveInfo
 QUERY = ObjectType("Query")
+SEARCH_GROUP_BY = EnumType("flSearchGroupBy", SearchGroup)
 
 # pylint: disable=missing-docstring
 
@@ -30,22 +32,102 @@ class GQLFileStats(TypedDict):
     by_machine: list[GQLMachineStats]
 
 
+class GQLBuildStats(TypedDict):
+    machine: str
+    build_id: str
+    file_count: int
+    total_size: int
+    package_count: int
+    index_duration: float | None
+
+
+class GQLSearchGroupCount(TypedDict):
+    group: str
+    count: int
+
+
+class GQLSearchCount(TypedDict):
+    total: int
+    groups: list[GQLSearchGroupCount]
+
+
 @QUERY.field("flSearch")
 def fl_search(
     _obj: Any, _info: Info, *, key: str, machine: str | None = None
 ) -> list[ContentFile]:
-    repo = Repo.from_settings(Settings.from_environ())
+    settings = Settings.from_environ()
+    repo = Repo.from_settings(settings)
 
-    return list(repo.files.search(key, [machine] if machine else None))
+    return search_results(
+        repo.files.search(key, [machine] if machine else None),
+        settings.SEARCH_MAX_PAGE_SIZE,
+    )
 
 
 @QUERY.field("flSearchV2")
 def fl_search_v2(
-    _obj: Any, _info: Info, *, key: str, machines: list[str] | None = None
+    _obj: Any,
+    _info: Info,
+    *,
+    key: str,
+    machines: list[str] | None = None,
+    regex: bool = False,
 ) -> list[ContentFile]:
+    settings = Settings.from_environ()
+    repo = Repo.from_settings(settings)
+
+    return search_results(
+        repo.files.search(key, machines, regex=regex), settings.SEARCH_MAX_PAGE_SIZE
+    )
+
+
+@QUERY.field("flSearchPage")
+def fl_search_page(  # pylint: disable=too-many-arguments
+    _obj: Any,
+    _info: Info,
+    *,
+    key: str,
+    machines: list[str] | None = None,
+    regex: bool = False,
+    first: int | None = None,
+    after: str | None = None,
+) -> SearchPage:
+    settings = Settings.from_environ()
+    repo = Repo.from_settings(settings)
+    first = settings.SEARCH_PAGE_SIZE if first is None else first
+
+    return repo.files.search_page(
+        key,
+        machines,
+        regex=regex,
+        first=min(first, settings.SEARCH_MAX_PAGE_SIZE),
+        after=after,
+    )
+
+
+@QUERY.field("flSearchCount")
+@convert_kwargs_to_snake_case
+def fl_search_count(
+    _obj: Any,
+    _info: Info,
+    *,
+    key: str,
+    machines: list[str] | None = None,
+    regex: bool = False,
+    group_by: SearchGroup | None = None,
+) -> GQLSearchCount:
     repo = Repo.from_settings(Settings.from_environ())
+    count = repo.files.search_count(  # pylint: disable=assignment-from-no-return
+        key, machines, regex=regex, group_by=group_by
+    )
 
-    return list(repo.files.search(key, machines))
+    return {
+        "total": count.total,
+        "groups": [
+            {"group": group, "count": group_count}
+            for group, group_count in sorted(count.groups.items())
+        ],
+    }
 
 
 @QUERY.field("flCount")
@@ -55,7 +137,29 @@ def fl_count(
 ) -> int:
     repo = Repo.from_settings(Settings.from_environ())
 
-    return repo.files.count(machine, build_id, None)
+    return sum(
+        stats.file_count for stats in repo.files.get_build_stats(machine, build_id)
+    )
+
+
+@QUERY.field("flBuildStats")
+@convert_kwargs_to_snake_case
+def fl_build_stats(
+    _obj: Any, _info: Info, *, machine: str | None = None, build_id: str | None = None
+) -> list[GQLBuildStats]:
+    repo = Repo.from_settings(Settings.from_environ())
+
+    return [
+        {
+            "machine": stats.build.machine,
+            "build_id": stats.build.build_id,
+            "file_count": stats.file_count,
+            "total_size": stats.total_size,
+            "package_count": stats.package_count,
+            "index_duration": stats.index_duration,
+        }
+        for stats in repo.files.get_build_stats(machine, build_id)
+    ]
 
 
 @QUERY.field("flList")
@@ -105,3 +209,20 @@ def fl_stats(_obj: Any, _info: Info) -> GQLFileStats:
             for machine, ms in stats.by_machine.items()
         ],
     }
+
+
+def search_results(results: Iterable[ContentFile], limit: int) -> list[ContentFile]:
+    """Return the given search results as a list
+
+    Rather than silently truncating them, raise ValueError if there are more than
+    limit results.
+    """
+    content_files = list(itertools.islice(results, limit + 1))
+
+    if len(content_files) > limit:
+        raise ValueError(
+            f"The search has more than {limit} results. Use flSearchPage to page"
+            " through them"
+        )
+
+    return content_files
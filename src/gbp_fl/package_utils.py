@@ -1,37 +1,426 @@
 """Utilities for working with Packages"""
 
 import datetime as dt
-from concurrent.futures import ThreadPoolExecutor, wait
+import logging
+import multiprocessing
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    wait,
+)
 from functools import partial
+from itertools import islice
 from pathlib import PurePath as Path
+from typing import Iterable, Iterator
 
+from gbp_fl import utils
 from gbp_fl.gateway import gateway
 from gbp_fl.records import Repo
-from gbp_fl.types import BinPkg, Build, ContentFile, ContentFileInfo, Package
+from gbp_fl.scheduler import Job, get_scheduler
+from gbp_fl.settings import Settings
+from gbp_fl.types import (
+    BinPkg,
+    Build,
+    ContentFile,
+    ContentFileInfo,
+    IndexState,
+    Package,
+)
 
+logger = logging.getLogger(__name__)
 
-def index_build(build: Build, repo: Repo) -> None:
-    """Save the given Build's packages to the database"""
-    executor = ThreadPoolExecutor()
+# How worker processes are started when INDEX_EXECUTOR is "process"
+MP_CONTEXT = "forkserver"
+
+# The number of packages submitted per worker process that have yet to be saved
+IN_FLIGHT_PER_WORKER = 2
+
+
+def index_build(build: Build, repo: Repo) -> bool:
+    """Save the given Build's packages to the database
+
+    How the packages are read is determined by the INDEX_EXECUTOR setting:
+
+        - "thread": packages are indexed by the shared IndexScheduler's threads
+        - "process": packages are read in a pool of worker processes while saving is
+          done in the calling process
+
+    The build's job is registered with the IndexScheduler before anything is written.
+    If the indexing is cancelled (see IndexScheduler.cancel()), the remaining packages
+    are not indexed. It is also cancelled if the build is deleted from GBP, which is
+    how a deindex_build task running in another process cancels it.
+
+    Indexing is resumable: packages already indexed for the build are skipped and
+    packages whose indexing did not finish, or failed, are re-indexed.
+
+    Return True if the build was indexed or False if it was cancelled or is not (or
+    no longer) in GBP.
+    """
+    settings = Settings.from_environ()
+
+    if settings.INDEX_EXECUTOR not in ("thread", "process"):
+        raise ValueError(f"Invalid INDEX_EXECUTOR: {settings.INDEX_EXECUTOR}")
 
     try:
         packages = gateway.get_packages(build) or []
     except LookupError:
+        return False
+
+    scheduler = get_scheduler()
+
+    with scheduler.job(build, cancel_check=partial(build_deleted, build)) as job:
+        packages = unindexed_packages(packages, build, repo)
+
+        if not job.cancelled.is_set():
+            packages = copy_unchanged_packages(packages, build, repo)
+
+        if job.cancelled.is_set():
+            completed = False
+        elif settings.INDEX_EXECUTOR == "process":
+            completed = index_packages_in_processes(packages, job, repo, settings)
+        else:
+            index = partial(index_package, build=build, repo=repo)
+            completed = scheduler.run_job(job, index, packages)
+
+    if not completed:
+        logger.info("Indexing of %s was cancelled", build.id)
+
+    return completed
+
+
+def build_deleted(build: Build) -> bool:
+    """Return True if the given build was deleted from GBP"""
+    return not gateway.build_exists(build)
+
+
+def unindexed_packages(
+    packages: list[Package], build: Build, repo: Repo
+) -> list[Package]:
+    """Return the packages that have yet to be indexed for the given build
+
+    Packages whose indexing is IndexState.DONE are skipped. Packages whose indexing was
+    started but did not finish are deindexed so that they can be indexed again.
+    """
+    states = repo.files.get_index_states(build)
+    remaining = []
+
+    for package in packages:
+        if (index := states.get(package.cpvb)) is not None:
+            if index.state == IndexState.DONE:
+                continue
+            repo.files.deindex_package(build, package.cpvb)
+        remaining.append(package)
+
+    return remaining
+
+
+def copy_unchanged_packages(
+    packages: list[Package], build: Build, repo: Repo
+) -> list[Package]:
+    """Copy the index of packages that are unchanged from the previous build
+
+    The most recently indexed build for the machine is used as the previous build.
+    Packages having the same cpvb, repo and build time as the ones in the previous
+    build have their files copied from the previous build instead of being re-read.
+    Packages whose indexing did not finish in the previous build are not copied.
+
+    Return the list of packages that still need to be indexed.
+    """
+    if (previous := previous_build(build, repo)) is None:
+        return packages
+
+    try:
+        previous_packages = set(gateway.get_packages(previous))
+    except LookupError:
+        return packages
+
+    incomplete = {
+        cpvb
+        for cpvb, index in repo.files.get_index_states(previous).items()
+        if index.state != IndexState.DONE
+    }
+    unchanged = {
+        package
+        for package in packages
+        if package in previous_packages and package.cpvb not in incomplete
+    }
+    repo.files.copy_packages(previous, build, (package.cpvb for package in unchanged))
+
+    return [package for package in packages if package not in unchanged]
+
+
+def previous_build(build: Build, repo: Repo) -> Build | None:
+    """Return the machine's most recently indexed build other than the given build
+
+    If the machine has no other indexed builds, return None.
+    """
+    indexed = {i for i in repo.files.get_builds() if i.machine == build.machine}
+    indexed.discard(build)
+
+    if not indexed:
+        return None
+
+    # GBP gives us the machine's builds newest first
+    for machine_build in gateway.get_builds_for_machine(build.machine):
+        if machine_build in indexed:
+            return machine_build
+
+    return None
+
+
+def index_packages_in_processes(
+    packages: list[Package], job: Job, repo: Repo, settings: Settings
+) -> bool:
+    """Index the given packages using a pool of worker processes
+
+    The worker processes parse the binpkgs and send back their file listings. The
+    listings are saved to the repo in this process so that database connections are
+    never shared with the workers. Each package waits for one of the IndexScheduler's
+    workers, so the number of packages read at once is bound across all builds.
+
+    Only a few packages per worker are submitted at a time and their listings are
+    dropped once saved, so memory use does not grow with the size of the build. The
+    workers are started by a forkserver rather than forked from this (threaded)
+    process with its open database connections. When INDEX_DEDUP is enabled, the
+    binpkgs are fingerprinted by the workers as well.
+
+    Return True if all the packages were processed or False if the job was cancelled.
+    """
+    build = job.build
+    scheduler = get_scheduler()
+    fingerprints: dict[str, str] = {}
+    max_workers = max(settings.INDEX_MAX_WORKERS_PER_BUILD, 1)
+    in_flight: dict[Future[list[ContentFileInfo]], Package] = {}
+
+    with ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context(MP_CONTEXT)
+    ) as executor:
+        if settings.INDEX_DEDUP:
+            fingerprints = fingerprint_packages(packages, job, executor)
+            packages = copy_identical_packages(packages, fingerprints, build, repo)
+
+        remaining = iter(packages)
+
+        while not job.cancelled.is_set():
+            for package in islice(
+                remaining, IN_FLIGHT_PER_WORKER * max_workers - len(in_flight)
+            ):
+                if not scheduler.acquire_worker(job):
+                    break
+                future = executor.submit(
+                    package_listing,
+                    gateway.get_full_package_path(build, package),
+                    package,
+                    use_contents=settings.INDEX_FROM_CONTENTS,
+                    size_lookup_size=settings.INDEX_SIZE_LOOKUP_SIZE,
+                    external_decompress_size=settings.INDEX_EXTERNAL_DECOMPRESS_SIZE,
+                )
+                future.add_done_callback(lambda _: scheduler.release_worker())
+                in_flight[future] = package
+
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                if job.cancelled.is_set():
+                    break
+                package = in_flight.pop(future)
+                save_package_listing(
+                    future, package, build, repo, fingerprints.get(package.cpvb)
+                )
+
+        if job.cancelled.is_set():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    return not job.cancelled.is_set()
+
+
+def save_package_listing(
+    future: Future[list[ContentFileInfo]],
+    package: Package,
+    build: Build,
+    repo: Repo,
+    fingerprint: str | None,
+) -> None:
+    """Save the listing of the given package read by a worker process
+
+    If reading the package failed, its IndexState is IndexState.FAILED.
+    """
+    try:
+        listing = future.result()
+    except Exception:  # pylint: disable=broad-exception-caught
+        logger.exception("Error indexing %s in %s", package.cpvb, build.id)
+        repo.files.save_index_state(build, package.cpvb, IndexState.FAILED)
         return
 
-    wait(executor.submit(index_package, package, build, repo) for package in packages)
+    repo.files.save_index_state(build, package.cpvb, IndexState.PENDING)
+    file_count = save_package_files(listing, package, build, repo)
+
+    if fingerprint:
+        repo.files.save_fingerprint(build, package.cpvb, fingerprint)
+
+    repo.files.save_index_state(build, package.cpvb, IndexState.DONE, file_count)
+
+
+def package_listing(
+    package_path: Path,
+    package: Package,
+    *,
+    use_contents: bool = False,
+    size_lookup_size: int = 0,
+    external_decompress_size: int = 0,
+) -> list[ContentFileInfo]:
+    """Return the (compact) list of files in the binpkg at the given path
+
+    This is what gets run in the worker processes.
+    """
+    items = utils.read_package_contents(
+        package_path,
+        package,
+        use_contents=use_contents,
+        size_lookup_size=size_lookup_size,
+        external_decompress_size=external_decompress_size,
+    )
+
+    return [item for item in items if is_image_file(item)]
 
 
 def index_package(package: Package, build: Build, repo: Repo) -> None:
-    """Save the files from the given build/package"""
-    items = gateway.get_package_contents(build, package)
+    """Save the files from the given build/package
+
+    If the INDEX_DEDUP setting is enabled and an identical binpkg has already been
+    indexed for another build, its files are copied instead of re-reading the binpkg.
+
+    The package's IndexState is recorded as it is indexed. If indexing fails the state
+    is IndexState.FAILED and the exception is re-raised.
+    """
+    fingerprint: str | None = None
+
+    if Settings.from_environ().INDEX_DEDUP:
+        if not (fingerprint := copy_identical_package(package, build, repo)):
+            return
+
+    repo.files.save_index_state(build, package.cpvb, IndexState.PENDING)
+
+    try:
+        items = gateway.get_package_contents(build, package)
+        file_count = save_package_files(
+            (item for item in items if is_image_file(item)), package, build, repo
+        )
+    except Exception:
+        repo.files.save_index_state(build, package.cpvb, IndexState.FAILED)
+        raise
+
+    if fingerprint:
+        repo.files.save_fingerprint(build, package.cpvb, fingerprint)
+
+    repo.files.save_index_state(build, package.cpvb, IndexState.DONE, file_count)
+
+
+def fingerprint_packages(
+    packages: Iterable[Package], job: Job, executor: Executor
+) -> dict[str, str]:
+    """Return the fingerprints of the given packages' binpkgs keyed by cpvb
+
+    The binpkgs are hashed by the executor's workers, each of which waits for one of
+    the IndexScheduler's workers. If the job is cancelled, the packages not yet
+    submitted are left out.
+    """
+    scheduler = get_scheduler()
+    futures: dict[Future[str], Package] = {}
+
+    for package in packages:
+        if not scheduler.acquire_worker(job):
+            break
+        future = executor.submit(
+            utils.file_fingerprint, gateway.get_full_package_path(job.build, package)
+        )
+        future.add_done_callback(lambda _: scheduler.release_worker())
+        futures[future] = package
+
+    return {package.cpvb: future.result() for future, package in futures.items()}
+
+
+def copy_identical_packages(
+    packages: Iterable[Package], fingerprints: dict[str, str], build: Build, repo: Repo
+) -> list[Package]:
+    """Copy the files of the packages identical to ones already indexed
+
+    fingerprints are the fingerprints of the packages' binpkgs keyed by cpvb. See
+    copy_fingerprinted_package(). Return the packages that were not copied.
+    """
+    return [
+        package
+        for package in packages
+        if not (
+            (fingerprint := fingerprints.get(package.cpvb))
+            and copy_fingerprinted_package(package, fingerprint, build, repo)
+        )
+    ]
+
+
+def copy_identical_package(package: Package, build: Build, repo: Repo) -> str | None:
+    """Copy the files of an identical binpkg already indexed for another build
+
+    See copy_fingerprinted_package(). If the files were copied, return None. Otherwise
+    return the binpkg's fingerprint, which should be saved once the package has been
+    indexed.
+    """
+    fingerprint = gateway.get_package_fingerprint(build, package)
+
+    if copy_fingerprinted_package(package, fingerprint, build, repo):
+        return None
+
+    return fingerprint
+
+
+def copy_fingerprinted_package(
+    package: Package, fingerprint: str, build: Build, repo: Repo
+) -> bool:
+    """Copy the files of the package from a build having an identical binpkg
+
+    Binpkgs are identified by the fingerprint of their file. Only builds where the
+    package is fully indexed are copied from. Return True if the files were copied.
+    If nothing was copied, e.g. because the other build was deindexed in the
+    meantime, return False: the package needs to be indexed.
+    """
+    source = repo.files.find_fingerprint(fingerprint, package.cpvb)
+
+    if source is None or source == build:
+        return False
+
+    return repo.files.copy_packages(source, build, [package.cpvb]) > 0
+
+
+def save_package_files(
+    items: Iterable[ContentFileInfo], package: Package, build: Build, repo: Repo
+) -> int:
+    """Save the given file listing from the build/package
+
+    Return the number of files saved.
+    """
     content_file = partial(make_content_file, build, package)
+    file_count = 0
 
-    repo.files.bulk_save(
-        content_file(ContentFileInfo(name=i.name, mtime=int(i.mtime), size=i.size))
-        for i in items
-        if not i.isdir() and i.name.startswith(("image/", "./"))
-    )
+    def content_files() -> Iterator[ContentFile]:
+        nonlocal file_count
+
+        for item in items:
+            file_count += 1
+            yield content_file(item)
+
+    repo.files.bulk_save(content_files())
+
+    return file_count
+
+
+def is_image_file(item: ContentFileInfo) -> bool:
+    """Return True if the given tarball member is a file installed by the package"""
+    return not item.isdir() and item.name.startswith(("image/", "./"))
 
 
 def make_content_file(
@@ -1,13 +1,24 @@
 """DB interface for gbp-fl"""
 
 import importlib.metadata
+import itertools
 from dataclasses import dataclass
 from functools import cache
 from pathlib import PurePath as Path
 from typing import Any, Iterable, Protocol, Self, cast
 
 from gbp_fl.settings import Settings
-from gbp_fl.types import BinPkg, Build, ContentFile
+from gbp_fl.types import (
+    BinPkg,
+    Build,
+    BuildStats,
+    ContentFile,
+    IndexState,
+    PackageIndex,
+    SearchCount,
+    SearchGroup,
+    SearchPage,
+)
 
 
 class RecordNotFound(LookupError):
@@ -17,6 +28,8 @@ class RecordNotFound(LookupError):
 class ContentFiles(Protocol):  # pragma: no cover
     """Repository for Package files"""
 
+    # pylint: disable=too-many-public-methods
+
     def save(self, content_file: ContentFile, **fields: Any) -> ContentFile:
         """Save the given ContentFile with given updated fields
 
@@ -41,7 +54,7 @@ class ContentFiles(Protocol):  # pragma: no cover
         """
 
     def deindex_build(self, machine: str, build_id: str) -> None:
-        """Delete all content files for the given build"""
+        """Delete all content files (and the stats) for the given build"""
 
     def exists(self, machine: str, build_id: str, cpvb: str, path: str | Path) -> bool:
         """Return true if a package file with matching criteria exists in the db"""
@@ -60,6 +73,25 @@ class ContentFiles(Protocol):  # pragma: no cover
         All other combinations raise ValueError
         """
 
+    def update_build_stats(
+        self, build: Build, index_duration: float | None = None
+    ) -> BuildStats:
+        """Store (and return) the stats of the given build's indexed files
+
+        The stats are aggregated from the build's files only. This is done when the
+        build is indexed. index_duration is how long, in seconds, that took.
+        """
+
+    def get_build_stats(
+        self, machine: str | None = None, build_id: str | None = None
+    ) -> list[BuildStats]:
+        """Return the stored stats of the builds
+
+        If machine is given, return only the stats of the machine's builds. If build_id
+        is also given, only those of the build. Raise ValueError if build_id is given
+        without machine.
+        """
+
     def for_package(
         self, machine: str, build_id: str, cpvb: str
     ) -> Iterable[ContentFile]:
@@ -72,7 +104,7 @@ class ContentFiles(Protocol):  # pragma: no cover
         """Return all ContentFiles for the given machine"""
 
     def search(
-        self, key: str, machines: list[str] | None = None
+        self, key: str, machines: list[str] | None = None, *, regex: bool = False
     ) -> Iterable[ContentFile]:
         """Search the database for package files
 
@@ -81,30 +113,156 @@ class ContentFiles(Protocol):  # pragma: no cover
 
         The simple search key works like the following:
 
-            - A key without "*" or "/" characters searches an exact match on the file's
-              base name. For example if the key is "bash" then it matches "/bin/bash"
-              but not "/usr/bin/bashbug"
+            - A key without "/" characters or glob wildcards ("*", "?" and "[")
+              searches an exact match on the file's base name. For example if the key
+              is "bash" then it matches "/bin/bash" but not "/usr/bin/bashbug"
 
             - Keys containing at least one "/" are interpreted as exact path matches.
               For example the key "/bin/bash" matches files whose path is exactly
               "/bin/bash". If the key does not start with a forward slash then it is
               automatically prepended.
 
-            - Keys with an asterisk either at the start and/or end of the key perform
-              wildcard matches but only on the basename of the file. For example the key
-              "b*" matches "/bin/bash" and "/usr/bin/bashbug" but not
-              "/usr/share/baselayout/fstab". Keys with an asterisk in the middle depend
-              on the backend and are not guaranteed to provide the expected matches.
+            - Keys ending with "/" (or "/**") match all the files under the given
+              directory, at any depth. For example the key "/usr/lib/python3.12/"
+              matches "/usr/lib/python3.12/os.py" and
+              "/usr/lib/python3.12/json/__init__.py". As with exact path matches a
+              leading forward slash is prepended if missing.
+
+            - Other keys with glob wildcards are glob patterns (as in fnmatch: "*",
+              "?" and "[...]") matched against the basename of the file. For example
+              the key "b*" matches "/bin/bash" and "/usr/bin/bashbug" but not
+              "/usr/share/baselayout/fstab". The key "lib*ssl*.so*" matches
+              "/usr/lib64/libssl.so.3" and "lib?.so" matches "/lib64/libc.so".
 
             - A key that's the empty string ("") matches nothing.
 
-            - A key that contains nothing bug asterisks (e.g. "*") depends on the
-              backend and are not guaranteed to provide the expected matches.
+        If regex is true, the key is instead a regular expression that's searched for
+        (as with re.search()) in the basename of the file. Raise ValueError if the
+        regular expression is invalid.
+        """
+
+    def search_page(
+        self,
+        key: str,
+        machines: list[str] | None = None,
+        *,
+        regex: bool = False,
+        first: int = 100,
+        after: str | None = None,
+    ) -> SearchPage:
+        """Return a page of the results of search()
+
+        The page holds (at most) the first `first` results after the `after` cursor,
+        or from the first result if after is None. The results are in a
+        backend-specific order that is stable from one page to the next. Raise
+        ValueError if after is not a valid cursor.
+        """
+
+    def search_count(
+        self,
+        key: str,
+        machines: list[str] | None = None,
+        *,
+        regex: bool = False,
+        group_by: SearchGroup | None = None,
+    ) -> SearchCount:
+        """Return the number of results of search()
+
+        If group_by is given, also count the results in each group. See
+        search_group() for the groups' names. The results are counted without
+        creating ContentFiles.
         """
 
     def get_builds(self) -> Iterable[Build]:
         """Return all the builds that have indexed files"""
 
+    def copy_packages(self, source: Build, dest: Build, cpvbs: Iterable[str]) -> int:
+        """Copy the ContentFiles of the given packages from the source to dest build
+
+        This is used to index packages that are unchanged from a previous build
+        without having to re-read the binpkgs. The copied packages are marked as
+        IndexState.DONE in the dest build. Return the number of packages copied.
+        Packages the source build does not have are not copied.
+        """
+
+    def deindex_package(self, build: Build, cpvb: str) -> None:
+        """Delete all the records for the given build's package
+
+        This includes the package's files, fingerprint and index state.
+        """
+
+    def save_index_state(
+        self, build: Build, cpvb: str, state: IndexState, file_count: int = 0
+    ) -> None:
+        """Record the indexing state of the given build's package"""
+
+    def get_index_states(self, build: Build) -> dict[str, PackageIndex]:
+        """Return the indexing states of the given build's packages keyed by cpvb"""
+
+    def save_fingerprint(self, build: Build, cpvb: str, fingerprint: str) -> None:
+        """Record the fingerprint of the given build's binpkg file"""
+
+    def find_fingerprint(self, fingerprint: str, cpvb: str) -> Build | None:
+        """Return a build having the given package indexed from an identical binpkg
+
+        That is, a build where the package's binpkg has the given fingerprint and the
+        package is IndexState.DONE. If no such build exists, return None.
+        """
+
+
+def directory_prefix(key: str) -> str | None:
+    """Return the directory prefix of the given directory search key
+
+    Directory search keys end with "/" or "/**" (see ContentFiles.search()). The
+    prefix returned starts and ends with a "/". If key is not a directory search key,
+    return None.
+    """
+    if key.endswith("/**"):
+        key = key[:-2]
+
+    if not key.endswith("/"):
+        return None
+
+    return key if key.startswith("/") else f"/{key}"
+
+
+def paginate(results: Iterable[tuple[str, ContentFile]], first: int) -> SearchPage:
+    """Return the SearchPage for the first `first` of the given results
+
+    results are (cursor, ContentFile) pairs in cursor order, starting after the page's
+    `after` cursor. Only as many as needed (first + 1) are consumed.
+    """
+    if first < 0:
+        raise ValueError(f"Invalid page size: {first}")
+
+    page = list(itertools.islice(results, first + 1))
+    has_next_page = len(page) > first
+    page = page[:first]
+
+    return SearchPage(
+        content_files=[content_file for _, content_file in page],
+        end_cursor=page[-1][0] if page else None,
+        has_next_page=has_next_page,
+    )
+
+
+def search_group(content_file: ContentFile, group_by: SearchGroup | None) -> str:
+    """Return the name of the given ContentFile's SearchGroup
+
+    If group_by is None, this is the empty string.
+    """
+    binpkg = content_file.binpkg
+
+    match group_by:
+        case SearchGroup.MACHINE:
+            return binpkg.build.machine
+        case SearchGroup.BUILD:
+            return f"{binpkg.build.machine}.{binpkg.build.build_id}"
+        case SearchGroup.CPVB:
+            return binpkg.cpvb()
+
+    return ""
+
 
 def files_backend(backend: str) -> ContentFiles:
     """Load the ContentFiles db interface given the settings"""
@@ -0,0 +1,553 @@
+"""Django ORM-backed records backend storing files per package
+
+Rather than a row per file, each package (build and cpvb) has a single
+PackageContents row holding its file list as a compressed blob. Searches go through a
+separate index of the packages' basenames. This makes per-package and whole-build
+operations cheap at the cost of operations on individual files, which read and
+rewrite their package's blob.
+
+The backend has these limits:
+
+- There is no index of the packages' directories, so directory (prefix) searches
+  decode the blob of every package.
+- bulk_save() holds each package's whole file list (the previous and new one) in
+  memory while writing its blob.
+
+The Build, BinPkg, fingerprint and index state tables are shared with the django
+backend.
+"""
+
+import datetime as dt
+import itertools
+import json
+import zlib
+from collections import Counter
+from dataclasses import replace
+from pathlib import PurePath as Path
+from typing import Any, Callable, Iterable, Iterator
+
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Q, QuerySet, Sum
+
+from gbp_fl.django.gbp_fl import models
+from gbp_fl.records import RecordNotFound, directory_prefix, django_orm, paginate
+from gbp_fl.records.django_orm import (
+    GROUP_FIELDS,
+    binpkg_key,
+    binpkgs,
+    builds,
+    prefix_lookups,
+    split_path,
+    unique_key,
+)
+from gbp_fl.records.patterns import Pattern, glob_pattern, is_glob, regex_pattern
+from gbp_fl.types import (
+    BinPkg,
+    Build,
+    BuildStats,
+    ContentFile,
+    SearchCount,
+    SearchGroup,
+    SearchPage,
+)
+
+FileList = dict[str, tuple[int | None, dt.datetime]]
+"""A package's files: the size (None if unknown) and timestamp of each path"""
+
+contents = models.PackageContents.objects
+basenames = models.PackageBasename.objects
+
+
+class ContentFiles(django_orm.ContentFiles):
+    """Django ORM-backed repository for Package files stored per package"""
+
+    def save(self, content_file: ContentFile, **fields: Any) -> ContentFile:
+        """Save the given ContentFile with given updated fields
+
+        Return the updated ContentFile
+        """
+        new = replace(content_file, **fields)
+
+        if unique_key(new) != unique_key(content_file):
+            self.maybe_delete(content_file)
+        self.bulk_save([new])
+
+        return new
+
+    @transaction.atomic()
+    def bulk_save(self, content_files: Iterable[ContentFile]) -> None:
+        """Bulk save a list of ContentFiles
+
+        ContentFiles that already exist in the database are replaced. Consecutive
+        ContentFiles of the same package are written to the package's blob at once.
+        """
+        for _, group in itertools.groupby(
+            content_files, key=lambda cf: binpkg_key(cf.binpkg)
+        ):
+            package_files = list(group)
+            binpkg = package_files[0].binpkg
+            [binpkg_id] = django_orm.get_binpkg_ids([binpkg], {}).values()
+            previous = load(binpkg_id)
+            files = previous | {
+                str(cf.path): (cf.size, cf.timestamp) for cf in package_files
+            }
+            store(binpkg_id, files, previous)
+
+    def get(
+        self, machine: str, build_id: str, cpvb: str, path: str | Path
+    ) -> ContentFile:
+        """Return the ContentFile with the given properties
+
+        If no ContentFile matches, raise RecordNotFound
+        """
+        query = contents.filter(
+            binpkg__build__machine=machine,
+            binpkg__build__build_id=build_id,
+            binpkg__cpvb=cpvb,
+        )
+        path = str(path)
+
+        for content_file in models_to_content_files(query):
+            if str(content_file.path) == path:
+                return content_file
+
+        raise RecordNotFound
+
+    @transaction.atomic()
+    def delete(self, content_file: ContentFile) -> None:
+        """Delete the given ContentFile from the database
+
+        Raise RecordNotFound if it doesn't exist in the database.
+        """
+        key = binpkg_key(content_file.binpkg)
+        path = str(content_file.path)
+
+        if (
+            binpkg_id := django_orm.lookup_binpkg_ids([content_file.binpkg]).get(key)
+        ) is None:
+            raise RecordNotFound
+
+        previous = load(binpkg_id)
+        if path not in previous:
+            raise RecordNotFound
+
+        files = previous.copy()
+        del files[path]
+        store(binpkg_id, files, previous)
+
+    def deindex_build(self, machine: str, build_id: str) -> None:
+        """Delete all content files (and the stats) for the given build"""
+        binpkgs.filter(build__machine=machine, build__build_id=build_id).delete()
+        builds.filter(machine=machine, build_id=build_id).delete()
+        django_orm.fingerprints.filter(machine=machine, build_id=build_id).delete()
+        django_orm.index_states.filter(machine=machine, build_id=build_id).delete()
+        django_orm.build_stats.filter(machine=machine, build_id=build_id).delete()
+
+    def exists(self, machine: str, build_id: str, cpvb: str, path: str | Path) -> bool:
+        """Return true if a package file with matching criteria exists in the db"""
+        try:
+            self.get(machine, build_id, cpvb, path)
+        except RecordNotFound:
+            return False
+        return True
+
+    def count(self, machine: str | None, build_id: str | None, cpvb: str | None) -> int:
+        """Return the number of package files exist with the given critiria
+
+        When the following parameters are not None:
+
+        - machine: the number of files for the given machine
+        - machine and build_id: the number of files for the given build
+        - machine, build_id, and cpvb: the number of files for the given build's package
+
+        When all parameters are none, returns the total number of package files on GBP
+
+        All other combinations raise ValueError
+        """
+        query = contents.filter(**django_orm.count_lookups(machine, build_id, cpvb))
+
+        return query.aggregate(total=Sum("file_count"))["total"] or 0
+
+    def update_build_stats(
+        self, build: Build, index_duration: float | None = None
+    ) -> BuildStats:
+        """Store (and return) the stats of the given build's indexed files
+
+        The file counts are summed from the build's packages. The sizes are summed
+        from their blobs.
+        """
+        query = contents.filter(
+            binpkg__build__machine=build.machine, binpkg__build__build_id=build.build_id
+        )
+        file_count = total_size = package_count = 0
+
+        for count, blob in query.values_list("file_count", "files").iterator():
+            file_count += count
+            total_size += sum(size or 0 for size, _ in decode(blob).values())
+            package_count += 1
+
+        return django_orm.save_build_stats(
+            BuildStats(
+                build=build,
+                file_count=file_count,
+                total_size=total_size,
+                package_count=package_count,
+                index_duration=index_duration,
+            )
+        )
+
+    def for_package(
+        self, machine: str, build_id: str, cpvb: str
+    ) -> Iterable[ContentFile]:
+        """Return all ContentFiles for the given build and cpvb"""
+        query = contents.filter(
+            binpkg__build__machine=machine,
+            binpkg__build__build_id=build_id,
+            binpkg__cpvb=cpvb,
+        )
+        yield from models_to_content_files(query)
+
+    def for_build(self, machine: str, build_id: str) -> Iterable[ContentFile]:
+        """Return all ContentFiles for the given build"""
+        query = contents.filter(
+            binpkg__build__machine=machine, binpkg__build__build_id=build_id
+        )
+
+        yield from models_to_content_files(query)
+
+    def for_machine(self, machine: str) -> Iterable[ContentFile]:
+        """Return all ContentFiles for the given machine"""
+        query = contents.filter(binpkg__build__machine=machine)
+
+        yield from models_to_content_files(query)
+
+    def search(
+        self, key: str, machines: list[str] | None = None, *, regex: bool = False
+    ) -> Iterable[ContentFile]:
+        """Search the database for package files
+
+        If machines is provided, restrict the search to files belonging to the given
+        machines.
+
+        The simple search key works like the following:
+
+            - A key without "/" characters or glob wildcards ("*", "?" and "[")
+              searches an exact match on the file's base name. For example if the key
+              is "bash" then it matches "/bin/bash" but not "/usr/bin/bashbug"
+
+            - Keys containing at least one "/" are interpreted as exact path matches.
+              For example the key "/bin/bash" matches files whose path is exactly
+              "/bin/bash". If the key does not start with a forward slash then it is
+              automatically prepended.
+
+            - Keys ending with "/" (or "/**") match all the files under the given
+              directory, at any depth. For example the key "/usr/lib/python3.12/"
+              matches "/usr/lib/python3.12/os.py" and
+              "/usr/lib/python3.12/json/__init__.py". As with exact path matches a
+              leading forward slash is prepended if missing.
+
+            - Other keys with glob wildcards are glob patterns (as in fnmatch: "*",
+              "?" and "[...]") matched against the basename of the file. For example
+              the key "b*" matches "/bin/bash" and "/usr/bin/bashbug" but not
+              "/usr/share/baselayout/fstab". The key "lib*ssl*.so*" matches
+              "/usr/lib64/libssl.so.3" and "lib?.so" matches "/lib64/libc.so".
+
+            - A key that's the empty string ("") matches nothing.
+
+        If regex is true, the key is instead a regular expression that's searched for
+        (as with re.search()) in the basename of the file. Raise ValueError if the
+        regular expression is invalid.
+
+        The basename index selects the packages to search. Only the matching files of
+        those packages are returned.
+        """
+        query, matches = search_query(key, machines, regex)
+
+        yield from (
+            content_file
+            for content_file in models_to_content_files(query)
+            if matches(str(content_file.path))
+        )
+
+    def search_page(
+        self,
+        key: str,
+        machines: list[str] | None = None,
+        *,
+        regex: bool = False,
+        first: int = 100,
+        after: str | None = None,
+    ) -> SearchPage:
+        """Return a page of the results of search()
+
+        The results are ordered by package (its BinPkg's primary key) and then path.
+        The cursor is "<binpkg id>:<path>". Packages are read through the primary key
+        index a page (plus one) at a time.
+        """
+        query, matches = search_query(key, machines, regex)
+        binpkg_id, path = parse_cursor(after) if after is not None else (0, "")
+        query = query.filter(binpkg_id__gte=binpkg_id)
+
+        results = (
+            (f"{id_}:{content_file.path}", content_file)
+            for id_, content_file in keyset_content_files(query, first + 1)
+            if matches(str(content_file.path))
+            and (id_ != binpkg_id or str(content_file.path) > path)
+        )
+
+        return paginate(results, first)
+
+    def search_count(
+        self,
+        key: str,
+        machines: list[str] | None = None,
+        *,
+        regex: bool = False,
+        group_by: SearchGroup | None = None,
+    ) -> SearchCount:
+        """Return the number of results of search()
+
+        Only the blobs (and group fields) of the packages to search are read. Their
+        paths are matched without creating ContentFiles.
+        """
+        query, matches = search_query(key, machines, regex)
+        groups: Counter[str] = Counter()
+
+        rows = query.values_list("files", *GROUP_FIELDS[group_by]).iterator()
+
+        for blob, *group in rows:
+            if count := sum(1 for path in decode(blob) if matches(path)):
+                groups[".".join(group)] += count
+
+        return SearchCount.from_groups(groups, group_by)
+
+    def get_builds(self) -> Iterable[Build]:
+        """Return all the builds that have indexed files"""
+        has_files = Exists(contents.filter(binpkg__build=OuterRef("pk")))
+        query = builds.filter(has_files).values("machine", "build_id")
+
+        return (Build(machine=i["machine"], build_id=i["build_id"]) for i in query)
+
+    def copy_files_sql(self, package_count: int) -> list[str]:
+        """Return the statements copy_packages() uses to copy the packages' files
+
+        The statements' parameters are the same as for copy_binpkgs_sql().
+        """
+        return [copy_contents_sql(package_count), copy_basenames_sql(package_count)]
+
+    def copy_index_states_sql(self, package_count: int) -> str:
+        """Return the statement copy_packages() uses to mark the packages indexed
+
+        The file counts are taken from the source build's blobs.
+        """
+        file_count = f"COALESCE(SUM(f.{connection.ops.quote_name('file_count')}), 0)"
+
+        return django_orm.copy_index_states_sql(
+            package_count, models.PackageContents, file_count
+        )
+
+    @transaction.atomic()
+    def deindex_package(self, build: Build, cpvb: str) -> None:
+        """Delete all the records for the given build's package
+
+        This includes the package's files, fingerprint and index state.
+        """
+        params = {"machine": build.machine, "build_id": build.build_id, "cpvb": cpvb}
+
+        binpkgs.filter(
+            build__machine=build.machine, build__build_id=build.build_id, cpvb=cpvb
+        ).delete()
+        django_orm.fingerprints.filter(**params).delete()
+        django_orm.index_states.filter(**params).delete()
+
+
+def load(binpkg_id: int) -> FileList:
+    """Return the file list stored for the given BinPkg row
+
+    If the package has no files stored, return an empty FileList.
+    """
+    blob = contents.filter(binpkg_id=binpkg_id).values_list("files", flat=True).first()
+
+    return {} if blob is None else decode(blob)
+
+
+def store(binpkg_id: int, files: FileList, previous: FileList) -> None:
+    """Store the given file list for the given BinPkg row
+
+    previous is the package's currently-stored file list. The package's basename index
+    is updated accordingly. If files is empty, the BinPkg is deleted.
+    """
+    if not files:
+        binpkgs.filter(id=binpkg_id).delete()
+        return
+
+    contents.update_or_create(
+        binpkg_id=binpkg_id, defaults={"file_count": len(files), "files": encode(files)}
+    )
+    names = {split_path(path)[1] for path in files}
+    previous_names = {split_path(path)[1] for path in previous}
+
+    if removed := previous_names - names:
+        basenames.filter(binpkg_id=binpkg_id, basename__in=removed).delete()
+
+    if added := names - previous_names:
+        basenames.bulk_create(
+            [models.PackageBasename(binpkg_id=binpkg_id, basename=n) for n in added],
+            ignore_conflicts=True,
+        )
+
+
+def encode(files: FileList) -> bytes:
+    """Return the given file list as a compressed blob"""
+    rows = [
+        [path, size, timestamp.isoformat()]
+        for path, (size, timestamp) in sorted(files.items())
+    ]
+
+    return zlib.compress(json.dumps(rows, separators=(",", ":")).encode())
+
+
+def decode(blob: bytes | memoryview) -> FileList:
+    """Return the file list of the given compressed blob"""
+    rows = json.loads(zlib.decompress(blob))
+
+    return {
+        path: (size, dt.datetime.fromisoformat(timestamp))
+        for path, size, timestamp in rows
+    }
+
+
+def search_query(
+    key: str, machines: list[str] | None, regex: bool
+) -> tuple[QuerySet[models.PackageContents], Callable[[str], bool]]:
+    """Return the query of the packages to search and the path predicate for the key
+
+    See ContentFiles.search() for the key syntax.
+    """
+    if not key:
+        return contents.none(), lambda _: False
+
+    lookups, matches = search_params(key, regex)
+    if machines is not None:
+        lookups &= Q(binpkg__build__machine__in=machines)
+
+    packages = basenames.filter(lookups).values("binpkg_id")
+
+    return contents.filter(binpkg__in=packages), matches
+
+
+def parse_cursor(cursor: str) -> tuple[int, str]:
+    """Return the BinPkg primary key and path of the given search_page() cursor
+
+    Raise ValueError if the cursor is invalid.
+    """
+    binpkg_id, sep, path = cursor.partition(":")
+
+    if not (sep and binpkg_id.isdigit() and path.startswith("/")):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+    return int(binpkg_id), path
+
+
+def search_params(key: str, regex: bool = False) -> tuple[Q, Callable[[str], bool]]:
+    """Return the basename index lookups and path predicate for the search key
+
+    See ContentFiles.search() for the key syntax. The basename index doesn't help
+    directory searches, so those look at all the packages.
+    """
+    if regex:
+        return pattern_params(regex_pattern(key))
+
+    if (prefix := directory_prefix(key)) is not None:
+        return Q(), lambda p: p.startswith(prefix)
+
+    if "/" in key:
+        path = key if key.startswith("/") else f"/{key}"
+        return Q(basename=split_path(path)[1]), path.__eq__
+
+    if is_glob(key):
+        return pattern_params(glob_pattern(key))
+
+    return Q(basename=key), lambda p: split_path(p)[1] == key
+
+
+def pattern_params(pattern: Pattern) -> tuple[Q, Callable[[str], bool]]:
+    """Return the basename index lookups and path predicate for the glob/regex Pattern
+
+    The lookups select the packages having basenames with the pattern's literal text.
+    """
+    lookups = Q()
+
+    if pattern.prefix:
+        lookups &= Q(**prefix_lookups("basename", pattern.prefix))
+
+    if pattern.suffix:
+        lookups &= Q(basename__endswith=pattern.suffix)
+
+    for fragment in pattern.fragments:
+        lookups &= Q(basename__contains=fragment)
+
+    return lookups, lambda p: pattern.matches(split_path(p)[1])
+
+
+def copy_contents_sql(package_count: int) -> str:
+    """Return the INSERT ... SELECT statement for copying blobs between builds
+
+    The statement's parameters are the same as for copy_binpkgs_sql().
+    """
+    return django_orm.copy_package_rows_sql(
+        models.PackageContents, ("file_count", "files"), package_count
+    )
+
+
+def copy_basenames_sql(package_count: int) -> str:
+    """Return the INSERT ... SELECT statement for copying basenames between builds
+
+    The statement's parameters are the same as for copy_binpkgs_sql().
+    """
+    return django_orm.copy_package_rows_sql(
+        models.PackageBasename, ("basename",), package_count
+    )
+
+
+def models_to_content_files(
+    query: QuerySet[models.PackageContents],
+) -> Iterator[ContentFile]:
+    """Generate the ContentFiles of the given query's packages
+
+    The ContentFiles of a package share a single BinPkg (and Build).
+    """
+    for model in query.select_related("binpkg__build"):
+        binpkg: BinPkg = django_orm.model_to_binpkg(model.binpkg)
+
+        for path, (size, timestamp) in decode(model.files).items():
+            yield ContentFile(
+                binpkg=binpkg, path=Path(path), timestamp=timestamp, size=size
+            )
+
+
+def keyset_content_files(
+    query: QuerySet[models.PackageContents], batch_size: int
+) -> Iterator[tuple[int, ContentFile]]:
+    """Generate the (BinPkg primary key, ContentFile) of the query's packages by key
+
+    The files of each package are generated in path order. The packages are read
+    batch_size at a time, each batch starting after the last key of the previous one.
+    """
+    query = query.select_related("binpkg__build").order_by("binpkg_id")
+    batch_size = max(batch_size, 1)
+    batch = list(query[:batch_size])
+
+    while batch:
+        for model in batch:
+            binpkg: BinPkg = django_orm.model_to_binpkg(model.binpkg)
+
+            for path, (size, timestamp) in decode(model.files).items():
+                yield model.binpkg_id, ContentFile(
+                    binpkg=binpkg, path=Path(path), timestamp=timestamp, size=size
+                )
+
+        if len(batch) < batch_size:
+            return
+
+        batch = list(query.filter(binpkg_id__gt=batch[-1].binpkg_id)[:batch_size])
@@ -1,23 +1,84 @@
 """Django ORM-backed records backend"""
 
-import os.path
-from dataclasses import replace
+# pylint: disable=too-many-lines
+
+import io
+import itertools
+import posixpath
+import sys
+from collections import Counter
+from dataclasses import dataclass, field, replace
 from pathlib import PurePath as Path
-from typing import Any, Iterable
+from typing import Any, Collection, Iterable, Iterator
 
-from django.db import transaction
+from django.db import connection, transaction
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.models import Count, Exists, F, Model, OuterRef, Q, QuerySet, Sum
+from django.db.models.expressions import RawSQL
+from django.db.models.lookups import Lookup
+from django.db.models.sql.compiler import SQLCompiler
 
 from gbp_fl.django.gbp_fl import models
-from gbp_fl.records import RecordNotFound
+from gbp_fl.records import RecordNotFound, directory_prefix, paginate
+from gbp_fl.records.patterns import Pattern, glob_pattern, is_glob, regex_pattern
 from gbp_fl.settings import Settings
-from gbp_fl.types import BinPkg, Build, ContentFile
+from gbp_fl.types import (
+    BinPkg,
+    Build,
+    BuildStats,
+    ContentFile,
+    IndexState,
+    PackageIndex,
+    SearchCount,
+    SearchGroup,
+    SearchPage,
+)
 
 BULK_BATCH_SIZE = 100
+COPY_COLUMNS = ("directory_id", "basename", "reversed_basename", "size", "timestamp")
+UNIQUE_FIELDS = ("binpkg", "directory", "basename")
+UPSERT_FIELDS = ("size", "timestamp")
+UNIQUE_COLUMNS = ("binpkg_id", "directory_id", "basename")
+INGEST_COLUMNS = (*UNIQUE_COLUMNS, "reversed_basename", *UPSERT_FIELDS)
+INGEST_TABLE = "gbp_fl_contentfile_ingest"
+INGEST_ORDER = "ingest_order"
+INGEST_STRATEGIES = ("insert", "copy")
+COPY_NULL = "\\N"
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+TRIGRAM_TABLE = "gbp_fl_basename_trigram"
+TRIGRAM_LENGTH = 3
+
+# The fields whose values, joined with ".", are the names of a SearchGroup
+GROUP_FIELDS: dict[SearchGroup | None, tuple[str, ...]] = {
+    None: (),
+    SearchGroup.MACHINE: ("binpkg__build__machine",),
+    SearchGroup.BUILD: ("binpkg__build__machine", "binpkg__build__build_id"),
+    SearchGroup.CPVB: ("binpkg__cpvb",),
+}
+
+# ContentFile lookups by the fields of its Build and BinPkg
+LOOKUPS = {
+    "machine": "binpkg__build__machine",
+    "build_id": "binpkg__build__build_id",
+    "cpvb": "binpkg__cpvb",
+}
+
+BinPkgKey = tuple[str, str, str]
+"""machine, build_id and cpvb of a BinPkg"""
+
+SQLParams = tuple[str, tuple[Any, ...]]
+"""An SQL expression and its parameters"""
 
 session = models.ContentFile.objects
+builds = models.Build.objects
+binpkgs = models.BinPkg.objects
+directories = models.Directory.objects
+fingerprints = models.PackageFingerprint.objects
+index_states = models.PackageIndex.objects
+build_stats = models.BuildStats.objects
 
 
-class ContentFiles:
+class ContentFiles:  # pylint: disable=too-many-public-methods
     """Django ORM-backed repository for Package files"""
 
     def save(self, content_file: ContentFile, **fields: Any) -> ContentFile:
@@ -26,26 +87,50 @@ class ContentFiles:
         Return the updated ContentFile
         """
         new = replace(content_file, **fields)
-        model = content_file_to_model(new)
+        ids = RowIds()
+        ids.update([new])
 
-        self.maybe_delete(content_file)
-        model.save()
+        if unique_key(new) != unique_key(content_file):
+            self.maybe_delete(content_file)
+        upsert([content_file_to_model(new, ids)])
 
         return new
 
     @transaction.atomic()
     def bulk_save(self, content_files: Iterable[ContentFile]) -> None:
-        """Bulk save a list of ContentFiles"""
-        get_basename = os.path.basename
+        """Bulk save a list of ContentFiles
+
+        ContentFiles that already exist in the database are replaced, so saving a
+        package's files again (for example re-trying a failed index) is safe. Each row
+        is written exactly once.
+
+        content_files is consumed RECORDS_BACKEND_DJANGO_BULK_BATCH_SIZE items at a
+        time, so memory use is bounded by the batch size rather than the number of
+        ContentFiles.
+
+        The RECORDS_BACKEND_DJANGO_INGEST setting determines how the rows are written:
+
+            - "insert": batched INSERT statements
+            - "copy": on PostgreSQL the rows are streamed using COPY. Other databases
+              use "insert"
+        """
         settings = Settings.from_environ()
         batch_size = settings.RECORDS_BACKEND_DJANGO_BULK_BATCH_SIZE
+        ingest = settings.RECORDS_BACKEND_DJANGO_INGEST
 
-        items = session.bulk_create(
-            (content_file_to_model(cf) for cf in content_files), batch_size=batch_size
-        )
-        for item in items:
-            item.basename = get_basename(item.path)
-        session.bulk_update(items, ["basename"], batch_size=batch_size)
+        if ingest not in INGEST_STRATEGIES:
+            raise ValueError(f"Invalid RECORDS_BACKEND_DJANGO_INGEST: {ingest}")
+
+        if ingest == "copy" and connection.vendor == "postgresql":
+            copy_ingest(content_files, batch_size)
+            return
+
+        ids = RowIds()
+        for batch in itertools.batched(content_files, batch_size):
+            ids.update(batch)
+            # A statement can't upsert the same row twice, so the last one wins
+            items = {unique_key(cf): content_file_to_model(cf, ids) for cf in batch}
+            upsert(list(items.values()))
 
     def get(
         self, machine: str, build_id: str, cpvb: str, path: str | Path
@@ -69,13 +154,24 @@ class ContentFiles:
         model.delete()
 
     def deindex_build(self, machine: str, build_id: str) -> None:
-        """Delete all content files for the given build"""
-        session.filter(machine=machine, build_id=build_id).delete()
+        """Delete all content files (and the stats) for the given build"""
+        session.filter(
+            binpkg__build__machine=machine, binpkg__build__build_id=build_id
+        ).delete()
+        binpkgs.filter(build__machine=machine, build__build_id=build_id).delete()
+        builds.filter(machine=machine, build_id=build_id).delete()
+        fingerprints.filter(machine=machine, build_id=build_id).delete()
+        index_states.filter(machine=machine, build_id=build_id).delete()
+        build_stats.filter(machine=machine, build_id=build_id).delete()
 
     def exists(self, machine: str, build_id: str, cpvb: str, path: str | Path) -> bool:
         """Return true if a package file with matching criteria exists in the db"""
-        path = str(path)
-        query = session.filter(machine=machine, build_id=build_id, cpvb=cpvb, path=path)
+        query = session.filter(
+            binpkg__build__machine=machine,
+            binpkg__build__build_id=build_id,
+            binpkg__cpvb=cpvb,
+            **path_lookup(path),
+        )
         return query.exists()
 
     def count(self, machine: str | None, build_id: str | None, cpvb: str | None) -> int:
@@ -91,40 +187,76 @@ class ContentFiles:
 
         All other combinations raise ValueError
         """
-        params = {"machine": machine, "build_id": build_id, "cpvb": cpvb}
-        query_dict: dict[str, Any] = {}
+        return session.filter(**count_lookups(machine, build_id, cpvb)).count()
 
-        previous = ""
-        for field, value in params.items():
-            if value:
-                if previous and previous not in query_dict:
-                    raise ValueError(f"Must supply {previous} if supplying {field}")
-                query_dict[field] = value
-            previous = field
+    def update_build_stats(
+        self, build: Build, index_duration: float | None = None
+    ) -> BuildStats:
+        """Store (and return) the stats of the given build's indexed files
 
-        return session.filter(**query_dict).count()
+        The stats are aggregated by a single query over the build's ContentFiles.
+        """
+        totals = session.filter(
+            binpkg__build__machine=build.machine, binpkg__build__build_id=build.build_id
+        ).aggregate(
+            file_count=Count("id"),
+            total_size=Sum("size", default=0),
+            package_count=Count("binpkg", distinct=True),
+        )
+
+        return save_build_stats(
+            BuildStats(build=build, index_duration=index_duration, **totals)
+        )
+
+    def get_build_stats(
+        self, machine: str | None = None, build_id: str | None = None
+    ) -> list[BuildStats]:
+        """Return the stored stats of the builds
+
+        If machine is given, return only the stats of the machine's builds. If build_id
+        is also given, only those of the build. Raise ValueError if build_id is given
+        without machine.
+        """
+        if build_id and not machine:
+            raise ValueError("Must supply machine if supplying build_id")
+
+        lookups = {"machine": machine, "build_id": build_id}
+        query = build_stats.filter(
+            **{name: value for name, value in lookups.items() if value}
+        )
+
+        return [
+            model_to_build_stats(model)
+            for model in query.order_by("machine", "build_id")
+        ]
 
     def for_package(
         self, machine: str, build_id: str, cpvb: str
     ) -> Iterable[ContentFile]:
         """Return all ContentFiles for the given build and cpvb"""
-        query = session.filter(machine=machine, build_id=build_id, cpvb=cpvb)
-        yield from (model_to_content_file(model) for model in query)
+        query = session.filter(
+            binpkg__build__machine=machine,
+            binpkg__build__build_id=build_id,
+            binpkg__cpvb=cpvb,
+        )
+        yield from models_to_content_files(query)
 
     def for_build(self, machine: str, build_id: str) -> Iterable[ContentFile]:
         """Return all ContentFiles for the given build"""
-        query = session.filter(machine=machine, build_id=build_id)
+        query = session.filter(
+            binpkg__build__machine=machine, binpkg__build__build_id=build_id
+        )
 
-        yield from (model_to_content_file(model) for model in query)
+        yield from models_to_content_files(query)
 
     def for_machine(self, machine: str) -> Iterable[ContentFile]:
         """Return all ContentFiles for the given machine"""
-        query = session.filter(machine=machine)
+        query = session.filter(binpkg__build__machine=machine)
 
-        yield from (model_to_content_file(model) for model in query)
+        yield from models_to_content_files(query)
 
     def search(
-        self, key: str, machines: list[str] | None = None
+        self, key: str, machines: list[str] | None = None, *, regex: bool = False
     ) -> Iterable[ContentFile]:
         """Search the database for package files
 
@@ -133,56 +265,236 @@ class ContentFiles:
 
         The simple search key works like the following:
 
-            - A key without "*" or "/" characters searches an exact match on the file's
-              base name. For example if the key is "bash" then it matches "/bin/bash"
-              but not "/usr/bin/bashbug"
+            - A key without "/" characters or glob wildcards ("*", "?" and "[")
+              searches an exact match on the file's base name. For example if the key
+              is "bash" then it matches "/bin/bash" but not "/usr/bin/bashbug"
 
             - Keys containing at least one "/" are interpreted as exact path matches.
               For example the key "/bin/bash" matches files whose path is exactly
               "/bin/bash". If the key does not start with a forward slash then it is
               automatically prepended.
 
-            - Keys with an asterisk either at the start and/or end of the key perform
-              wildcard matches but only on the basename of the file. For example the key
-              "b*" matches "/bin/bash" and "/usr/bin/bashbug" but not
-              "/usr/share/baselayout/fstab". Keys with an asterisk in the middle depend
-              on the backend and are not guaranteed to provide the expected matches.
+            - Keys ending with "/" (or "/**") match all the files under the given
+              directory, at any depth. For example the key "/usr/lib/python3.12/"
+              matches "/usr/lib/python3.12/os.py" and
+              "/usr/lib/python3.12/json/__init__.py". As with exact path matches a
+              leading forward slash is prepended if missing.
+
+            - Other keys with glob wildcards are glob patterns (as in fnmatch: "*",
+              "?" and "[...]") matched against the basename of the file. For example
+              the key "b*" matches "/bin/bash" and "/usr/bin/bashbug" but not
+              "/usr/share/baselayout/fstab". The key "lib*ssl*.so*" matches
+              "/usr/lib64/libssl.so.3" and "lib?.so" matches "/lib64/libc.so".
 
             - A key that's the empty string ("") matches nothing.
 
-            - A key that contains nothing bug asterisks (e.g. "*") depends on the
-              backend and are not guaranteed to provided the expected matches.
+        If regex is true, the key is instead a regular expression that's searched for
+        (as with re.search()) in the basename of the file. Raise ValueError if the
+        regular expression is invalid.
+
+        Globs and regexes are pre-filtered by the literal text that they require: a
+        prefix through the basename index, a suffix through the reversed basename
+        index and any other fragments through the trigram index, if there is one. Only
+        the candidates are matched exactly. See pattern_filter(). Globs whose only
+        wildcards are "*" and "?" are matched by the database itself. See Glob.
         """
-        if not key:
+        query, pattern = search_query(key, machines, regex)
+
+        if pattern is None:
+            yield from models_to_content_files(query)
             return
 
-        params: dict[str, Any] = (
-            {"machine__in": machines} if machines is not None else {}
+        yield from (
+            content_file
+            for content_file in models_to_content_files(query)
+            if pattern.matches(content_file.path.name)
         )
 
-        if "/" in key:
-            if key[0] != "/":
-                key = f"/{key}"
-            params["path"] = key
-        elif key.startswith("*") and key.endswith("*"):
-            params["basename__contains"] = key.strip("*")
-        elif key.startswith("*"):
-            params["basename__endswith"] = key.lstrip("*")
-        elif key.endswith("*"):
-            params["basename__startswith"] = key.rstrip("*")
-        else:
-            params["basename"] = key
+    def search_page(
+        self,
+        key: str,
+        machines: list[str] | None = None,
+        *,
+        regex: bool = False,
+        first: int = 100,
+        after: str | None = None,
+    ) -> SearchPage:
+        """Return a page of the results of search()
+
+        The results are ordered by their primary key, which is also the cursor. Pages
+        are read through the primary key index a page (plus one) at a time.
+        """
+        query, pattern = search_query(key, machines, regex)
+
+        if after is not None:
+            query = query.filter(id__gt=parse_cursor(after))
+
+        results = (
+            (str(id_), content_file)
+            for id_, content_file in keyset_content_files(query, first + 1)
+            if pattern is None or pattern.matches(content_file.path.name)
+        )
+
+        return paginate(results, first)
 
-        query = session.filter(**params)
+    def search_count(
+        self,
+        key: str,
+        machines: list[str] | None = None,
+        *,
+        regex: bool = False,
+        group_by: SearchGroup | None = None,
+    ) -> SearchCount:
+        """Return the number of results of search()
 
-        yield from (model_to_content_file(model) for model in query)
+        Searches not needing a pattern match in Python, which is all but regexes and
+        globs with "[...]", are counted (and grouped) by the database. Otherwise only
+        the basenames (and group fields) of the candidates are read to be matched.
+        """
+        query, pattern = search_query(key, machines, regex)
+        fields = GROUP_FIELDS[group_by]
+        groups: Counter[str] = Counter()
+
+        if pattern is None and not fields:
+            groups[""] = query.count()
+        elif pattern is None:
+            counts = query.order_by().values_list(*fields).annotate(count=Count("id"))
+            groups.update({".".join(row[:-1]): row[-1] for row in counts})
+        else:
+            rows = query.order_by().values_list("basename", *fields).iterator()
+            groups.update(".".join(row[1:]) for row in rows if pattern.matches(row[0]))
+
+        return SearchCount.from_groups(groups, group_by)
 
     def get_builds(self) -> Iterable[Build]:
         """Return all the builds that have indexed files"""
-        query = session.values("machine", "build_id").distinct().order_by()
+        has_files = Exists(session.filter(binpkg__build=OuterRef("pk")))
+        query = builds.filter(has_files).values("machine", "build_id")
 
         return (Build(machine=i["machine"], build_id=i["build_id"]) for i in query)
 
+    @transaction.atomic()
+    def copy_packages(self, source: Build, dest: Build, cpvbs: Iterable[str]) -> int:
+        """Copy the ContentFiles of the given packages from the source to dest build
+
+        This is used to index packages that are unchanged from a previous build
+        without having to re-read the binpkgs. The copied packages are marked as
+        IndexState.DONE in the dest build. Return the number of packages copied.
+        Packages the source build does not have are not copied. Packages with no
+        files are copied if they are IndexState.DONE in the source build.
+
+        The rows are copied server-side using INSERT ... SELECT. Rows the dest build
+        already has (e.g. from an earlier, partial indexing) are kept.
+        """
+        settings = Settings.from_environ()
+        batch_size = settings.RECORDS_BACKEND_DJANGO_BULK_BATCH_SIZE
+        copied = 0
+
+        if (source_pk := get_build_pks([source]).get(source)) is None:
+            return copied
+        dest_pk = get_or_create_build_pks([dest])[dest]
+
+        with connection.cursor() as cursor:
+            for batch in itertools.batched(cpvbs, batch_size):
+                pks: list[int | str] = [dest_pk, source_pk, *batch]
+                params = [dest.machine, dest.build_id, source.machine, source.build_id]
+                state = [dest.machine, dest.build_id, IndexState.DONE.value]
+                cursor.execute(copy_binpkgs_sql(len(batch)), pks)
+                for statement in self.copy_files_sql(len(batch)):
+                    cursor.execute(statement, pks)
+                cursor.execute(copy_fingerprints_sql(len(batch)), [*params, *batch])
+                cursor.execute(
+                    self.copy_index_states_sql(len(batch)),
+                    [*state, *pks[1:], *params[2:], IndexState.DONE.value, *batch],
+                )
+                copied += cursor.rowcount
+
+        return copied
+
+    def copy_files_sql(self, package_count: int) -> list[str]:
+        """Return the statements copy_packages() uses to copy the packages' files
+
+        The statements' parameters are the same as for copy_binpkgs_sql().
+        """
+        return [copy_packages_sql(package_count)]
+
+    def copy_index_states_sql(self, package_count: int) -> str:
+        """Return the statement copy_packages() uses to mark the packages indexed"""
+        return copy_index_states_sql(package_count)
+
+    @transaction.atomic()
+    def deindex_package(self, build: Build, cpvb: str) -> None:
+        """Delete all the records for the given build's package
+
+        This includes the package's files, fingerprint and index state.
+        """
+        params = {"machine": build.machine, "build_id": build.build_id, "cpvb": cpvb}
+        binpkg = binpkgs.filter(
+            build__machine=build.machine, build__build_id=build.build_id, cpvb=cpvb
+        )
+
+        session.filter(binpkg__in=binpkg).delete()
+        binpkg.delete()
+        fingerprints.filter(**params).delete()
+        index_states.filter(**params).delete()
+
+    def save_index_state(
+        self, build: Build, cpvb: str, state: IndexState, file_count: int = 0
+    ) -> None:
+        """Record the indexing state of the given build's package"""
+        index_states.update_or_create(
+            machine=build.machine,
+            build_id=build.build_id,
+            cpvb=cpvb,
+            defaults={"state": state.value, "file_count": file_count},
+        )
+
+    def get_index_states(self, build: Build) -> dict[str, PackageIndex]:
+        """Return the indexing states of the given build's packages keyed by cpvb"""
+        query = index_states.filter(
+            machine=build.machine, build_id=build.build_id
+        ).values("cpvb", "state", "file_count")
+
+        return {
+            row["cpvb"]: PackageIndex(
+                build=build,
+                cpvb=row["cpvb"],
+                state=IndexState(row["state"]),
+                file_count=row["file_count"],
+            )
+            for row in query
+        }
+
+    def save_fingerprint(self, build: Build, cpvb: str, fingerprint: str) -> None:
+        """Record the fingerprint of the given build's binpkg file"""
+        fingerprints.update_or_create(
+            machine=build.machine,
+            build_id=build.build_id,
+            cpvb=cpvb,
+            defaults={"fingerprint": fingerprint},
+        )
+
+    def find_fingerprint(self, fingerprint: str, cpvb: str) -> Build | None:
+        """Return a build having the given package indexed from an identical binpkg
+
+        That is, a build where the package's binpkg has the given fingerprint and the
+        package is IndexState.DONE. If no such build exists, return None.
+        """
+        done = index_states.filter(
+            machine=OuterRef("machine"),
+            build_id=OuterRef("build_id"),
+            cpvb=cpvb,
+            state=IndexState.DONE.value,
+        )
+        query = fingerprints.filter(
+            Exists(done), fingerprint=fingerprint, cpvb=cpvb
+        ).values("machine", "build_id")
+
+        if found := query.first():
+            return Build(machine=found["machine"], build_id=found["build_id"])
+
+        return None
+
     def maybe_delete(self, content_file: ContentFile) -> bool:
         """Delete the object given ContentFile from the database
 
@@ -196,6 +508,27 @@ class ContentFiles:
         return True
 
 
+def count_lookups(
+    machine: str | None, build_id: str | None, cpvb: str | None
+) -> dict[str, str]:
+    """Return the lookups for ContentFiles.count()'s parameters
+
+    Raise ValueError if the combination of parameters is not supported.
+    """
+    params = {"machine": machine, "build_id": build_id, "cpvb": cpvb}
+    query_dict: dict[str, str] = {}
+
+    previous = ""
+    for param, value in params.items():
+        if value:
+            if previous and LOOKUPS[previous] not in query_dict:
+                raise ValueError(f"Must supply {previous} if supplying {param}")
+            query_dict[LOOKUPS[param]] = value
+        previous = param
+
+    return query_dict
+
+
 def get_model(
     machine: str, build_id: str, cpvb: str, path: Path | str
 ) -> models.ContentFile:
@@ -203,42 +536,695 @@ def get_model(
 
     If no model exists, raise RecordNotFound.
     """
-    path = str(path)
     try:
-        return session.get(machine=machine, build_id=build_id, cpvb=cpvb, path=path)
+        return session.select_related("binpkg__build", "directory").get(
+            binpkg__build__machine=machine,
+            binpkg__build__build_id=build_id,
+            binpkg__cpvb=cpvb,
+            **path_lookup(path),
+        )
     except models.ContentFile.DoesNotExist:
         raise RecordNotFound from None
 
 
-def content_file_to_model(content_file: ContentFile) -> models.ContentFile:
+def upsert(items: list[models.ContentFile]) -> list[models.ContentFile]:
+    """Insert the given ContentFile models, replacing any that already exist
+
+    This is done with a single INSERT ... ON CONFLICT (or equivalent) statement.
+    """
+    return session.bulk_create(
+        items,
+        update_conflicts=True,
+        unique_fields=UNIQUE_FIELDS,
+        update_fields=UPSERT_FIELDS,
+    )
+
+
+def copy_ingest(content_files: Iterable[ContentFile], batch_size: int) -> None:
+    """Save the given ContentFiles using PostgreSQL's COPY
+
+    The rows are COPY'd into a temporary table and from there upserted into the
+    ContentFile table, so existing rows are replaced as with upsert(). Of the
+    ContentFiles given more than once the last one is saved. The rows are sent
+    `batch_size` at a time.
+    """
+    # pylint: disable=import-outside-toplevel
+    from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+    ids = RowIds()
+
+    with connection.cursor() as cursor:
+        for statement in ingest_table_sql():
+            cursor.execute(statement)
+
+        dbapi_cursor = cursor.cursor
+        for batch in itertools.batched(content_files, batch_size):
+            ids.update(batch)
+            chunk = "".join(copy_row(cf, ids) for cf in batch)
+
+            if is_psycopg3:
+                with dbapi_cursor.copy(copy_sql()) as copy:
+                    copy.write(chunk)
+            else:
+                dbapi_cursor.copy_expert(copy_sql(), io.StringIO(chunk))
+
+        cursor.execute(ingest_sql())
+
+
+def copy_row(content_file: ContentFile, ids: "RowIds") -> str:
+    """Return the given ContentFile as a line of COPY's text format
+
+    ids holds the ContentFile's BinPkg and Directory row ids. The columns are given
+    by INGEST_COLUMNS. An unknown size is written as NULL.
+    """
+    basename = split_path(content_file.path)[1]
+    values = (
+        str(ids.binpkg_id(content_file)),
+        str(ids.directory_id(content_file)),
+        basename,
+        basename[::-1],
+        None if content_file.size is None else str(content_file.size),
+        content_file.timestamp.isoformat(),
+    )
+
+    return (
+        "\t".join(
+            COPY_NULL if value is None else value.translate(COPY_ESCAPES)
+            for value in values
+        )
+        + "\n"
+    )
+
+
+def ingest_table_sql() -> Iterator[str]:
+    """Generate the statements preparing the (empty) temporary table for copy_ingest()
+
+    Besides the INGEST_COLUMNS, the table's INGEST_ORDER column numbers the rows in
+    the order they were copied.
+    """
+    qn = connection.ops.quote_name
+    columns = ", ".join(qn(column) for column in INGEST_COLUMNS)
+    table = qn(models.ContentFile._meta.db_table)
+
+    yield (
+        f"CREATE TEMPORARY TABLE IF NOT EXISTS {qn(INGEST_TABLE)}"
+        f" AS SELECT {columns} FROM {table} WITH NO DATA"
+    )
+    yield (
+        f"ALTER TABLE {qn(INGEST_TABLE)}"
+        f" ADD COLUMN IF NOT EXISTS {qn(INGEST_ORDER)} BIGSERIAL"
+    )
+    yield f"TRUNCATE {qn(INGEST_TABLE)}"
+
+
+def copy_sql() -> str:
+    """Return the COPY statement for copy_ingest()"""
+    qn = connection.ops.quote_name
+    columns = ", ".join(qn(column) for column in INGEST_COLUMNS)
+
+    return f"COPY {qn(INGEST_TABLE)} ({columns}) FROM STDIN"
+
+
+def ingest_sql() -> str:
+    """Return the statement upserting the copy_ingest() rows into the ContentFile table
+
+    A statement can't upsert the same row twice, so of the rows copied more than once
+    only the last one is selected.
+    """
+    qn = connection.ops.quote_name
+    columns = ", ".join(qn(column) for column in INGEST_COLUMNS)
+    unique = ", ".join(qn(column) for column in UNIQUE_COLUMNS)
+    updates = ", ".join(
+        f"{qn(column)} = EXCLUDED.{qn(column)}" for column in UPSERT_FIELDS
+    )
+    table = qn(models.ContentFile._meta.db_table)
+
+    return (
+        f"INSERT INTO {table} ({columns})"
+        f" SELECT DISTINCT ON ({unique}) {columns} FROM {qn(INGEST_TABLE)}"
+        f" ORDER BY {unique}, {qn(INGEST_ORDER)} DESC"
+        f" ON CONFLICT ({unique}) DO UPDATE SET {updates}"
+    )
+
+
+def search_query(
+    key: str, machines: list[str] | None, regex: bool
+) -> tuple[QuerySet[models.ContentFile], Pattern | None]:
+    """Return the query of the ContentFile models that may match the search key
+
+    See ContentFiles.search() for the key syntax. For globs and regexes the query
+    holds the pre-filtered candidates and the Pattern they must (also) match is
+    returned. Otherwise, including for globs the database matches, the Pattern is
+    None.
+    """
+    if not key:
+        return session.none(), None
+
+    params: dict[str, Any] = (
+        {"binpkg__build__machine__in": machines} if machines is not None else {}
+    )
+    pattern: Pattern | None = None
+
+    if regex:
+        pattern = regex_pattern(key)
+    elif (prefix := directory_prefix(key)) is not None:
+        params["directory__in"] = directories.filter(
+            Q(path=prefix.rstrip("/") or "/") | Q(**prefix_lookups("path", prefix))
+        )
+    elif "/" in key:
+        if key[0] != "/":
+            key = f"/{key}"
+        params.update(path_lookup(key))
+    elif is_glob(key):
+        pattern = glob_pattern(key)
+    else:
+        params["basename"] = key
+
+    query = session.filter(**params)
+
+    if pattern is None:
+        return query, None
+
+    query = pattern_filter(query, pattern)
+
+    if not regex and Glob.supports(key, connection):
+        return query.filter(Glob(F("basename"), key)), None
+
+    return query, pattern
+
+
+def parse_cursor(cursor: str) -> int:
+    """Return the primary key of the given search_page() cursor
+
+    Raise ValueError if the cursor is invalid.
+    """
+    if not cursor.isdigit():
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+    return int(cursor)
+
+
+def prefix_lookups(field_name: str, prefix: str) -> dict[str, str]:
+    """Return the lookups for the given field's values starting with prefix
+
+    On PostgreSQL the startswith lookup is served by the pattern index Django creates
+    for indexed CharFields. SQLite's LIKE can't use an ordinary index, so there the
+    prefix is also given as the equivalent range of values, which can.
+    """
+    lookups = {f"{field_name}__startswith": prefix}
+
+    if connection.vendor == "sqlite" and prefix and prefix[-1] != chr(sys.maxunicode):
+        lookups[f"{field_name}__gte"] = prefix
+        lookups[f"{field_name}__lt"] = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+    return lookups
+
+
+def pattern_filter(
+    query: QuerySet[models.ContentFile], pattern: Pattern
+) -> QuerySet[models.ContentFile]:
+    """Restrict the query to ContentFiles having the pattern's literal text
+
+    This selects the candidates for the pattern, not (necessarily) the matches.
+    """
+    if pattern.prefix:
+        query = query.filter(**prefix_lookups("basename", pattern.prefix))
+
+    if pattern.suffix:
+        query = query.filter(
+            **prefix_lookups("reversed_basename", pattern.suffix[::-1])
+        )
+
+    for fragment in pattern.fragments:
+        query = query.filter(basename__contains=fragment)
+
+    return trigram_prefilter(query, pattern.fragments)
+
+
+def trigram_prefilter(
+    query: QuerySet[models.ContentFile], substrings: Iterable[str]
+) -> QuerySet[models.ContentFile]:
+    """Restrict the query to ContentFiles whose basename may contain the substrings
+
+    On SQLite the candidates are looked up in the FTS5 trigram table. The query's own
+    basename lookups still apply to them. On PostgreSQL the planner uses the pg_trgm
+    index for the LIKEs themselves, so the query is returned as is. So is it when
+    there is no trigram table or the substrings are shorter than a trigram.
+    """
+    substrings = [
+        substring for substring in substrings if len(substring) >= TRIGRAM_LENGTH
+    ]
+
+    if (
+        connection.vendor != "sqlite"
+        or not substrings
+        or TRIGRAM_TABLE not in connection.introspection.table_names()
+    ):
+        return query
+
+    table = connection.ops.quote_name(TRIGRAM_TABLE)
+    # Quoted as FTS5 strings so the substrings' characters have no special meaning
+    quoted = (substring.replace('"', '""') for substring in substrings)
+    phrases = " AND ".join(f'"{substring}"' for substring in quoted)
+    candidates = RawSQL(f"SELECT rowid FROM {table} WHERE {table} MATCH %s", [phrases])
+
+    return query.filter(id__in=candidates)
+
+
+# pylint: disable-next=abstract-method
+class Glob(Lookup):
+    """Lookup of the values matching a glob whose only wildcards are "*" and "?"
+
+    SQLite's GLOB operator matches these globs as is. On PostgreSQL the glob is
+    translated to the equivalent LIKE pattern. Both are case-sensitive, like
+    fnmatch.fnmatchcase(). Other globs and databases are not supported.
+    """
+
+    lookup_name = "glob"
+    vendors = frozenset({"sqlite", "postgresql"})
+
+    @classmethod
+    def supports(cls, key: str, db: BaseDatabaseWrapper) -> bool:
+        """Return True if the glob can be matched with the given database"""
+        return "[" not in key and db.vendor in cls.vendors
+
+    def as_sqlite(self, compiler: SQLCompiler, db: BaseDatabaseWrapper) -> SQLParams:
+        """Return the GLOB expression and its parameters"""
+        lhs, lhs_params = self.process_lhs(compiler, db)
+        rhs, rhs_params = self.process_rhs(compiler, db)
+
+        return f"{lhs} GLOB {rhs}", (*lhs_params, *rhs_params)
+
+    def as_postgresql(
+        self, compiler: SQLCompiler, db: BaseDatabaseWrapper
+    ) -> SQLParams:
+        """Return the LIKE expression and its parameters"""
+        lhs, lhs_params = self.process_lhs(compiler, db)
+        rhs, rhs_params = self.process_rhs(compiler, db)
+        patterns = (
+            db.ops.prep_for_like_query(str(param)).replace("*", "%").replace("?", "_")
+            for param in rhs_params
+        )
+
+        return f"{lhs} LIKE {rhs}", (*lhs_params, *patterns)
+
+
+def unique_key(content_file: ContentFile) -> tuple[str, str, str, str]:
+    """Return the fields that uniquely identify the ContentFile in the database"""
+    return (*binpkg_key(content_file.binpkg), str(content_file.path))
+
+
+def binpkg_key(binpkg: BinPkg) -> BinPkgKey:
+    """Return the fields that uniquely identify the BinPkg in the database"""
+    return (binpkg.build.machine, binpkg.build.build_id, binpkg.cpvb())
+
+
+def split_path(path: str | Path) -> tuple[str, str]:
+    """Split the given path into its directory and basename"""
+    return posixpath.split(str(path))
+
+
+def path_lookup(path: str | Path) -> dict[str, str]:
+    """Return the ContentFile lookups for the given (full) path"""
+    directory, basename = split_path(path)
+
+    return {"directory__path": directory, "basename": basename}
+
+
+@dataclass
+class RowIds:
+    """The BinPkg and Directory row ids of the ContentFiles being written
+
+    Only the ids of the last update()'s ContentFiles are kept, so when ContentFiles are
+    written in batches memory use is bounded by the batch size.
+    """
+
+    binpkgs: dict[BinPkgKey, int] = field(default_factory=dict)
+    directories: dict[str, int] = field(default_factory=dict)
+
+    def update(self, content_files: Collection[ContentFile]) -> None:
+        """Look up (or create) the row ids of the given ContentFiles"""
+        self.binpkgs = get_binpkg_ids((cf.binpkg for cf in content_files), self.binpkgs)
+        self.directories = get_directory_ids(content_files, self.directories)
+
+    def binpkg_id(self, content_file: ContentFile) -> int:
+        """Return the id of the given ContentFile's BinPkg row"""
+        return self.binpkgs[binpkg_key(content_file.binpkg)]
+
+    def directory_id(self, content_file: ContentFile) -> int:
+        """Return the id of the given ContentFile's Directory row"""
+        return self.directories[split_path(content_file.path)[0]]
+
+
+def get_binpkg_ids(
+    items: Iterable[BinPkg], known: dict[BinPkgKey, int]
+) -> dict[BinPkgKey, int]:
+    """Return the row ids of the given BinPkgs
+
+    The ids are keyed by binpkg_key(). Ids already in `known` are reused. Build and
+    BinPkg rows that don't exist are created.
+    """
+    packages = {binpkg_key(binpkg): binpkg for binpkg in items}
+    ids = {key: known[key] for key in packages if key in known}
+
+    if missing := [binpkg for key, binpkg in packages.items() if key not in ids]:
+        ids.update(lookup_binpkg_ids(missing))
+
+    if missing := [binpkg for key, binpkg in packages.items() if key not in ids]:
+        create_binpkgs(missing)
+        ids.update(lookup_binpkg_ids(missing))
+
+    return ids
+
+
+def get_directory_ids(
+    content_files: Iterable[ContentFile], known: dict[str, int]
+) -> dict[str, int]:
+    """Return the Directory row ids of the given ContentFiles' directories
+
+    The ids are keyed by the directory path. Ids already in `known` are reused.
+    Directory rows that don't exist are created.
+    """
+    paths = {split_path(cf.path)[0] for cf in content_files}
+    ids = {path: known[path] for path in paths if path in known}
+
+    if missing := paths - ids.keys():
+        ids.update(directories.filter(path__in=missing).values_list("path", "id"))
+
+    if missing := paths - ids.keys():
+        directories.bulk_create(
+            [models.Directory(path=path) for path in missing], ignore_conflicts=True
+        )
+        ids.update(directories.filter(path__in=missing).values_list("path", "id"))
+
+    return ids
+
+
+def lookup_binpkg_ids(items: Collection[BinPkg]) -> dict[BinPkgKey, int]:
+    """Return the row ids of the given BinPkgs that exist in the database"""
+    wanted = {binpkg_key(binpkg) for binpkg in items}
+    query = binpkgs.filter(
+        build__machine__in={key[0] for key in wanted},
+        build__build_id__in={key[1] for key in wanted},
+        cpvb__in={key[2] for key in wanted},
+    ).values_list("id", "build__machine", "build__build_id", "cpvb")
+
+    return {
+        (machine, build_id, cpvb): pk
+        for pk, machine, build_id, cpvb in query
+        if (machine, build_id, cpvb) in wanted
+    }
+
+
+def create_binpkgs(items: Collection[BinPkg]) -> None:
+    """Create the BinPkg (and Build) rows for the given BinPkgs
+
+    Rows that already exist are left alone.
+    """
+    build_pks = get_or_create_build_pks({binpkg.build for binpkg in items})
+
+    binpkgs.bulk_create(
+        [
+            models.BinPkg(
+                build_id=build_pks[binpkg.build],
+                cpvb=binpkg.cpvb(),
+                repo=binpkg.repo,
+                build_time=binpkg.build_time,
+            )
+            for binpkg in items
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def get_build_pks(items: Collection[Build]) -> dict[Build, int]:
+    """Return the row ids of the given Builds that exist in the database"""
+    query = builds.filter(
+        machine__in={build.machine for build in items},
+        build_id__in={build.build_id for build in items},
+    ).values_list("id", "machine", "build_id")
+    wanted = set(items)
+
+    return {
+        build: pk
+        for pk, machine, build_id in query
+        if (build := Build(machine=machine, build_id=build_id)) in wanted
+    }
+
+
+def get_or_create_build_pks(items: Collection[Build]) -> dict[Build, int]:
+    """Return the row ids of the given Builds, creating the rows as needed"""
+    build_pks = get_build_pks(items)
+
+    if missing := [build for build in items if build not in build_pks]:
+        builds.bulk_create(
+            [models.Build(machine=b.machine, build_id=b.build_id) for b in missing],
+            ignore_conflicts=True,
+        )
+        build_pks.update(get_build_pks(missing))
+
+    return build_pks
+
+
+def copy_binpkgs_sql(package_count: int) -> str:
+    """Return the INSERT ... SELECT statement for copying BinPkg rows between builds
+
+    BinPkgs the destination build already has are skipped. The statement's parameters
+    are the destination and source Build row ids followed by `package_count` cpvbs.
+    """
+    qn = connection.ops.quote_name
+    table = qn(models.BinPkg._meta.db_table)
+    columns = ", ".join(qn(column) for column in ("cpvb", "repo", "build_time"))
+    placeholders = ", ".join(["%s"] * package_count)
+
+    return (
+        f"INSERT INTO {table} ({qn('build_id')}, {columns})"
+        f" SELECT %s, {columns} FROM {table}"
+        f" WHERE {qn('build_id')} = %s AND {qn('cpvb')} IN ({placeholders})"
+        " ON CONFLICT DO NOTHING"
+    )
+
+
+def copy_packages_sql(package_count: int) -> str:
+    """Return the INSERT ... SELECT statement for copying packages between builds
+
+    The copies reference the destination build's BinPkg rows, so copy_binpkgs_sql()
+    must be executed first. The statement's parameters are the same as for
+    copy_binpkgs_sql().
+    """
+    return copy_package_rows_sql(models.ContentFile, COPY_COLUMNS, package_count)
+
+
+def copy_package_rows_sql(
+    model: type[Model], copy_columns: tuple[str, ...], package_count: int
+) -> str:
+    """Return an INSERT ... SELECT statement copying the model's rows between builds
+
+    The model's rows reference a BinPkg through their binpkg_id column. The copies
+    reference the destination build's BinPkg rows. Rows conflicting with ones the
+    destination already has are skipped. The statement's parameters are the same as
+    for copy_binpkgs_sql().
+    """
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    binpkg_table = qn(models.BinPkg._meta.db_table)
+    columns = ", ".join(qn(column) for column in copy_columns)
+    source_columns = ", ".join(f"f.{qn(column)}" for column in copy_columns)
+    placeholders = ", ".join(["%s"] * package_count)
+
+    return (
+        f"INSERT INTO {table} ({qn('binpkg_id')}, {columns})"
+        f" SELECT d.{qn('id')}, {source_columns} FROM {table} f"
+        f" JOIN {binpkg_table} s ON s.{qn('id')} = f.{qn('binpkg_id')}"
+        f" JOIN {binpkg_table} d ON d.{qn('cpvb')} = s.{qn('cpvb')}"
+        f" WHERE d.{qn('build_id')} = %s AND s.{qn('build_id')} = %s"
+        f" AND s.{qn('cpvb')} IN ({placeholders})"
+        " ON CONFLICT DO NOTHING"
+    )
+
+
+def copy_fingerprints_sql(package_count: int) -> str:
+    """Return the INSERT ... SELECT statement for copying fingerprints between builds
+
+    Fingerprints the destination build already has are kept. The statement's
+    parameters are the destination machine and build_id, the source
+    machine and build_id, followed by `package_count` cpvbs.
+    """
+    qn = connection.ops.quote_name
+    table = qn(models.PackageFingerprint._meta.db_table)
+    columns = ", ".join(qn(column) for column in ("cpvb", "fingerprint"))
+    placeholders = ", ".join(["%s"] * package_count)
+
+    return (
+        f"INSERT INTO {table} ({qn('machine')}, {qn('build_id')}, {columns})"
+        f" SELECT %s, %s, {columns} FROM {table}"
+        f" WHERE {qn('machine')} = %s AND {qn('build_id')} = %s"
+        f" AND {qn('cpvb')} IN ({placeholders})"
+        " ON CONFLICT DO NOTHING"
+    )
+
+
+def copy_index_states_sql(
+    package_count: int,
+    model: type[Model] = models.ContentFile,
+    file_count: str | None = None,
+) -> str:
+    """Return the INSERT ... SELECT statement marking copied packages as indexed
+
+    The packages are the source build's BinPkgs along with its IndexState.DONE
+    packages, which include the packages with no files (and so no BinPkg). The file
+    counts are taken from the source build's rows of the given model, which reference
+    a BinPkg through their binpkg_id column. file_count is the SQL aggregate of a
+    package's (f) rows giving its number of files, COUNT(f.id) by default. It must
+    give 0 for a package with no rows. Index states the destination build already has
+    are replaced. The statement's parameters are the destination machine and
+    build_id, the state, the source Build row id, `package_count` cpvbs, the source
+    machine and build_id, the source state, followed by the `package_count` cpvbs
+    again.
+    """
+    qn = connection.ops.quote_name
+    table = qn(models.PackageIndex._meta.db_table)
+    files_table = qn(model._meta.db_table)
+    binpkg_table = qn(models.BinPkg._meta.db_table)
+    columns = ", ".join(
+        qn(column) for column in ("machine", "build_id", "state", "cpvb", "file_count")
+    )
+    placeholders = ", ".join(["%s"] * package_count)
+    unique = ", ".join(qn(column) for column in ("machine", "build_id", "cpvb"))
+    updates = ", ".join(
+        f"{qn(column)} = EXCLUDED.{qn(column)}" for column in ("state", "file_count")
+    )
+    file_count = file_count or f"COUNT(f.{qn('id')})"
+    packages = (
+        f"SELECT {qn('id')}, {qn('cpvb')} FROM {binpkg_table}"
+        f" WHERE {qn('build_id')} = %s AND {qn('cpvb')} IN ({placeholders})"
+        f" UNION SELECT NULL, {qn('cpvb')} FROM {table}"
+        f" WHERE {qn('machine')} = %s AND {qn('build_id')} = %s AND {qn('state')} = %s"
+        f" AND {qn('cpvb')} IN ({placeholders})"
+    )
+
+    return (
+        f"INSERT INTO {table} ({columns})"
+        f" SELECT %s, %s, %s, p.{qn('cpvb')}, {file_count} FROM ({packages}) p"
+        f" LEFT JOIN {files_table} f ON f.{qn('binpkg_id')} = p.{qn('id')}"
+        f" GROUP BY p.{qn('cpvb')}"
+        f" ON CONFLICT ({unique}) DO UPDATE SET {updates}"
+    )
+
+
+def content_file_to_model(content_file: ContentFile, ids: RowIds) -> models.ContentFile:
     """Convert the given ContentFile to a ContentFile Django model
 
-    The model returned unsaved.
+    ids holds the ContentFile's BinPkg and Directory row ids. The model returned
+    unsaved. All the derived fields (e.g. basename) are set so that the model can be
+    written with bulk_create().
     """
     model = models.ContentFile()
-    model.machine = content_file.binpkg.build.machine
-    model.build_id = content_file.binpkg.build.build_id
-    model.path = str(content_file.path)
-    model.cpvb = content_file.binpkg.cpvb()
-    model.repo = content_file.binpkg.repo
+    model.binpkg_id = ids.binpkg_id(content_file)
+    model.directory_id = ids.directory_id(content_file)
+    model.basename = split_path(content_file.path)[1]
+    model.reversed_basename = model.basename[::-1]
     model.size = content_file.size
     model.timestamp = content_file.timestamp
 
     return model
 
 
-def model_to_content_file(model: models.ContentFile) -> ContentFile:
-    """Convert the given ContentFile Django model to the ContentFile dataclass"""
+def model_to_content_file(
+    model: models.ContentFile, binpkg: BinPkg | None = None
+) -> ContentFile:
+    """Convert the given ContentFile Django model to the ContentFile dataclass
+
+    If binpkg is given, it is used as the ContentFile's BinPkg instead of converting
+    the model's.
+    """
+    m = model
+    binpkg = binpkg or model_to_binpkg(m.binpkg)
+
+    return ContentFile(
+        path=Path(m.path), binpkg=binpkg, timestamp=m.timestamp, size=m.size
+    )
+
+
+def save_build_stats(stats: BuildStats) -> BuildStats:
+    """Store the given BuildStats, replacing any stored for its build"""
+    build_stats.update_or_create(
+        machine=stats.build.machine,
+        build_id=stats.build.build_id,
+        defaults={
+            "file_count": stats.file_count,
+            "total_size": stats.total_size,
+            "package_count": stats.package_count,
+            "index_duration": stats.index_duration,
+        },
+    )
+
+    return stats
+
+
+def model_to_build_stats(model: models.BuildStats) -> BuildStats:
+    """Convert the given BuildStats Django model to a BuildStats"""
+    return BuildStats(
+        build=Build(machine=model.machine, build_id=model.build_id),
+        file_count=model.file_count,
+        total_size=model.total_size,
+        package_count=model.package_count,
+        index_duration=model.index_duration,
+    )
+
+
+def model_to_binpkg(model: models.BinPkg) -> BinPkg:
+    """Convert the given BinPkg Django model to the BinPkg dataclass"""
     m = model
-    path = Path(m.path)
-    build = Build(machine=m.machine, build_id=m.build_id)
+    build = Build(machine=m.build.machine, build_id=m.build.build_id)
     cpv, build_id_str = m.cpvb.rsplit("-", 1)
-    binpkg = BinPkg(
+
+    return BinPkg(
         cpv=cpv,
         build_id=int(build_id_str),
         build=build,
-        build_time=m.timestamp,
+        build_time=m.build_time,
         repo=m.repo,
     )
 
-    return ContentFile(path=path, binpkg=binpkg, timestamp=m.timestamp, size=m.size)
+
+def models_to_content_files(
+    query: QuerySet[models.ContentFile],
+) -> Iterator[ContentFile]:
+    """Convert the ContentFile Django models of the given query to ContentFiles
+
+    The ContentFiles of a package share a single BinPkg (and Build).
+    """
+    packages: dict[int, BinPkg] = {}
+
+    for model in query.select_related("binpkg__build", "directory"):
+        if (binpkg := packages.get(model.binpkg_id)) is None:
+            binpkg = packages[model.binpkg_id] = model_to_binpkg(model.binpkg)
+
+        yield model_to_content_file(model, binpkg)
+
+
+def keyset_content_files(
+    query: QuerySet[models.ContentFile], batch_size: int
+) -> Iterator[tuple[int, ContentFile]]:
+    """Generate the (primary key, ContentFile) of the given query's models by key
+
+    The models are read batch_size at a time, each batch starting after the last key
+    of the previous one. So only the batches consumed are queried.
+    """
+    packages: dict[int, BinPkg] = {}
+    query = query.select_related("binpkg__build", "directory").order_by("id")
+    batch_size = max(batch_size, 1)
+    batch = list(query[:batch_size])
+
+    while batch:
+        for model in batch:
+            if (binpkg := packages.get(model.binpkg_id)) is None:
+                binpkg = packages[model.binpkg_id] = model_to_binpkg(model.binpkg)
+
+            yield model.id, model_to_content_file(model, binpkg)
+
+        if len(batch) < batch_size:
+            return
+
+        batch = list(query.filter(id__gt=batch[-1].id)[:batch_size])
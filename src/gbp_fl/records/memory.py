@@ -1,22 +1,48 @@
 """memory-based ContentFiles backend"""
 
-import fnmatch
+import bisect
+import heapq
+import json
+from collections import Counter
 from dataclasses import replace
 from pathlib import PurePath as Path
-from typing import Any, Iterable
+from typing import Any, Callable, Iterable
 
-from gbp_fl.types import Build, ContentFile
+from gbp_fl.types import (
+    Build,
+    BuildStats,
+    ContentFile,
+    IndexState,
+    PackageIndex,
+    SearchCount,
+    SearchGroup,
+    SearchPage,
+)
 
-from . import RecordNotFound
+from . import RecordNotFound, directory_prefix, paginate, search_group
+from .patterns import Pattern, glob_pattern, is_glob, regex_pattern
 
 
-class ContentFiles:
+class ContentFiles:  # pylint: disable=too-many-public-methods
     """Memory-backed ContentFiles repo"""
 
     def __init__(self) -> None:
         # [machine, build_id, cpvb, path, package_build_id] = ContentFile
         self.files: dict[tuple[str, str, str, str], ContentFile] = {}
 
+        # [machine, build_id, cpvb] = fingerprint
+        self.fingerprints: dict[tuple[str, str, str], str] = {}
+
+        # [machine, build_id, cpvb] = PackageIndex
+        self.index_states: dict[tuple[str, str, str], PackageIndex] = {}
+
+        # [machine, build_id] = BuildStats
+        self.build_stats: dict[tuple[str, str], BuildStats] = {}
+
+        # The (path, key) of each of self.files sorted for directory searches. This is
+        # created on demand and discarded whenever self.files changes
+        self.sorted_paths: list[tuple[str, tuple[str, str, str, str]]] | None = None
+
     def save(self, content_file: ContentFile, **fields: Any) -> ContentFile:
         """Save the given ContentFile with given updated fields
 
@@ -33,6 +59,7 @@ class ContentFiles:
         binpkg = new.binpkg
         build = binpkg.build
         files[build.machine, build.build_id, binpkg.cpvb(), str(new.path)] = new
+        self.sorted_paths = None
 
         return new
 
@@ -70,9 +97,10 @@ class ContentFiles:
             ]
         except KeyError:
             raise RecordNotFound() from None
+        self.sorted_paths = None
 
     def deindex_build(self, machine: str, build_id: str) -> None:
-        """Delete all content files for the given build"""
+        """Delete all content files (and the stats) for the given build"""
         match = (machine, build_id)
         files = self.files
         keys = tuple(files)
@@ -80,6 +108,17 @@ class ContentFiles:
         for key in keys:
             if key[:2] == match:
                 del files[key]
+        self.sorted_paths = None
+
+        for package_key in tuple(self.fingerprints):
+            if package_key[:2] == match:
+                del self.fingerprints[package_key]
+
+        for package_key in tuple(self.index_states):
+            if package_key[:2] == match:
+                del self.index_states[package_key]
+
+        self.build_stats.pop(match, None)
 
     def exists(self, machine: str, build_id: str, cpvb: str, path: str | Path) -> bool:
         """Return true if a package file with matching criteria exists in the db"""
@@ -116,6 +155,48 @@ class ContentFiles:
         item_count = len(query)
         return sum(1 for record in self.files if record[:item_count] == query)
 
+    def update_build_stats(
+        self, build: Build, index_duration: float | None = None
+    ) -> BuildStats:
+        """Store (and return) the stats of the given build's indexed files"""
+        match = (build.machine, build.build_id)
+        build_files = {
+            key: content_file
+            for key, content_file in self.files.items()
+            if key[:2] == match
+        }
+        stats = BuildStats(
+            build=build,
+            file_count=len(build_files),
+            total_size=sum(cf.size or 0 for cf in build_files.values()),
+            package_count=len({key[2] for key in build_files}),
+            index_duration=index_duration,
+        )
+        self.build_stats[match] = stats
+
+        return stats
+
+    def get_build_stats(
+        self, machine: str | None = None, build_id: str | None = None
+    ) -> list[BuildStats]:
+        """Return the stored stats of the builds
+
+        If machine is given, return only the stats of the machine's builds. If build_id
+        is also given, only those of the build. Raise ValueError if build_id is given
+        without machine.
+        """
+        if build_id and not machine:
+            raise ValueError("Must supply machine if supplying build_id")
+
+        return [
+            stats
+            for (stats_machine, stats_build_id), stats in sorted(
+                self.build_stats.items()
+            )
+            if machine in (None, "", stats_machine)
+            and build_id in (None, "", stats_build_id)
+        ]
+
     def for_package(
         self, machine: str, build_id: str, cpvb: str
     ) -> Iterable[ContentFile]:
@@ -140,7 +221,7 @@ class ContentFiles:
                 yield content_file
 
     def search(
-        self, key: str, machines: list[str] | None = None
+        self, key: str, machines: list[str] | None = None, *, regex: bool = False
     ) -> Iterable[ContentFile]:
         """Search the database for package files
 
@@ -149,35 +230,52 @@ class ContentFiles:
 
         The simple search key works like the following:
 
-            - A key without "*" or "/" characters searches an exact match on the file's
-              base name. For example if the key is "bash" then it matches "/bin/bash"
-              but not "/usr/bin/bashbug"
+            - A key without "/" characters or glob wildcards ("*", "?" and "[")
+              searches an exact match on the file's base name. For example if the key
+              is "bash" then it matches "/bin/bash" but not "/usr/bin/bashbug"
 
             - Keys containing at least one "/" are interpreted as exact path matches.
               For example the key "/bin/bash" matches files whose path is exactly
               "/bin/bash". If the key does not start with a forward slash then it is
               automatically prepended.
 
-            - Keys with an asterisk either at the start and/or end of the key perform
-              wildcard matches but only on the basename of the file. For example the key
-              "b*" matches "/bin/bash" and "/usr/bin/bashbug" but not
-              "/usr/share/baselayout/fstab". Keys with an asterisk in the middle depend
-              on the backend and are not guaranteed to provide the expected matches.
+            - Keys ending with "/" (or "/**") match all the files under the given
+              directory, at any depth. For example the key "/usr/lib/python3.12/"
+              matches "/usr/lib/python3.12/os.py" and
+              "/usr/lib/python3.12/json/__init__.py". As with exact path matches a
+              leading forward slash is prepended if missing.
+
+            - Other keys with glob wildcards are glob patterns (as in fnmatch: "*",
+              "?" and "[...]") matched against the basename of the file. For example
+              the key "b*" matches "/bin/bash" and "/usr/bin/bashbug" but not
+              "/usr/share/baselayout/fstab". The key "lib*ssl*.so*" matches
+              "/usr/lib64/libssl.so.3" and "lib?.so" matches "/lib64/libc.so".
 
             - A key that's the empty string ("") matches nothing.
 
-            - A key that contains nothing bug asterisks (e.g. "*") depends on the
-              backend and are not guaranteed to provide the expected matches.
+        If regex is true, the key is instead a regular expression that's searched for
+        (as with re.search()) in the basename of the file. Raise ValueError if the
+        regular expression is invalid.
         """
         if not key:
             return
 
-        matcher = path_basename_checker
+        if (prefix := directory_prefix(key)) is not None:
+            yield from (
+                content_file
+                for content_file in self.under_directory(prefix)
+                if not machines or content_file.binpkg.build.machine in machines
+            )
+            return
+
+        matcher: Callable[[ContentFile, str], bool] = path_basename_checker
 
-        if "/" in key:
+        if regex:
+            matcher = pattern_checker(regex_pattern(key))
+        elif "/" in key:
             matcher = exact_match_checker
-        elif "*" in key:
-            matcher = glob_checker
+        elif is_glob(key):
+            matcher = pattern_checker(glob_pattern(key))
 
         for content_file in self.files.values():
             if machines and content_file.binpkg.build.machine not in machines:
@@ -185,10 +283,185 @@ class ContentFiles:
             if matcher(content_file, key):
                 yield content_file
 
+    def search_page(
+        self,
+        key: str,
+        machines: list[str] | None = None,
+        *,
+        regex: bool = False,
+        first: int = 100,
+        after: str | None = None,
+    ) -> SearchPage:
+        """Return a page of the results of search()
+
+        The results are ordered by their (machine, build_id, cpvb, path) key. The
+        cursor is the key as a JSON array. Only the results after the cursor are kept
+        and of those only the smallest first + 1 are sorted.
+        """
+        keys: Iterable[tuple[str, str, str, str]] = (
+            file_key(content_file)
+            for content_file in self.search(key, machines, regex=regex)
+        )
+
+        if after is not None:
+            cursor = parse_cursor(after)
+            keys = (k for k in keys if k > cursor)
+
+        keys = heapq.nsmallest(max(first + 1, 0), keys)
+
+        return paginate(((json.dumps(k), self.files[k]) for k in keys), first)
+
+    def search_count(
+        self,
+        key: str,
+        machines: list[str] | None = None,
+        *,
+        regex: bool = False,
+        group_by: SearchGroup | None = None,
+    ) -> SearchCount:
+        """Return the number of results of search()
+
+        The results are counted as they are generated.
+        """
+        groups = Counter(
+            search_group(content_file, group_by)
+            for content_file in self.search(key, machines, regex=regex)
+        )
+
+        return SearchCount.from_groups(groups, group_by)
+
+    def under_directory(self, prefix: str) -> Iterable[ContentFile]:
+        """Return the ContentFiles whose path starts with the given directory prefix
+
+        The paths are found by bisecting self.sorted_paths.
+        """
+        if self.sorted_paths is None:
+            self.sorted_paths = sorted((key[3], key) for key in self.files)
+
+        sorted_paths = self.sorted_paths
+        index = bisect.bisect_left(sorted_paths, (prefix,))
+
+        while index < len(sorted_paths) and sorted_paths[index][0].startswith(prefix):
+            yield self.files[sorted_paths[index][1]]
+            index += 1
+
     def get_builds(self) -> Iterable[Build]:
         """Return all the builds that have indexed files"""
         return {Build(machine=i[0], build_id=i[1]) for i in self.files}
 
+    def copy_packages(self, source: Build, dest: Build, cpvbs: Iterable[str]) -> int:
+        """Copy the ContentFiles of the given packages from the source to dest build
+
+        This is used to index packages that are unchanged from a previous build
+        without having to re-read the binpkgs. The copied packages are marked as
+        IndexState.DONE in the dest build. Return the number of packages copied.
+        Packages the source build does not have are not copied. Packages with no
+        files are copied if they are IndexState.DONE in the source build.
+        """
+        match = (source.machine, source.build_id)
+        cpvbs = set(cpvbs)
+        done = {
+            key[2]
+            for key, index in self.index_states.items()
+            if key[:2] == match and index.state == IndexState.DONE
+        }
+        # Packages with no files are counted (as 0) too
+        file_counts: Counter[str] = Counter(dict.fromkeys(cpvbs & done, 0))
+
+        for key, content_file in self.files.copy().items():
+            if key[:2] == match and key[2] in cpvbs:
+                binpkg = replace(content_file.binpkg, build=dest)
+                self.save(replace(content_file, binpkg=binpkg))
+                file_counts[key[2]] += 1
+
+        for (machine, build_id, cpvb), fingerprint in self.fingerprints.copy().items():
+            if (machine, build_id) == match and cpvb in cpvbs:
+                self.fingerprints[dest.machine, dest.build_id, cpvb] = fingerprint
+
+        for cpvb, file_count in file_counts.items():
+            self.save_index_state(dest, cpvb, IndexState.DONE, file_count)
+
+        return len(file_counts)
+
+    def deindex_package(self, build: Build, cpvb: str) -> None:
+        """Delete all the records for the given build's package
+
+        This includes the package's files, fingerprint and index state.
+        """
+        match = (build.machine, build.build_id, cpvb)
+
+        for key in tuple(self.files):
+            if key[:3] == match:
+                del self.files[key]
+        self.sorted_paths = None
+
+        self.fingerprints.pop(match, None)
+        self.index_states.pop(match, None)
+
+    def save_index_state(
+        self, build: Build, cpvb: str, state: IndexState, file_count: int = 0
+    ) -> None:
+        """Record the indexing state of the given build's package"""
+        self.index_states[build.machine, build.build_id, cpvb] = PackageIndex(
+            build=build, cpvb=cpvb, state=state, file_count=file_count
+        )
+
+    def get_index_states(self, build: Build) -> dict[str, PackageIndex]:
+        """Return the indexing states of the given build's packages keyed by cpvb"""
+        match = (build.machine, build.build_id)
+
+        return {
+            key[2]: index
+            for key, index in self.index_states.items()
+            if key[:2] == match
+        }
+
+    def save_fingerprint(self, build: Build, cpvb: str, fingerprint: str) -> None:
+        """Record the fingerprint of the given build's binpkg file"""
+        self.fingerprints[build.machine, build.build_id, cpvb] = fingerprint
+
+    def find_fingerprint(self, fingerprint: str, cpvb: str) -> Build | None:
+        """Return a build having the given package indexed from an identical binpkg
+
+        That is, a build where the package's binpkg has the given fingerprint and the
+        package is IndexState.DONE. If no such build exists, return None.
+        """
+        for key, value in self.fingerprints.items():
+            if key[2] != cpvb or value != fingerprint:
+                continue
+            if (index := self.index_states.get(key)) and index.state == IndexState.DONE:
+                return index.build
+
+        return None
+
+
+def file_key(content_file: ContentFile) -> tuple[str, str, str, str]:
+    """Return the self.files key of the given ContentFile"""
+    binpkg = content_file.binpkg
+    build = binpkg.build
+
+    return build.machine, build.build_id, binpkg.cpvb(), str(content_file.path)
+
+
+def parse_cursor(cursor: str) -> tuple[str, str, str, str]:
+    """Return the self.files key of the given search_page() cursor
+
+    Raise ValueError if the cursor is invalid.
+    """
+    try:
+        key = json.loads(cursor)
+    except json.JSONDecodeError:
+        key = None
+
+    if not (
+        isinstance(key, list)
+        and len(key) == 4
+        and all(isinstance(item, str) for item in key)
+    ):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+    return key[0], key[1], key[2], key[3]
+
 
 def exact_match_checker(content_file: ContentFile, key: str) -> bool:
     """Return True if key matches the exact path for the given ContentFile
@@ -209,11 +482,22 @@ def path_basename_checker(content_file: ContentFile, key: str) -> bool:
     return content_file.path.name == key
 
 
-def glob_checker(content_file: ContentFile, key: str) -> bool:
-    """Return True if key is a glob match for the basename of the given ContentFile
+def pattern_checker(pattern: Pattern) -> Callable[[ContentFile, str], bool]:
+    """Return a checker for the given glob or regex Pattern
 
-    Otherwise return False.
+    The checker matches the basename of the given ContentFile against the pattern. Its
+    key argument is ignored. The pattern's literal text is checked before the (more
+    costly) pattern match.
     """
-    basename = content_file.path.name
 
-    return fnmatch.fnmatch(basename, key)
+    def checker(content_file: ContentFile, _key: str) -> bool:
+        basename = content_file.path.name
+
+        return (
+            basename.startswith(pattern.prefix)
+            and basename.endswith(pattern.suffix)
+            and all(fragment in basename for fragment in pattern.fragments)
+            and pattern.matches(basename)
+        )
+
+    return checker
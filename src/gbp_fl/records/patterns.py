@@ -0,0 +1,213 @@
+"""Basename patterns of search keys
+
+The records backends use these for glob and regex searches. A Pattern knows the
+literal text that all matching basenames have in common. The backends use that to
+pre-filter the candidates through an index and then match only those exactly.
+"""
+
+import fnmatch
+import re
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable
+
+# Characters that make a search key a glob
+GLOB_SPECIAL = frozenset("*?[")
+
+# Regex characters that end a run of literal text
+REGEX_SPECIAL = frozenset(".^$*+?{}[]()|\\")
+
+# Regex quantifiers making the preceding character optional
+REGEX_OPTIONAL = frozenset("*?{")
+
+# Regex escapes followed by the given number of hex digits
+REGEX_HEX_ESCAPES = {"x": 2, "u": 4, "U": 8}
+
+# Regex flags under which literal text doesn't (simply) match itself
+REGEX_NO_LITERALS = re.IGNORECASE | re.MULTILINE | re.VERBOSE
+
+
+@dataclass(frozen=True)
+class Pattern:
+    """A pattern that basenames are matched against
+
+    prefix and suffix are the literal text that all matching basenames start and end
+    with and fragments the (other) literal text they all contain. Any of these may be
+    empty.
+    """
+
+    matches: Callable[[str], bool]
+    prefix: str = ""
+    suffix: str = ""
+    fragments: tuple[str, ...] = ()
+
+
+def is_glob(key: str) -> bool:
+    """Return True if the given search key is a glob
+
+    That is, if it has any of the glob wildcards "*", "?" or "[".
+    """
+    return not GLOB_SPECIAL.isdisjoint(key)
+
+
+def glob_pattern(key: str) -> Pattern:
+    """Return the Pattern for the given glob
+
+    The glob syntax is that of fnmatch: "*", "?" and "[...]" are wildcards. The whole
+    basename must match and matching is case-sensitive.
+    """
+    runs: list[str] = []
+    run = ""
+    index = 0
+
+    while index < len(key):
+        char = key[index]
+
+        if char == "[":
+            end = class_end(key, index, regex=False)
+        else:
+            end = index if char in "*?" else -1
+
+        if end == -1:  # a literal character
+            run += char
+            index += 1
+            continue
+
+        runs.append(run)
+        run = ""
+        index = end + 1
+
+    runs.append(run)
+    prefix, *middle, suffix = runs if len(runs) > 1 else [runs[0], runs[0]]
+
+    return Pattern(
+        matches=partial(fnmatch.fnmatchcase, pat=key),
+        prefix=prefix,
+        suffix=suffix,
+        fragments=tuple(fragment for fragment in middle if fragment),
+    )
+
+
+def regex_pattern(key: str) -> Pattern:
+    """Return the Pattern for the given regular expression
+
+    The regex is searched for (as with re.search()) in the basename.
+
+    Only the literal text that the regex unconditionally requires is used for
+    pre-filtering. Regexes with top-level alternatives or flags such as
+    case-insensitivity have none. Raise ValueError if the regex is invalid.
+    """
+    try:
+        regex = re.compile(key)
+    except re.error as error:
+        raise ValueError(f"Invalid regular expression: {error}") from None
+
+    def matches(name: str) -> bool:
+        return regex.search(name) is not None
+
+    if regex.flags & REGEX_NO_LITERALS or (runs := regex_literals(key)) is None:
+        return Pattern(matches=matches)
+
+    prefix = runs.pop(0) if key.startswith("^") else ""
+
+    return Pattern(
+        matches=matches, prefix=prefix, fragments=tuple(run for run in runs if run)
+    )
+
+
+def regex_literals(key: str) -> list[str] | None:
+    """Return the runs of literal text that any match of the regex contains
+
+    Text inside groups and character classes is skipped. If the regex has top-level
+    alternatives return None. The first run is the literal text at the start of the
+    regex (after any "^"), possibly empty.
+    """
+    runs: list[str] = []
+    run = ""
+    depth = 0
+    index = 1 if key.startswith("^") else 0
+
+    while index < len(key):
+        char = key[index]
+        index += 1
+
+        if char == "\\" and index < len(key):
+            escaped = key[index]
+            index += 1
+            if not escaped.isalnum():
+                if depth == 0:
+                    run += escaped
+                continue
+            index = escape_end(key, index, escaped)
+        elif char == "[":
+            index = class_end(key, index - 1, regex=True) + 1 or len(key)
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth = max(depth - 1, 0)
+        elif char == "|" and depth == 0:
+            return None
+        elif char in REGEX_OPTIONAL and depth == 0:
+            run = run[:-1]
+            if char == "{":
+                index = key.find("}", index) + 1 or len(key)
+        elif char not in REGEX_SPECIAL:
+            if depth == 0:
+                run += char
+            continue
+
+        runs.append(run)
+        run = ""
+
+    runs.append(run)
+
+    return runs
+
+
+def escape_end(pattern: str, index: int, escaped: str) -> int:
+    """Return the index where the argument of an alphanumeric regex escape ends
+
+    escaped is the character after the backslash and index the position following
+    it. Escapes like "\\x41", "\\u0041", "\\N{...}", octal
+    escapes and group references take an argument that isn't literal text.
+    """
+    if escaped == "N" and pattern[index : index + 1] == "{":
+        return pattern.find("}", index) + 1 or len(pattern)
+
+    if escaped.isdigit():
+        width = 2
+        digits = "01234567" if escaped == "0" else "0123456789"
+    else:
+        width = REGEX_HEX_ESCAPES.get(escaped, 0)
+        digits = "0123456789abcdefABCDEF"
+
+    end = index
+    while end < min(index + width, len(pattern)) and pattern[end] in digits:
+        end += 1
+
+    return end
+
+
+def class_end(pattern: str, start: int, *, regex: bool) -> int:
+    """Return the index of the "]" closing the character class starting at start
+
+    A "]" directly after the opening "[" (or "[!" in globs, "[^" in regexes) is part of
+    the class. In regexes so is a "]" escaped with a backslash. If the class isn't
+    closed return -1.
+    """
+    index = start + 1
+
+    if pattern[index : index + 1] == ("^" if regex else "!"):
+        index += 1
+    if pattern[index : index + 1] == "]":
+        index += 1
+
+    while index < len(pattern):
+        if regex and pattern[index] == "\\":
+            index += 2
+            continue
+        if pattern[index] == "]":
+            return index
+        index += 1
+
+    return -1
@@ -0,0 +1,267 @@
+"""Scheduler for indexing tasks
+
+All builds share a single IndexScheduler. This bounds both the number of threads used
+for indexing (and therefore the number of database connections) and the number of tasks
+waiting to run. Builds that are being indexed can be cancelled.
+
+The IndexScheduler is per process, and so are its limits: when GBP runs its tasks in
+several worker processes, each of them can use up to INDEX_MAX_WORKERS workers.
+IndexScheduler.cancel() only cancels jobs of its own process. Jobs are cancelled from
+other processes through their cancel_check (see IndexScheduler.poll()).
+"""
+
+import atexit
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Iterator, TypeVar
+
+from gbp_fl.settings import Settings
+from gbp_fl.types import Build
+
+T = TypeVar("T")
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_scheduler: "IndexScheduler | None" = None  # pylint: disable=invalid-name
+
+
+# How often (in seconds) a job waiting for a worker checks whether it was cancelled
+WORKER_POLL_INTERVAL = 0.1
+
+# How often (in seconds) a job's cancel_check is called
+CANCEL_CHECK_INTERVAL = 5.0
+
+
+@dataclass(kw_only=True)
+class Job:
+    """The indexing of a Build"""
+
+    build: Build
+    slots: threading.BoundedSemaphore
+
+    cancelled: threading.Event = field(default_factory=threading.Event)
+    done: threading.Event = field(default_factory=threading.Event)
+    futures: set[Future[Any]] = field(default_factory=set)
+
+    cancel_check: Callable[[], bool] | None = None
+    """Returns True if the job was cancelled from another process"""
+    checked: float = field(default_factory=time.monotonic)
+    """When cancel_check was last called (time.monotonic())"""
+
+
+class IndexScheduler:
+    """Bounded thread pool for indexing builds
+
+    - At most `max_workers` tasks run at once in the scheduler's threads, and as many
+      in worker processes (see acquire_worker())
+    - At most `max_workers_per_build` tasks for any one build are in flight at once
+    - At most `queue_size` tasks are in flight (running or waiting) at once
+    """
+
+    def __init__(
+        self, *, max_workers: int, max_workers_per_build: int, queue_size: int
+    ) -> None:
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="gbp-fl-index"
+        )
+        self.max_workers_per_build = max_workers_per_build
+        self.workers = threading.BoundedSemaphore(max(max_workers, 1))
+        self.slots = threading.BoundedSemaphore(max(queue_size, 1))
+        self.jobs: dict[Build, Job] = {}
+        self.lock = threading.Lock()
+
+    def run(self, build: Build, func: Callable[[T], Any], items: Iterable[T]) -> bool:
+        """Call func on each of the items for the given build
+
+        Block until all the items have been processed. Return True if all the items
+        were processed or False if the build was cancelled.
+        """
+        with self.job(build) as job:
+            return self.run_job(job, func, items)
+
+    def run_job(self, job: Job, func: Callable[[T], Any], items: Iterable[T]) -> bool:
+        """Call func on each of the items for the given (registered) job
+
+        Like run() but for a job already registered with job().
+        """
+        for item in items:
+            if not self.submit(job, func, item):
+                break
+
+        wait(job.futures.copy())
+
+        return not job.cancelled.is_set()
+
+    def submit(self, job: Job, func: Callable[[T], Any], item: T) -> bool:
+        """Submit func(item) for the given job
+
+        Block until there is room in the queue. Return False if the job was cancelled.
+        """
+        self.slots.acquire()  # pylint: disable=consider-using-with
+        job.slots.acquire()  # pylint: disable=consider-using-with
+
+        if self.poll(job):
+            job.slots.release()
+            self.slots.release()
+            return False
+
+        future = self.executor.submit(self.run_task, job, func, item)
+        with self.lock:
+            job.futures.add(future)
+        future.add_done_callback(lambda f: self.task_done(job, f))
+
+        return True
+
+    def run_task(self, job: Job, func: Callable[[T], Any], item: T) -> None:
+        """Call func(item) unless the job has been cancelled"""
+        if job.cancelled.is_set():
+            return
+
+        try:
+            func(item)
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception("Error indexing %r for %s", item, job.build.id)
+
+    def task_done(self, job: Job, future: Future[Any]) -> None:
+        """Bookkeeping for completed tasks"""
+        with self.lock:
+            job.futures.discard(future)
+
+        job.slots.release()
+        self.slots.release()
+
+    @contextmanager
+    def job(
+        self, build: Build, *, cancel_check: Callable[[], bool] | None = None
+    ) -> Iterator[Job]:
+        """Register a Job for the given build for the duration of the context
+
+        See poll() for the cancel_check.
+        """
+        slots = threading.BoundedSemaphore(max(self.max_workers_per_build, 1))
+        job = Job(build=build, slots=slots, cancel_check=cancel_check)
+        with self.lock:
+            if build in self.jobs:
+                raise RuntimeError(f"Build {build.id} is already being indexed")
+            self.jobs[build] = job
+
+        try:
+            yield job
+        finally:
+            with self.lock:
+                del self.jobs[build]
+            job.done.set()
+
+    def cancel(self, build: Build, *, wait_for_job: bool = True) -> bool:
+        """Cancel the indexing of the given build
+
+        Tasks that have not yet started are cancelled. If `wait_for_job` is True, block
+        until the tasks that are already running have finished.
+
+        Return True if the build was being indexed.
+        """
+        with self.lock:
+            job = self.jobs.get(build)
+            futures = job.futures.copy() if job else set()
+
+        if job is None:
+            return False
+
+        logger.info("Cancelling indexing of %s", build.id)
+        job.cancelled.set()
+
+        for future in futures:
+            future.cancel()
+
+        if wait_for_job:
+            job.done.wait()
+
+        return True
+
+    def acquire_worker(self, job: Job) -> bool:
+        """Block until one of the `max_workers` is free for a task of the given job
+
+        This is for tasks that are not run by the scheduler's threads, e.g. those run in
+        worker processes, so that they are bound as well. The worker must be given back
+        with release_worker() once the task is done. Return False, without acquiring a
+        worker, if the job is cancelled while waiting.
+        """
+        while not self.poll(job):
+            # pylint: disable-next=consider-using-with
+            if self.workers.acquire(timeout=WORKER_POLL_INTERVAL):
+                return True
+
+        return False
+
+    def poll(self, job: Job) -> bool:
+        """Return True if the given job was cancelled
+
+        cancel() only knows about the jobs of this process. So the job's cancel_check,
+        if it has one, is also called (at most every CANCEL_CHECK_INTERVAL seconds) and
+        the job is cancelled if it returns True.
+        """
+        now = time.monotonic()
+
+        if (
+            job.cancel_check is not None
+            and not job.cancelled.is_set()
+            and now - job.checked >= CANCEL_CHECK_INTERVAL
+        ):
+            job.checked = now
+            if job.cancel_check():
+                self.cancel(job.build, wait_for_job=False)
+
+        return job.cancelled.is_set()
+
+    def release_worker(self) -> None:
+        """Give back a worker acquired with acquire_worker()"""
+        self.workers.release()
+
+    def shutdown(self, *, cancel: bool = False) -> None:
+        """Shut down the scheduler
+
+        If `cancel` is True, cancel all the builds being indexed first.
+        """
+        if cancel:
+            with self.lock:
+                builds = list(self.jobs)
+
+            for build in builds:
+                self.cancel(build, wait_for_job=False)
+
+        self.executor.shutdown(wait=True, cancel_futures=cancel)
+
+
+def get_scheduler() -> IndexScheduler:
+    """Return the shared IndexScheduler
+
+    The scheduler is created from the Settings the first time this is called.
+    """
+    global _scheduler  # pylint: disable=global-statement
+
+    with _lock:
+        if _scheduler is None:
+            settings = Settings.from_environ()
+            _scheduler = IndexScheduler(
+                max_workers=settings.INDEX_MAX_WORKERS,
+                max_workers_per_build=settings.INDEX_MAX_WORKERS_PER_BUILD,
+                queue_size=settings.INDEX_QUEUE_SIZE,
+            )
+            atexit.register(shutdown)
+
+        return _scheduler
+
+
+def shutdown(*, cancel: bool = False) -> None:
+    """Shut down the shared IndexScheduler, if there is one"""
+    global _scheduler  # pylint: disable=global-statement
+
+    with _lock:
+        scheduler, _scheduler = _scheduler, None
+
+    if scheduler is not None:
+        scheduler.shutdown(cancel=cancel)
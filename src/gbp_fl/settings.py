@@ -6,7 +6,7 @@ from gbpcli.settings import BaseSettings
 
 
 @dataclass(frozen=True)
-class Settings(BaseSettings):
+class Settings(BaseSettings):  # pylint: disable=too-many-instance-attributes
     """gbp-fl Settings"""
 
     env_prefix = "GBP_FL_"
@@ -14,3 +14,15 @@ class Settings(BaseSettings):
     # pylint: disable=invalid-name
     RECORDS_BACKEND: str = "django"
     RECORDS_BACKEND_DJANGO_BULK_BATCH_SIZE: int = 300
+    RECORDS_BACKEND_DJANGO_INGEST: str = "insert"
+    INDEX_EXECUTOR: str = "thread"
+    INDEX_FROM_CONTENTS: bool = False
+    INDEX_SIZE_LOOKUP_SIZE: int = 0
+    INDEX_DEDUP: bool = False
+    INDEX_MAX_WORKERS: int = 8
+    INDEX_MAX_WORKERS_PER_BUILD: int = 4
+    INDEX_QUEUE_SIZE: int = 64
+    INDEX_EXTERNAL_DECOMPRESS_SIZE: int = 0
+    SEARCH_PAGE_SIZE: int = 100
+    SEARCH_MAX_PAGE_SIZE: int = 1000
+    STATS_RECONCILE_INTERVAL: int = 3600
@@ -1,11 +1,12 @@
 """gbp-fl signal handlers"""
 
+import datetime as dt
 from typing import Any, Callable, TypeAlias
 
 from gbp_fl.gateway import gateway
 from gbp_fl.records import Repo
 from gbp_fl.settings import Settings
-from gbp_fl.types import BuildLike
+from gbp_fl.types import BuildLike, FileStats
 from gbp_fl.worker import tasks
 
 Receiver: TypeAlias = Callable[..., Any]
@@ -24,14 +25,39 @@ def gbp_build_deleted(*, build: BuildLike) -> None:
     gateway.run_task(tasks.deindex_build, build.machine, build.build_id)
 
 
-def cache_stats(**_kwargs: Any) -> None:
+def cache_stats(*, machine: str, file_delta: int | None = None, **_kwargs: Any) -> None:
     """Signal handler for the the the postindex/postdeindex events
 
-    Updates the stats cache.
+    Updates the stats cache by applying the event's file_delta to the cached stats.
+    The stats are instead recomputed from the database if the event has no delta, if
+    there are no (consistent) stats cached or if they were last recomputed more than
+    STATS_RECONCILE_INTERVAL seconds ago. The latter corrects any drift.
     """
-    repo = Repo.from_settings(Settings.from_environ())
+    settings = Settings.from_environ()
+    stats = gateway.get_cached_stats()
 
-    gateway.set_cached_stats(gateway.get_file_stats(repo))
+    if file_delta is None or stats is None or needs_reconcile(stats, settings):
+        stats = None
+    else:
+        try:
+            stats = stats.apply(machine, file_delta, gateway.get_build_count(machine))
+        except ValueError:
+            stats = None
+
+    if stats is None:
+        stats = gateway.get_file_stats(Repo.from_settings(settings))
+
+    gateway.set_cached_stats(stats)
+
+
+def needs_reconcile(stats: FileStats, settings: Settings) -> bool:
+    """Return True if the stats were last recomputed too long ago"""
+    if stats.reconciled is None:
+        return True
+
+    age = dt.datetime.now(tz=dt.UTC) - stats.reconciled
+
+    return age.total_seconds() >= settings.STATS_RECONCILE_INTERVAL
 
 
 def init() -> None:
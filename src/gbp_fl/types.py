@@ -5,8 +5,10 @@ metadata.
 """
 
 import datetime as dt
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
+from enum import StrEnum
 from pathlib import PurePath as Path
+from tarfile import DIRTYPE, REGTYPE
 from typing import TYPE_CHECKING, Protocol, Self
 
 if TYPE_CHECKING:
@@ -71,8 +73,101 @@ class ContentFile:
     path: Path
     timestamp: dt.datetime
 
-    size: int
-    """size of file in bytes"""
+    size: int | None
+    """size of file in bytes, None if unknown (files indexed from CONTENTS)"""
+
+
+class IndexState(StrEnum):
+    """The indexing state of a BinPkg"""
+
+    PENDING = "pending"
+    """indexing has started but not finished"""
+
+    DONE = "done"
+    """the package's files have all been indexed"""
+
+    FAILED = "failed"
+    """indexing failed"""
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class PackageIndex:
+    """The indexing state of a BinPkg in a Build"""
+
+    build: Build
+    cpvb: str
+    state: IndexState
+
+    file_count: int = 0
+    """The number of files indexed for the package"""
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class BuildStats:
+    """Summary stats of a Build's indexed files"""
+
+    build: Build
+    file_count: int = 0
+
+    total_size: int = 0
+    """The total size of the build's files in bytes. Files of unknown size are left out"""
+
+    package_count: int = 0
+    """The number of the build's packages having files"""
+
+    index_duration: float | None = None
+    """How long, in seconds, the build took to index, if known"""
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class SearchPage:
+    """A page of search results"""
+
+    content_files: list[ContentFile]
+
+    end_cursor: str | None
+    """The cursor of the page's last ContentFile, or None if the page is empty"""
+
+    has_next_page: bool
+    """Whether there are more results after this page"""
+
+
+class SearchGroup(StrEnum):
+    """What the results of a search are counted by"""
+
+    MACHINE = "machine"
+    """the machine of the file's build"""
+
+    BUILD = "build"
+    """the file's build, named <machine>.<build_id>"""
+
+    CPVB = "cpvb"
+    """the cpvb of the file's package"""
+
+
+@dataclass(frozen=True, kw_only=True, slots=True)
+class SearchCount:
+    """The number of results of a search"""
+
+    total: int
+
+    groups: dict[str, int] = field(default_factory=dict)
+    """The number of results in each SearchGroup, if counted by group"""
+
+    @classmethod
+    def from_groups(cls, groups: dict[str, int], group_by: SearchGroup | None) -> Self:
+        """Return the SearchCount of the given group counts
+
+        If group_by is None, only the total of the groups is kept.
+        """
+        return cls(
+            total=sum(groups.values()),
+            groups=(
+                {name: count for name, count in groups.items() if count}
+                if group_by
+                else {}
+            ),
+        )
 
 
 class BuildLike(Protocol):  # pylint: disable=too-few-public-methods
@@ -82,11 +177,11 @@ class BuildLike(Protocol):  # pylint: disable=too-few-public-methods
     build_id: str
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ContentFileInfo:
     """Interface for ContentFile metadata
 
-    IRL this wrapper around the tarfile.TarInfo object
+    IRL this is a lightweight stand-in for the tarfile.TarInfo object
     """
 
     # pylint: disable=too-few-public-methods, missing-docstring
@@ -96,8 +191,15 @@ class ContentFileInfo:
     mtime: int
     """modification time in seconds since epoch"""
 
-    size: int
-    """file size in bytes"""
+    size: int | None
+    """file size in bytes, None if unknown"""
+
+    type: bytes = REGTYPE
+    """the tarfile member type"""
+
+    def isdir(self) -> bool:
+        """Return True if the file is a directory"""
+        return self.type == DIRTYPE
 
 
 @dataclass(kw_only=True, frozen=True)
@@ -132,24 +234,52 @@ class FileStats:
     total: int = 0
     by_machine: dict[str, MachineStats] = field(default_factory=dict)
 
+    reconciled: dt.datetime | None = field(default=None, compare=False)
+    """When the stats were last collect()ed from the database"""
+
     @classmethod
     def collect(cls, files: "ContentFiles", machines_info: dict[str, int]) -> Self:
         """Given the files repo,  and machine info return the FileStats
 
         `machines_info` is a dict of machine_name => build_count
+
+        The machines' file counts are summed from the stored stats of their builds.
         """
+        totals: dict[str, int] = dict.fromkeys(machines_info, 0)
+
+        for build_stats in files.get_build_stats():
+            if build_stats.build.machine in totals:
+                totals[build_stats.build.machine] += build_stats.file_count
+
         by_machine = {
-            machine: MachineStats(
-                total=files.count(machine, None, None),
-                build_count=machines_info[machine],
-            )
-            for machine in machines_info
+            machine: MachineStats(total=totals[machine], build_count=build_count)
+            for machine, build_count in machines_info.items()
         }
         return cls(
             total=sum(by_machine[machine].total for machine in machines_info),
             by_machine=by_machine,
+            reconciled=dt.datetime.now(tz=dt.UTC),
         )
 
+    def apply(self, machine: str, file_delta: int, build_count: int) -> Self:
+        """Return the stats with file_delta files added to (or removed from) machine
 
-class MissingPackageIdentifier(LookupError):
-    """Raised when tar archive is missing GLEP-78 package identifier"""
+        build_count is the machine's current number of builds. A machine left with no
+        files and no builds is dropped. Raise ValueError if the result is inconsistent,
+        which means the stats have drifted and need to be collect()ed again.
+        """
+        previous = self.by_machine.get(machine, MachineStats())
+
+        if (total := previous.total + file_delta) < 0:
+            raise ValueError(f"Cannot have {total} files")
+
+        by_machine = {m: ms for m, ms in self.by_machine.items() if m != machine}
+
+        if total or build_count:
+            by_machine[machine] = MachineStats(total=total, build_count=build_count)
+
+        return replace(
+            self,
+            total=self.total + file_delta,
+            by_machine=dict(sorted(by_machine.items())),
+        )
@@ -1,10 +1,15 @@
 """Utilities for gbp-fl"""
 
+import hashlib
+import os.path
 import re
 from dataclasses import dataclass
-from tarfile import TarFile
+from pathlib import PurePath as Path
+from tarfile import CHRTYPE, DIRTYPE, FIFOTYPE, REGTYPE, SYMTYPE, TarFile, TarInfo
+from typing import IO, Iterator, cast
 
-from gbp_fl.types import MissingPackageIdentifier, Package
+from gbp_fl.decompressors import open_tarfile
+from gbp_fl.types import ContentFileInfo, Package
 
 PKGSPEC_RE_STR = r"""
 (?P<p>[a-z].*)-
@@ -48,13 +53,160 @@ def parse_pkgspec(pkgspec: str) -> Parsed | None:
     return None
 
 
-def ensure_package_identifier(package: Package, tarfile: TarFile) -> None:
-    """Raise MissingPackageIdentifier if tarfile is missing the required identifier"""
-    pv = package.cpv.partition("/")[2]
-    package_identifier = f"{pv}-{package.build_id}/gpkg-1"
+def format_size(size: int | None) -> str:
+    """Format the given file size for display
+
+    Unknown sizes (None) are displayed as "?".
+    """
+    return "?" if size is None else str(size)
+
+
+def read_package_contents(
+    package_path: Path,
+    package: Package,
+    *,
+    use_contents: bool = False,
+    size_lookup_size: int = 0,
+    external_decompress_size: int = 0,
+) -> Iterator[ContentFileInfo]:
+    """Given the path to the binary package, return the packages contents
+
+    This scours the binary tarball for package files.
+    Generates ContentFileInfo objects.
+
+    The binpkg is read in a single forward pass and tarfile members are discarded as
+    they are decoded, so memory use does not grow with the size of the package. The
+    members of a gpkg are recognized by their directory wherever they are in the
+    archive. Other members are the files of a plain (non-gpkg) tarball.
+
+    If `use_contents` is True and the package's metadata contains the Portage CONTENTS
+    file then the files are taken from CONTENTS instead of the (compressed) image
+    tarball. CONTENTS does not record file sizes so these will be None (unknown). If
+    the image tarball is not compressed then reading it is cheap so it is used
+    regardless in order to get the file sizes. Likewise compressed image tarballs
+    smaller than `size_lookup_size` bytes are cheap enough to be read for the sizes.
+
+    If `external_decompress_size` is non-zero, (compressed) image tarballs of at
+    least that many bytes are decompressed by an external, multithreaded, program
+    when one is installed.
+
+    This does not talk to GBP so it is safe to call from worker processes.
+    """
+    # We're not sure of the exact filename of the inner tarfiles because of
+    # available compression options, but we know what the names start with.
+    # https://www.gentoo.org/glep/glep-0078.html#the-container-format
+    basedir = f"{package.cpv.partition('/')[2]}-{package.build_id}/"
+    metadata_prefix = f"{basedir}metadata.tar"
+    prefix = f"{basedir}image.tar"
+    contents: list[ContentFileInfo] | None = None
+
+    with TarFile.open(package_path, "r") as tarfile:
+        for item in iter_members(tarfile):
+            if not item.name.startswith(basedir):
+                # Not part of a GLEP-78 container, so this is a plain tarball whose
+                # members are the package files
+                yield file_info(item)
+            elif use_contents and item.name.startswith(metadata_prefix):
+                contents = read_metadata_contents(tarfile, item)
+            elif item.name.startswith(prefix):
+                if (
+                    contents is not None
+                    and item.name != prefix
+                    and item.size >= size_lookup_size
+                ):
+                    yield from contents  # pylint: disable=not-an-iterable
+                    break
+                image_fp = cast(IO[bytes], tarfile.extractfile(item))
+                # this is also a tarfile
+                with open_tarfile(
+                    item.name,
+                    image_fp,
+                    external=0 < external_decompress_size <= item.size,
+                ) as image:
+                    yield from (file_info(member) for member in iter_members(image))
+                break
+
+
+def file_fingerprint(path: Path) -> str:
+    """Return the fingerprint of the file at the given path
+
+    This is the file's size and SHA-256 digest, so identical files have the same
+    fingerprint. This does not talk to GBP so it is safe to call from worker processes.
+    """
+    with open(path, "rb") as fp:
+        digest = hashlib.file_digest(fp, "sha256").hexdigest()
+
+    return f"{os.path.getsize(path)}:{digest}"
+
+
+def iter_members(tarfile: TarFile) -> Iterator[TarInfo]:
+    """Iterate over the members of the given tarfile without retaining them
+
+    TarFile normally keeps a list of every member it has read. Here the list is
+    cleared as we go.
+    """
+    while (member := tarfile.next()) is not None:
+        # TarFile.members is undocumented (so not in the type stubs) but CPython's
+        # TarFile.next() appends each member to it and extractfile() does not need
+        # it. IterMembersTests pins this behaviour
+        tarfile.members.clear()  # type: ignore[attr-defined]
+        yield member
+
+
+def file_info(member: TarInfo) -> ContentFileInfo:
+    """Return the ContentFileInfo for the given tarfile member"""
+    return ContentFileInfo(
+        name=member.name, mtime=int(member.mtime), size=member.size, type=member.type
+    )
+
+
+def read_metadata_contents(
+    tarfile: TarFile, member: TarInfo
+) -> list[ContentFileInfo] | None:
+    """Return the entries of the CONTENTS file in the given metadata tarball member
+
+    If the metadata does not contain a CONTENTS file, return None.
+    """
+    metadata_fp = cast(IO[bytes], tarfile.extractfile(member))
+
+    with open_tarfile(member.name, metadata_fp) as metadata:
+        for item in iter_members(metadata):
+            if item.name == "metadata/CONTENTS":
+                if (contents_fp := metadata.extractfile(item)) is None:
+                    return None
+                return list(parse_contents(contents_fp))
+
+    return None
 
-    if package_identifier in tarfile.getnames():
-        return
 
-    msg = f"Expected {package_identifier} in the archive, but it was not found."
-    raise MissingPackageIdentifier(msg)
+def parse_contents(contents: IO[bytes]) -> Iterator[ContentFileInfo]:
+    """Parse the given Portage CONTENTS file
+
+    Generates ContentFileInfo objects as if they came from the binpkg's image tarball.
+    CONTENTS does not record file sizes so the size of each entry is None.
+    """
+    for raw_line in contents:
+        line = raw_line.decode("utf-8", "surrogateescape").rstrip("\n")
+        kind, _, rest = line.partition(" ")
+        mtime = "0"
+
+        match kind:
+            case "dir":
+                path, type_ = rest, DIRTYPE
+            case "obj":
+                path, _md5, mtime = rest.rsplit(" ", 2)
+                type_ = REGTYPE
+            case "sym":
+                rest, mtime = rest.rsplit(" ", 1)
+                path = rest.partition(" -> ")[0]
+                type_ = SYMTYPE
+            case "fif":
+                path, type_ = rest, FIFOTYPE
+            case "dev":
+                path, type_ = rest, CHRTYPE
+            case _:
+                continue
+
+        yield ContentFileInfo(
+            name=f"image{path}", mtime=int(mtime), size=None, type=type_
+        )
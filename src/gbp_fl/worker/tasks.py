@@ -3,9 +3,16 @@
 # pylint: disable=import-outside-toplevel
 
 
-def index_build(machine: str, build_id: str) -> None:
-    """Index packages for the given build"""
+def index_build(machine: str, build_id: str) -> None:  # pylint: disable=too-many-locals
+    """Index packages for the given build
+
+    The build's stats are stored when it's indexed. The gbp_fl_postindex signal's
+    file_delta is the number of files indexed. If the indexing is cancelled (the build
+    is being deindexed), neither happens. If the build was deleted, the files saved
+    while it was being deindexed are deleted as well.
+    """
     import logging
+    import time
 
     from gbp_fl import package_utils
     from gbp_fl.gateway import gateway
@@ -19,17 +26,37 @@ def index_build(machine: str, build_id: str) -> None:
 
     logger.info("Saving packages for %s.%s", machine, build_id)
     gateway.emit_signal("gbp_fl_preindex", machine=machine, build_id=build_id)
+    previous = sum(i.file_count for i in repo.files.get_build_stats(machine, build_id))
+    start = time.monotonic()
 
     with gateway.set_process(build, "index"):
-        package_utils.index_build(build, repo)
+        if not package_utils.index_build(build, repo):
+            if not gateway.build_exists(build):
+                # deindex_build may have run, in another process, before the last of
+                # our files were saved
+                repo.files.deindex_build(machine, build_id)
+            return
 
-    gateway.emit_signal("gbp_fl_postindex", machine=machine, build_id=build_id)
+    stats = repo.files.update_build_stats(  # pylint: disable=assignment-from-no-return
+        build, time.monotonic() - start
+    )
+    file_delta = stats.file_count - previous
+    gateway.emit_signal(
+        "gbp_fl_postindex", machine=machine, build_id=build_id, file_delta=file_delta
+    )
 
 
 def deindex_build(machine: str, build_id: str) -> None:
-    """Delete all the files from the given build"""
+    """Delete all the files from the given build
+
+    If the build is still being indexed by this process, the indexing is cancelled
+    first. Indexing in other processes is cancelled once they see that the build was
+    deleted from GBP. The gbp_fl_postdeindex signal's file_delta is (minus) the number
+    of files deleted.
+    """
     from gbp_fl.gateway import gateway
     from gbp_fl.records import Repo
+    from gbp_fl.scheduler import get_scheduler
     from gbp_fl.settings import Settings
     from gbp_fl.types import Build
 
@@ -37,9 +64,13 @@ def deindex_build(machine: str, build_id: str) -> None:
     files = repo.files
     build = Build(machine=machine, build_id=build_id)
 
+    get_scheduler().cancel(build)
     gateway.emit_signal("gbp_fl_predeindex", machine=machine, build_id=build_id)
+    file_count = sum(i.file_count for i in files.get_build_stats(machine, build_id))
 
     with gateway.set_process(build, "deindex"):
         files.deindex_build(machine, build_id)
 
-    gateway.emit_signal("gbp_fl_postdeindex", machine=machine, build_id=build_id)
+    gateway.emit_signal(
+        "gbp_fl_postdeindex", machine=machine, build_id=build_id, file_delta=-file_count
+    )
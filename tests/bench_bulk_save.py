@@ -0,0 +1,125 @@
+"""Benchmark the Django records backend's bulk_save
+
+Compares the single-pass ingest, where each row is written exactly once, with the
+previous two-pass ingest, which inserted the rows and then filled in their basename
+with bulk_update().
+
+Usage:
+
+    python -m tests.bench_bulk_save [--files N] [--files-per-package N]
+"""
+
+# pylint: disable=import-outside-toplevel
+import argparse
+import datetime as dt
+import os.path
+import sys
+import time
+from pathlib import PurePath as Path
+from typing import Callable
+
+import django
+
+from gbp_fl.types import BinPkg, Build, ContentFile
+
+
+def main() -> None:
+    """Program entry point"""
+    args = parse_args()
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "gbp_testkit.settings")
+    os.environ.setdefault("BUILD_PUBLISHER_JENKINS_BASE_URL", "http://jenkins.invalid/")
+    os.environ.setdefault("BUILD_PUBLISHER_STORAGE_PATH", "__testing__")
+    django.setup()
+
+    from django.db import connection
+
+    from gbp_fl.records import django_orm
+
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0)
+
+    try:
+        content_files = make_content_files(args.files, args.files_per_package)
+        files = django_orm.ContentFiles()
+
+        for name, ingest in [
+            ("two-pass", two_pass_bulk_save),
+            ("single-pass", files.bulk_save),
+        ]:
+            elapsed = timed(ingest, content_files)
+            files.deindex_build("bench", "1")
+            rate = len(content_files) / elapsed
+            sys.stdout.write(f"{name:>12}: {elapsed:8.3f}s {rate:12,.0f} rows/s\n")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def make_content_files(count: int, files_per_package: int) -> list[ContentFile]:
+    """Return count ContentFiles for a single build"""
+    build = Build(machine="bench", build_id="1")
+    now = dt.datetime.now(tz=dt.UTC)
+    content_files = []
+
+    for i in range(count):
+        package, file_number = divmod(i, files_per_package)
+        binpkg = BinPkg(
+            build=build,
+            cpv=f"app-misc/package{package}-1.0",
+            build_id=1,
+            repo="gentoo",
+            build_time=now,
+        )
+        content_files.append(
+            ContentFile(
+                binpkg=binpkg,
+                path=Path(f"/usr/share/package{package}/file{file_number}"),
+                timestamp=now,
+                size=file_number,
+            )
+        )
+
+    return content_files
+
+
+def two_pass_bulk_save(content_files: list[ContentFile]) -> None:
+    """The previous ingest: bulk_create() followed by bulk_update() of basename"""
+    from django.db import transaction
+
+    from gbp_fl.records import django_orm
+    from gbp_fl.settings import Settings
+
+    batch_size = Settings.from_environ().RECORDS_BACKEND_DJANGO_BULK_BATCH_SIZE
+
+    with transaction.atomic():
+        ids = django_orm.RowIds()
+        ids.update(content_files)
+        items = django_orm.session.bulk_create(
+            (django_orm.content_file_to_model(cf, ids) for cf in content_files),
+            batch_size=batch_size,
+        )
+        for item, content_file in zip(items, content_files):
+            item.basename = os.path.basename(content_file.path)
+        django_orm.session.bulk_update(items, ["basename"], batch_size=batch_size)
+
+
+def timed(
+    func: Callable[[list[ContentFile]], None], content_files: list[ContentFile]
+) -> float:
+    """Return the number of seconds it takes to call func(content_files)"""
+    start = time.perf_counter()
+    func(content_files)
+
+    return time.perf_counter() - start
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=100_000)
+    parser.add_argument("--files-per-package", type=int, default=100)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main()
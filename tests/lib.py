@@ -8,15 +8,19 @@ from contextlib import contextmanager
 from pathlib import PurePath as Path
 from tarfile import TarInfo
 from typing import Any, Generator, Sequence
-from unittest import mock
+from unittest import SkipTest, mock
 
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.utils import ConnectionHandler
 from gbp_testkit import fixtures as testkit
 from gentoo_build_publisher import types as gbp
 from gentoo_build_publisher import worker as gbp_worker
 from gentoo_build_publisher.cache import cache
 from unittest_fixtures import FixtureContext, Fixtures, fixture
 
-from gbp_fl.records import Repo
+from gbp_fl.records import ContentFiles, Repo
 from gbp_fl.settings import Settings
 from gbp_fl.types import (
     BinPkg,
@@ -48,6 +52,8 @@ class MockGBPGateway:
         self.packages: dict[Build, list[Package]] = {}
         self.contents: dict[tuple[Build, Package], list[TarInfo]] = {}
         self.machines: list[str] = []
+        self.fingerprints: dict[tuple[Build, Package], str] = {}
+        self.deleted: set[Build] = set()
 
     def get_packages(self, build: Build) -> list[Package]:
         try:
@@ -61,9 +67,22 @@ class MockGBPGateway:
         except KeyError:
             raise LookupError(build, package) from None
 
+    def get_package_fingerprint(self, build: Build, package: Package) -> str:
+        return self.fingerprints[build, package]
+
+    def build_exists(self, build: Build) -> bool:
+        return build not in self.deleted
+
     def list_machine_names(self) -> list[str]:
         return self.machines
 
+    def get_builds_for_machine(self, machine: str) -> list[Build]:
+        return [
+            Build(machine=build.machine, build_id=build.build_id)
+            for build in self.builds
+            if build.machine == machine
+        ]
+
 
 @contextmanager
 def cd(path: str) -> Generator[None, None, None]:
@@ -276,6 +295,35 @@ def worker(fixtures: Fixtures) -> FixtureContext[gbp_worker.WorkerInterface]:
         yield sync_worker
 
 
+@fixture()
+def postgresql(_: Fixtures) -> FixtureContext[BaseDatabaseWrapper]:
+    """Connection to the PostgreSQL database named by $GBP_FL_TEST_POSTGRESQL
+
+    The other connection parameters are taken from libpq's PG* environment
+    variables. Tests using this are skipped if there is no database to connect to.
+    """
+    if not (name := os.environ.get("GBP_FL_TEST_POSTGRESQL")):
+        raise SkipTest("GBP_FL_TEST_POSTGRESQL is not set")
+
+    handler = ConnectionHandler(
+        {"default": {"ENGINE": "django.db.backends.postgresql", "NAME": name}}
+    )
+    try:
+        conn = handler["default"]
+        conn.ensure_connection()
+    except (DatabaseError, ImproperlyConfigured) as error:
+        raise SkipTest(f"Cannot connect to PostgreSQL: {error}") from None
+
+    yield conn
+    conn.close()
+
+
+def update_build_stats(files: ContentFiles) -> None:
+    """Store the stats of all the builds having indexed files"""
+    for build in files.get_builds():
+        files.update_build_stats(build)
+
+
 def seq_get(seq: Sequence[Any], index: int, default: Any = None) -> Any:
     """Like dict.get, but for sequences"""
     try:
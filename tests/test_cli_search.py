@@ -2,7 +2,7 @@
 import datetime as dt
 from argparse import ArgumentParser
 from dataclasses import replace
-from unittest import TestCase
+from unittest import TestCase, mock
 
 import gbp_testkit.fixtures as testkit
 from gbp_testkit.helpers import LOCAL_TIMEZONE
@@ -98,6 +98,65 @@ class SearchTests(TestCase):
         self.assertEqual(status, 0)
         self.assertEqual("$ gbp fl search bash\n", console.out.file.getvalue())
 
+    def test_pages(self, fixtures: Fixtures) -> None:
+        cfs = fixtures.bulk_content_files
+        repo = fixtures.repo
+        now = fixtures.now
+
+        for cf in cfs:
+            cf = replace(cf, timestamp=now)
+            repo.files.save(cf)
+            now = now + DAY
+
+        console = fixtures.console
+
+        with mock.patch.object(search, "PAGE_SIZE", 3):
+            status = fixtures.gbpcli("gbp fl search bash")
+
+        self.assertEqual(status, 0)
+        self.assertEqual(
+            TEST5_SEARCH_OUTPUT,
+            console.out.file.getvalue(),
+            "\n" + console.out.file.getvalue(),
+        )
+
+    def test_falls_back_to_search_v2(self, fixtures: Fixtures) -> None:
+        fixtures.repo.files.bulk_save(fixtures.bulk_content_files)
+        console = fixtures.console
+        message = (
+            "Cannot query field 'flSearchPage' on type 'Query'."
+            " Did you mean 'flSearchV2'?"
+        )
+        queries = fixtures.gbp.query.gbp_fl
+
+        with mock.patch.object(
+            queries, "searchpage", return_value=({}, [{"message": message}])
+        ):
+            status = fixtures.gbpcli("gbp fl search gtar")
+
+        self.assertEqual(status, 0)
+        self.assertIn("/bin/gtar", console.out.file.getvalue())
+        self.assertEqual(console.err.file.getvalue(), "")
+
+    def test_regex(self, fixtures: Fixtures) -> None:
+        fixtures.repo.files.bulk_save(fixtures.bulk_content_files)
+        console = fixtures.console
+
+        status = fixtures.gbpcli("gbp fl search --regex ^g.*r$")
+
+        self.assertEqual(status, 0)
+        output = console.out.file.getvalue()
+        self.assertIn("/bin/gtar", output)
+        self.assertNotIn("/bin/bash", output)
+
+    def test_invalid_regex(self, fixtures: Fixtures) -> None:
+        console = fixtures.console
+
+        status = fixtures.gbpcli("gbp fl search --regex g(ta")
+
+        self.assertEqual(status, 1)
+        self.assertIn("Invalid regular expression", console.err.file.getvalue())
+
 
 class ParseArgsTests(TestCase):
     def test(self) -> None:
@@ -129,3 +188,15 @@ TEST4_SEARCH_OUTPUT = """$ gbp fl search --mine bash
 │ 850648 │ 01/26/25 05:57:37 │ lighthouse/34/app-shells/bash-5.2_p37-1 │ /bin/bash │
 ╰────────┴───────────────────┴─────────────────────────────────────────┴───────────╯
 """
+TEST5_SEARCH_OUTPUT = """$ gbp fl search bash
+╭────────┬───────────────────┬─────────────────────────────────────────┬───────────╮
+│   Size │ Timestamp         │ Package                                 │ Path      │
+├────────┼───────────────────┼─────────────────────────────────────────┼───────────┤
+│ 850648 │ 01/26/25 05:57:37 │ lighthouse/34/app-shells/bash-5.2_p37-1 │ /bin/bash │
+│ 850648 │ 01/29/25 06:31:13 │ polaris/26/app-shells/bash-5.2_p37-1    │ /bin/bash │
+│ 850648 │ 01/30/25 06:42:25 │ polaris/26/app-shells/bash-5.2_p37-2    │ /bin/bash │
+╰────────┴───────────────────┴─────────────────────────────────────────┴───────────╯
+╭────────┬───────────────────┬──────────────────────────────────────┬───────────╮
+│ 850648 │ 01/31/25 06:53:37 │ polaris/27/app-shells/bash-5.2_p37-1 │ /bin/bash │
+╰────────┴───────────────────┴──────────────────────────────────────┴───────────╯
+"""
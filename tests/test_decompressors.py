@@ -0,0 +1,116 @@
+"""Tests for gbp_fl.decompressors"""
+
+# pylint: disable=missing-docstring
+import bz2
+import io
+import lzma
+import shutil
+import subprocess as sp
+import sys
+from tarfile import TarFile, TarInfo
+from typing import Literal
+from unittest import TestCase, mock, skipUnless
+
+from gbp_fl import decompressors
+
+
+def make_tarball(mode: Literal["w", "w:xz"] = "w") -> bytes:
+    data = io.BytesIO()
+
+    with TarFile.open(mode=mode, fileobj=data) as tarfile:
+        info = TarInfo("image/usr/bin/foo")
+        info.size = 3
+        tarfile.addfile(info, io.BytesIO(b"foo"))
+
+    return data.getvalue()
+
+
+def read(tarfile: TarFile, member: TarInfo) -> bytes:
+    fp = tarfile.extractfile(member)
+    assert fp is not None
+
+    return fp.read()
+
+
+class GetDecompressorTests(TestCase):
+    def test_zst(self) -> None:
+        self.assertIs(decompressors.get_decompressor("zst"), decompressors.zstd)
+
+    def test_unregistered(self) -> None:
+        self.assertIsNone(decompressors.get_decompressor("xz"))
+
+
+class OpenTarfileTests(TestCase):
+    def test_without_decompressor(self) -> None:
+        fileobj = io.BytesIO(make_tarball("w:xz"))
+
+        with decompressors.open_tarfile("image.tar.xz", fileobj) as tarfile:
+            names = tarfile.getnames()
+
+        self.assertEqual(names, ["image/usr/bin/foo"])
+
+    def test_with_decompressor(self) -> None:
+        fileobj = io.BytesIO(bz2.compress(make_tarball()))
+        decompressor = mock.Mock(side_effect=bz2.BZ2File)
+        path = "gbp_fl.decompressors.get_decompressor"
+
+        with mock.patch(path, return_value=decompressor) as get_decompressor:
+            with decompressors.open_tarfile("image.tar.bz", fileobj) as tarfile:
+                members = [(m.name, read(tarfile, m)) for m in tarfile]
+
+        get_decompressor.assert_called_once_with("bz")
+        decompressor.assert_called_once_with(fileobj)
+        self.assertEqual(members, [("image/usr/bin/foo", b"foo")])
+
+
+@skipUnless(shutil.which("xz"), "xz is not installed")
+class ExternalDecompressorTests(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        decompressors.get_external_decompressor.cache_clear()
+        self.addCleanup(decompressors.get_external_decompressor.cache_clear)
+
+    def test_open_tarfile(self) -> None:
+        fileobj = io.BytesIO(make_tarball("w:xz"))
+
+        with mock.patch.object(sp, "Popen", wraps=sp.Popen) as popen:
+            with decompressors.open_tarfile(
+                "image.tar.xz", fileobj, external=True
+            ) as tarfile:
+                members = [(m.name, read(tarfile, m)) for m in tarfile]
+
+        popen.assert_called_once()
+        self.assertEqual(popen.call_args.args[0][0], "xz")
+        self.assertEqual(members, [("image/usr/bin/foo", b"foo")])
+
+    def test_open_tarfile_when_not_installed(self) -> None:
+        fileobj = io.BytesIO(make_tarball("w:xz"))
+        commands = {"xz": ("gbp-fl-bogus-xz", "-d")}
+
+        with mock.patch.dict(decompressors.EXTERNAL_DECOMPRESSORS, commands):
+            with decompressors.open_tarfile(
+                "image.tar.xz", fileobj, external=True
+            ) as tarfile:
+                names = tarfile.getnames()
+
+        self.assertEqual(names, ["image/usr/bin/foo"])
+
+    def test_failure(self) -> None:
+        with self.assertRaises(decompressors.ExternalDecompressorError):
+            with decompressors.external_stream(("false",), io.BytesIO(b"x")) as stream:
+                stream.read()
+
+    def test_drains_unread_output(self) -> None:
+        data = io.BytesIO(lzma.compress(bytes(10 * decompressors.BUFSIZE)))
+
+        with decompressors.external_stream(("xz", "-d", "-c"), data) as stream:
+            stream.read(1)
+
+
+class ZstdTests(TestCase):
+    def test_unavailable(self) -> None:
+        modules = {"compression.zstd": None, "zstandard": None}
+
+        with mock.patch.dict(sys.modules, modules):
+            with self.assertRaises(decompressors.UnsupportedCompression):
+                decompressors.zstd(io.BytesIO())
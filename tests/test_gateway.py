@@ -50,6 +50,19 @@ class GetFullPackagePathTests(TestCase):
         )
 
 
+@given(lib.environ, testkit.publisher, lib.build)
+class BuildExistsTests(TestCase):
+    def test(self, fixtures: Fixtures) -> None:
+        build = fixtures.build
+        gbp = gw.GBPGateway()
+
+        self.assertFalse(gbp.build_exists(build))
+
+        publisher.pull(build)
+
+        self.assertTrue(gbp.build_exists(build))
+
+
 @given(lib.environ, testkit.publisher, lib.build, lib.package)
 class GetPackagesTests(TestCase):
     def test(self, fixtures: Fixtures) -> None:
@@ -101,6 +114,35 @@ class GetPackageContentsTests(TestCase):
             self.assertEqual(sum(1 for _ in result), 6)
 
 
+@given(lib.build, lib.package)
+class GetPackageFingerprintTests(TestCase):
+    def test(self, fixtures: Fixtures) -> None:
+        gbp = gw.GBPGateway()
+        path = lib.TESTDIR / "assets/sys-libs/mtdev/mtdev-1.1.7-1.gpkg.tar"
+
+        with mock.patch.object(gbp, "get_full_package_path", return_value=path):
+            fingerprint = gbp.get_package_fingerprint(fixtures.build, fixtures.package)
+
+        size, digest = fingerprint.split(":")
+        self.assertEqual(int(size), 40960)
+        self.assertEqual(len(digest), 64)
+
+    def test_different_files(self, fixtures: Fixtures) -> None:
+        gbp = gw.GBPGateway()
+        paths = [
+            lib.TESTDIR / "assets/sys-libs/mtdev/mtdev-1.1.7-1.gpkg.tar",
+            lib.TESTDIR / "assets/empty.tar",
+        ]
+
+        with mock.patch.object(gbp, "get_full_package_path", side_effect=paths):
+            fingerprints = {
+                gbp.get_package_fingerprint(fixtures.build, fixtures.package)
+                for _ in paths
+            }
+
+        self.assertEqual(len(fingerprints), 2)
+
+
 class ReceiveSignalTests(TestCase):
     def test(self) -> None:
         dispatcher = mock.Mock()
@@ -152,6 +194,20 @@ class ListMachineNamesTests(TestCase):
         fixtures.publisher.repo.build_records.list_machines.assert_called_once_with()
 
 
+@given(publisher=testkit.patch)
+@where(publisher__target="gentoo_build_publisher.publisher")
+class GetBuildCountsTests(TestCase):
+    def test(self, fixtures: Fixtures) -> None:
+        build_records = fixtures.publisher.repo.build_records
+        build_records.list_machines.return_value = ["babette", "lighthouse"]
+        build_records.count.side_effect = {"babette": 3, "lighthouse": 7}.get
+
+        gbp = gw.GBPGateway()
+
+        self.assertEqual(gbp.get_build_counts(), {"babette": 3, "lighthouse": 7})
+        build_records.for_machine.assert_not_called()
+
+
 @given(publisher=testkit.patch)
 @where(publisher__target="gentoo_build_publisher.publisher")
 class GetBuildsForMachineTests(TestCase):
@@ -2,7 +2,9 @@
 
 # pylint: disable=missing-docstring
 
-from unittest import TestCase
+import os
+from dataclasses import replace
+from unittest import TestCase, mock
 
 import gbp_testkit.fixtures as testkit
 from gbp_testkit.factories import BuildRecordFactory
@@ -12,6 +14,7 @@ from gentoo_build_publisher.types import Build as GBPBuild
 from unittest_fixtures import Fixtures, given, where
 
 from gbp_fl.gateway import gateway
+from gbp_fl.types import Build
 
 from . import lib
 
@@ -57,6 +60,148 @@ class FileListSearchTests(TestCase):
         self.assertTrue("errors" not in result, result.get("errors"))
         self.assertEqual(len(result["data"]["flSearch"]), 3)
 
+    def test_search_v2_directory(self, fixtures: Fixtures) -> None:
+        f = fixtures
+        repo = f.repo
+        repo.files.bulk_save(f.bulk_content_files)
+        query = """
+          query {
+            flSearchV2(key: "/bin/", machines: ["lighthouse"]) { path }
+          }
+        """
+        result = graphql(fixtures.client, query)
+
+        self.assertTrue("errors" not in result, result.get("errors"))
+        self.assertEqual(result["data"]["flSearchV2"], [{"path": "/bin/bash"}])
+
+    def test_search_v2_regex(self, fixtures: Fixtures) -> None:
+        f = fixtures
+        repo = f.repo
+        repo.files.bulk_save(f.bulk_content_files)
+        query = """
+          query {
+            flSearchV2(key: "^sk.l$", regex: true) { path }
+          }
+        """
+        result = graphql(fixtures.client, query)
+
+        self.assertTrue("errors" not in result, result.get("errors"))
+        self.assertEqual(result["data"]["flSearchV2"], [{"path": "/etc/skel"}])
+
+    def test_search_v2_max_page_size(self, fixtures: Fixtures) -> None:
+        f = fixtures
+        f.repo.files.bulk_save(f.bulk_content_files)
+        query = 'query { flSearchV2(key: "*") { path } }'
+
+        with mock.patch.dict(os.environ, {"GBP_FL_SEARCH_MAX_PAGE_SIZE": "2"}):
+            result = graphql(f.client, query)
+
+        self.assertIn("more than 2 results", result["errors"][0]["message"])
+
+    def test_search_v2_at_max_page_size(self, fixtures: Fixtures) -> None:
+        f = fixtures
+        f.repo.files.bulk_save(f.bulk_content_files)
+        query = 'query { flSearchV2(key: "*", machines: ["lighthouse"]) { path } }'
+
+        with mock.patch.dict(os.environ, {"GBP_FL_SEARCH_MAX_PAGE_SIZE": "2"}):
+            result = graphql(f.client, query)
+
+        self.assertTrue("errors" not in result, result.get("errors"))
+        self.assertEqual(len(result["data"]["flSearchV2"]), 2)
+
+    def test_search_max_page_size(self, fixtures: Fixtures) -> None:
+        f = fixtures
+        f.repo.files.bulk_save(f.bulk_content_files)
+        query = 'query { flSearch(key: "bash") { path } }'
+
+        with mock.patch.dict(os.environ, {"GBP_FL_SEARCH_MAX_PAGE_SIZE": "2"}):
+            result = graphql(f.client, query)
+
+        self.assertIn("more than 2 results", result["errors"][0]["message"])
+
+
+@given(lib.repo, lib.bulk_content_files, testkit.client)
+class FileListSearchPageTests(TestCase):
+    query = """
+      query ($key: String!, $first: Int, $after: String) {
+        flSearchPage(key: $key, first: $first, after: $after) {
+          contentFiles { path }
+          endCursor
+          hasNextPage
+        }
+      }
+    """
+
+    def test(self, fixtures: Fixtures) -> None:
+        f = fixtures
+        f.repo.files.bulk_save(f.bulk_content_files)
+
+        result = graphql(f.client, self.query, {"key": "bash", "first": 3})
+
+        self.assertTrue("errors" not in result, result.get("errors"))
+        page = result["data"]["flSearchPage"]
+        self.assertEqual(len(page["contentFiles"]), 3)
+        self.assertTrue(page["hasNextPage"])
+
+        variables = {"key": "bash", "first": 3, "after": page["endCursor"]}
+        result = graphql(f.client, self.query, variables)
+
+        self.assertTrue("errors" not in result, result.get("errors"))
+        page = result["data"]["flSearchPage"]
+        self.assertEqual(page["contentFiles"], [{"path": "/bin/bash"}])
+        self.assertFalse(page["hasNextPage"])
+
+    def test_max_page_size(self, fixtures: Fixtures) -> None:
+        f = fixtures
+        f.repo.files.bulk_save(f.bulk_content_files)
+
+        with mock.patch.dict(os.environ, {"GBP_FL_SEARCH_MAX_PAGE_SIZE": "2"}):
+            result = graphql(f.client, self.query, {"key": "*", "first": 1000})
+
+        self.assertTrue("errors" not in result, result.get("errors"))
+        page = result["data"]["flSearchPage"]
+        self.assertEqual(len(page["contentFiles"]), 2)
+        self.assertTrue(page["hasNextPage"])
+
+    def test_invalid_cursor(self, fixtures: Fixtures) -> None:
+        result = graphql(fixtures.client, self.query, {"key": "bash", "after": "x"})
+
+        self.assertIn("Invalid cursor", result["errors"][0]["message"])
+
+
+@given(lib.repo, lib.bulk_content_files, testkit.client)
+class FileListSearchCountTests(TestCase):
+    query = """
+      query ($key: String!, $groupBy: flSearchGroupBy) {
+        flSearchCount(key: $key, groupBy: $groupBy) { total groups { group count } }
+      }
+    """
+
+    def test(self, fixtures: Fixtures) -> None:
+        f = fixtures
+        f.repo.files.bulk_save(f.bulk_content_files)
+
+        result = graphql(f.client, self.query, {"key": "bash"})
+
+        self.assertTrue("errors" not in result, result.get("errors"))
+        self.assertEqual(result["data"]["flSearchCount"], {"total": 4, "groups": []})
+
+    def test_group_by(self, fixtures: Fixtures) -> None:
+        f = fixtures
+        f.repo.files.bulk_save(f.bulk_content_files)
+
+        result = graphql(f.client, self.query, {"key": "bash", "groupBy": "MACHINE"})
+
+        self.assertTrue("errors" not in result, result.get("errors"))
+        expected = {
+            "total": 4,
+            "groups": [
+                {"group": "lighthouse", "count": 1},
+                {"group": "polaris", "count": 3},
+            ],
+        }
+        self.assertEqual(result["data"]["flSearchCount"], expected)
+
 
 @given(lib.repo, lib.bulk_content_files, testkit.client)
 class ResolveQueryCountTests(TestCase):
@@ -78,6 +223,7 @@ class ResolveQueryCountTests(TestCase):
         repo = f.repo
 
         repo.files.bulk_save(f.bulk_content_files)
+        lib.update_build_stats(repo.files)
         result = graphql(fixtures.client, self.query)
 
         self.assertTrue("errors" not in result, result.get("errors"))
@@ -94,6 +240,7 @@ class ResolveQueryCountTests(TestCase):
         repo = f.repo
 
         repo.files.bulk_save(f.bulk_content_files)
+        lib.update_build_stats(repo.files)
         result = graphql(
             fixtures.client, self.query_with_machine, {"machine": "lighthouse"}
         )
@@ -106,6 +253,7 @@ class ResolveQueryCountTests(TestCase):
         repo = f.repo
 
         repo.files.bulk_save(f.bulk_content_files)
+        lib.update_build_stats(repo.files)
         result = graphql(
             fixtures.client,
             self.query_with_build,
@@ -115,6 +263,75 @@ class ResolveQueryCountTests(TestCase):
         self.assertTrue("errors" not in result, result.get("errors"))
         self.assertEqual(result["data"]["flCount"], 3)
 
+    def test_counts_stored_stats(self, fixtures: Fixtures) -> None:
+        f = fixtures
+        repo = f.repo
+
+        repo.files.bulk_save(f.bulk_content_files)
+        result = graphql(fixtures.client, self.query)
+
+        # The files aren't counted until the builds' stats are stored
+        self.assertTrue("errors" not in result, result.get("errors"))
+        self.assertEqual(result["data"]["flCount"], 0)
+
+        lib.update_build_stats(repo.files)
+        repo.files.deindex_package(
+            Build(machine="polaris", build_id="26"), "app-arch/tar-1.35-1"
+        )
+        result = graphql(fixtures.client, self.query)
+
+        self.assertTrue("errors" not in result, result.get("errors"))
+        self.assertEqual(result["data"]["flCount"], 6)
+
+
+@given(lib.repo, lib.bulk_content_files, testkit.client)
+class FileListBuildStatsTests(TestCase):
+    query = """
+      query buildStats($machine: String, $buildId: String) {
+        flBuildStats(machine: $machine, buildId: $buildId) {
+          machine buildId fileCount totalSize packageCount indexDuration
+        }
+      }
+    """
+
+    def test(self, fixtures: Fixtures) -> None:
+        repo = fixtures.repo
+        repo.files.bulk_save(fixtures.bulk_content_files)
+        repo.files.update_build_stats(Build(machine="polaris", build_id="26"), 1.5)
+
+        result = graphql(
+            fixtures.client, self.query, {"machine": "polaris", "buildId": "26"}
+        )
+
+        self.assertTrue("errors" not in result, result.get("errors"))
+        expected = [
+            {
+                "machine": "polaris",
+                "buildId": "26",
+                "fileCount": 3,
+                "totalSize": 3 * 850648,
+                "packageCount": 3,
+                "indexDuration": 1.5,
+            }
+        ]
+        self.assertEqual(result["data"]["flBuildStats"], expected)
+
+    def test_with_machine(self, fixtures: Fixtures) -> None:
+        repo = fixtures.repo
+        repo.files.bulk_save(fixtures.bulk_content_files)
+        lib.update_build_stats(repo.files)
+
+        result = graphql(fixtures.client, self.query, {"machine": "polaris"})
+
+        self.assertTrue("errors" not in result, result.get("errors"))
+        build_ids = [i["buildId"] for i in result["data"]["flBuildStats"]]
+        self.assertEqual(build_ids, ["26", "27"])
+
+    def test_build_id_without_machine(self, fixtures: Fixtures) -> None:
+        result = graphql(fixtures.client, self.query, {"buildId": "26"})
+
+        self.assertTrue("errors" in result)
+
 
 @given(lib.repo, lib.bulk_content_files, testkit.client)
 class FileListListTests(TestCase):
@@ -147,6 +364,26 @@ class FileListListTests(TestCase):
         ]
         self.assertEqual(expected, result["data"]["flList"])
 
+    def test_unknown_size(self, fixtures: Fixtures) -> None:
+        repo = fixtures.repo
+        repo.files.bulk_save(
+            replace(cf, size=None) for cf in fixtures.bulk_content_files
+        )
+
+        query = """
+          query {
+            flList(machine: "polaris", buildId: "27", cpvb: "app-shells/bash-5.2_p37-1") {
+              path size
+            }
+          }
+        """
+        result = graphql(fixtures.client, query)
+
+        self.assertTrue("errors" not in result, result.get("errors"))
+        self.assertEqual(
+            result["data"]["flList"], [{"path": "/bin/bash", "size": None}]
+        )
+
 
 @given(lib.repo, testkit.client, testkit.publisher)
 class FlListPackages(TestCase):
@@ -1,14 +1,17 @@
 """Tests for the package_utils module"""
 
+from concurrent.futures import wait as futures_wait
 from pathlib import Path
+from typing import Any
 from unittest import TestCase, mock
 
 import gbp_testkit.fixtures as testkit
 from unittest_fixtures import Fixtures, given, where
 
-from gbp_fl import package_utils
+from gbp_fl import package_utils, scheduler, utils
 from gbp_fl.records import files_backend
-from gbp_fl.types import ContentFileInfo, Package
+from gbp_fl.scheduler import get_scheduler
+from gbp_fl.types import Build, ContentFileInfo, IndexState, Package
 
 from . import lib
 
@@ -55,6 +58,165 @@ class IndexBuildTests(TestCase):
 
         self.assertEqual(repo.files.count(None, None, None), 0)
 
+    def test_copies_unchanged_packages_from_previous_build(
+        self, fixtures: Fixtures
+    ) -> None:
+        mock_gw = fixtures.gateway
+        unchanged, changed = fixtures.bulk_packages[:2]
+        previous = Build(machine="babette", build_id="1504")
+        build = fixtures.build
+        mock_gw.builds = [build, previous]
+        mock_gw.packages[previous] = [unchanged]
+        mock_gw.contents[previous, unchanged] = [fixtures.tarinfo]
+        mock_gw.packages[build] = [unchanged, changed]
+        # Note there are no contents for the unchanged package in the new build
+        mock_gw.contents[build, changed] = [lib.tarinfo(fixtures, "image/bin/gcrypt")]
+        repo = fixtures.repo
+
+        with mock.patch(f"{MOCK_PREFIX}gateway", new=mock_gw):
+            package_utils.index_build(previous, repo)
+            package_utils.index_build(build, repo)
+
+        files = {
+            (i.binpkg.cpvb(), str(i.path))
+            for i in repo.files.for_build(build.machine, build.build_id)
+        }
+        expected = {(unchanged.cpvb, "/bin/bash"), (changed.cpvb, "/bin/gcrypt")}
+        self.assertEqual(files, expected)
+        self.assertEqual(repo.files.count(previous.machine, previous.build_id, None), 1)
+
+    def test_cancelled_while_copying(self, fixtures: Fixtures) -> None:
+        mock_gw = fixtures.gateway
+        package = fixtures.bulk_packages[0]
+        build = fixtures.build
+        mock_gw.packages[build] = [package]
+        mock_gw.contents[build, package] = [fixtures.tarinfo]
+        repo = fixtures.repo
+        cancelled: list[bool] = []
+
+        def copy_unchanged_packages(packages: list[Package], *_args: Any) -> Any:
+            cancelled.append(get_scheduler().cancel(build, wait_for_job=False))
+            return packages
+
+        with (
+            mock.patch(f"{MOCK_PREFIX}gateway", new=mock_gw),
+            mock.patch(
+                f"{MOCK_PREFIX}copy_unchanged_packages",
+                side_effect=copy_unchanged_packages,
+            ),
+        ):
+            package_utils.index_build(build, repo)
+
+        self.assertEqual(cancelled, [True])
+        self.assertEqual(repo.files.count(None, None, None), 0)
+
+    def test_cancelled_when_build_deleted(self, fixtures: Fixtures) -> None:
+        mock_gw = fixtures.gateway
+        package = fixtures.bulk_packages[0]
+        build = fixtures.build
+        mock_gw.packages[build] = [package]
+        mock_gw.contents[build, package] = [fixtures.tarinfo]
+        mock_gw.deleted.add(build)
+        repo = fixtures.repo
+
+        with (
+            mock.patch(f"{MOCK_PREFIX}gateway", new=mock_gw),
+            mock.patch.object(scheduler, "CANCEL_CHECK_INTERVAL", 0),
+        ):
+            completed = package_utils.index_build(build, repo)
+
+        self.assertFalse(completed)
+        self.assertEqual(repo.files.count(None, None, None), 0)
+
+    def test_records_index_state(self, fixtures: Fixtures) -> None:
+        mock_gw = fixtures.gateway
+        package = fixtures.bulk_packages[0]
+        build = fixtures.build
+        mock_gw.packages[build] = [package]
+        mock_gw.contents[build, package] = [fixtures.tarinfo]
+        repo = fixtures.repo
+
+        with mock.patch(f"{MOCK_PREFIX}gateway", new=mock_gw):
+            package_utils.index_build(build, repo)
+
+        index = repo.files.get_index_states(build)[package.cpvb]
+        self.assertEqual(index.state, IndexState.DONE)
+        self.assertEqual(index.file_count, 1)
+
+    def test_retries_failed_packages(self, fixtures: Fixtures) -> None:
+        mock_gw = fixtures.gateway
+        good, bad = fixtures.bulk_packages[:2]
+        build = fixtures.build
+        mock_gw.packages[build] = [good, bad]
+        mock_gw.contents[build, good] = [fixtures.tarinfo]
+        repo = fixtures.repo
+
+        with mock.patch(f"{MOCK_PREFIX}gateway", new=mock_gw):
+            with self.assertLogs("gbp_fl.scheduler", level="ERROR"):
+                package_utils.index_build(build, repo)
+
+        states = repo.files.get_index_states(build)
+        self.assertEqual(states[good.cpvb].state, IndexState.DONE)
+        self.assertEqual(states[bad.cpvb].state, IndexState.FAILED)
+
+        # The good package is not indexed again
+        del mock_gw.contents[build, good]
+        mock_gw.contents[build, bad] = [lib.tarinfo(fixtures, "image/bin/gcrypt")]
+
+        with mock.patch(f"{MOCK_PREFIX}gateway", new=mock_gw):
+            package_utils.index_build(build, repo)
+
+        states = repo.files.get_index_states(build)
+        self.assertEqual(states[bad.cpvb].state, IndexState.DONE)
+        self.assertEqual(repo.files.count(build.machine, build.build_id, None), 2)
+
+    def test_resumes_unfinished_packages(self, fixtures: Fixtures) -> None:
+        mock_gw = fixtures.gateway
+        package = fixtures.bulk_packages[0]
+        build = fixtures.build
+        mock_gw.packages[build] = [package]
+        mock_gw.contents[build, package] = [fixtures.tarinfo]
+        repo = fixtures.repo
+
+        # Simulate a worker that died partway through indexing the package
+        partial_file = package_utils.make_content_file(
+            build, package, ContentFileInfo(name="image/bin/sh", mtime=0, size=0)
+        )
+        repo.files.save(partial_file)
+        repo.files.save_index_state(build, package.cpvb, IndexState.PENDING)
+
+        with mock.patch(f"{MOCK_PREFIX}gateway", new=mock_gw):
+            package_utils.index_build(build, repo)
+
+        files = [str(i.path) for i in repo.files.for_build("babette", "1505")]
+        self.assertEqual(files, ["/bin/bash"])
+        index = repo.files.get_index_states(build)[package.cpvb]
+        self.assertEqual(index.state, IndexState.DONE)
+
+    def test_does_not_copy_unfinished_packages_from_previous_build(
+        self, fixtures: Fixtures
+    ) -> None:
+        mock_gw = fixtures.gateway
+        package = fixtures.bulk_packages[0]
+        previous = Build(machine="babette", build_id="1504")
+        build = fixtures.build
+        mock_gw.builds = [build, previous]
+        mock_gw.packages[previous] = [package]
+        mock_gw.packages[build] = [package]
+        mock_gw.contents[build, package] = [fixtures.tarinfo]
+        repo = fixtures.repo
+        partial_file = package_utils.make_content_file(
+            previous, package, ContentFileInfo(name="image/bin/sh", mtime=0, size=0)
+        )
+        repo.files.save(partial_file)
+        repo.files.save_index_state(previous, package.cpvb, IndexState.FAILED)
+
+        with mock.patch(f"{MOCK_PREFIX}gateway", new=mock_gw):
+            package_utils.index_build(build, repo)
+
+        files = [str(i.path) for i in repo.files.for_build("babette", "1505")]
+        self.assertEqual(files, ["/bin/bash"])
+
     def test_with_actual_package(self, fixtures: Fixtures) -> None:
         build = fixtures.build
         package = Package(
@@ -108,6 +270,208 @@ class IndexBuildTests(TestCase):
         self.assertEqual(files, {"/usr/share/eselect/modules/pinentry.eselect"})
 
 
+@given(lib.repo, lib.bulk_packages, lib.gateway, lib.tarinfo)
+@where(bulk_packages="app-crypt/rhash-1.4.5", environ={"GBP_FL_INDEX_DEDUP": "yes"})
+class IndexPackageDedupTests(TestCase):
+    def test_copies_identical_package(self, fixtures: Fixtures) -> None:
+        mock_gw = fixtures.gateway
+        [package] = fixtures.bulk_packages
+        babette = Build(machine="babette", build_id="1505")
+        lighthouse = Build(machine="lighthouse", build_id="34")
+        mock_gw.contents[babette, package] = [fixtures.tarinfo]
+        mock_gw.fingerprints[babette, package] = "40960:abc"
+        mock_gw.fingerprints[lighthouse, package] = "40960:abc"
+        repo = fixtures.repo
+
+        with mock.patch(f"{MOCK_PREFIX}gateway", new=mock_gw):
+            package_utils.index_package(package, babette, repo)
+            # No contents for lighthouse so they can only have been copied
+            package_utils.index_package(package, lighthouse, repo)
+
+        content_files = list(repo.files.for_package("lighthouse", "34", package.cpvb))
+        self.assertEqual(len(content_files), 1)
+        self.assertEqual(content_files[0].path, Path("/bin/bash"))
+        self.assertEqual(
+            repo.files.find_fingerprint("40960:abc", package.cpvb), babette
+        )
+
+    def test_different_packages(self, fixtures: Fixtures) -> None:
+        mock_gw = fixtures.gateway
+        [package] = fixtures.bulk_packages
+        babette = Build(machine="babette", build_id="1505")
+        lighthouse = Build(machine="lighthouse", build_id="34")
+        mock_gw.contents[babette, package] = [fixtures.tarinfo]
+        mock_gw.contents[lighthouse, package] = [
+            lib.tarinfo(fixtures, "image/bin/rhash")
+        ]
+        mock_gw.fingerprints[babette, package] = "40960:abc"
+        mock_gw.fingerprints[lighthouse, package] = "40960:def"
+        repo = fixtures.repo
+
+        with mock.patch(f"{MOCK_PREFIX}gateway", new=mock_gw):
+            package_utils.index_package(package, babette, repo)
+            package_utils.index_package(package, lighthouse, repo)
+
+        content_files = list(repo.files.for_package("lighthouse", "34", package.cpvb))
+        self.assertEqual([cf.path for cf in content_files], [Path("/bin/rhash")])
+        self.assertEqual(
+            repo.files.find_fingerprint("40960:def", package.cpvb), lighthouse
+        )
+
+    def test_indexes_when_nothing_copied(self, fixtures: Fixtures) -> None:
+        mock_gw = fixtures.gateway
+        [package] = fixtures.bulk_packages
+        babette = Build(machine="babette", build_id="1505")
+        lighthouse = Build(machine="lighthouse", build_id="34")
+        mock_gw.contents[babette, package] = [fixtures.tarinfo]
+        mock_gw.contents[lighthouse, package] = [fixtures.tarinfo]
+        mock_gw.fingerprints[babette, package] = "40960:abc"
+        mock_gw.fingerprints[lighthouse, package] = "40960:abc"
+        repo = fixtures.repo
+
+        with mock.patch(f"{MOCK_PREFIX}gateway", new=mock_gw):
+            package_utils.index_package(package, babette, repo)
+            # e.g. babette was deindexed between finding and copying the package
+            with mock.patch.object(repo.files, "copy_packages", return_value=0):
+                package_utils.index_package(package, lighthouse, repo)
+
+        content_files = list(repo.files.for_package("lighthouse", "34", package.cpvb))
+        self.assertEqual([cf.path for cf in content_files], [Path("/bin/bash")])
+        state = repo.files.get_index_states(lighthouse)[package.cpvb].state
+        self.assertEqual(state, IndexState.DONE)
+
+
+@given(lib.environ, lib.build)
+@where(environ={"GBP_FL_INDEX_EXECUTOR": "process"})
+class IndexBuildProcessExecutorTests(TestCase):
+    def test(self, fixtures: Fixtures) -> None:
+        build = fixtures.build
+        package = Package(
+            "sys-libs/mtdev-1.1.7",
+            repo="gentoo",
+            build_id=1,
+            build_time=123,
+            path=str(lib.TESTDIR / "assets/sys-libs/mtdev/mtdev-1.1.7-1.gpkg.tar"),
+        )
+        repo = mock.Mock(files=files_backend("memory"))
+
+        with mock.patch(f"{MOCK_PREFIX}gateway") as mock_gw:
+            mock_gw.get_packages.return_value = [package]
+            mock_gw.get_full_package_path.side_effect = lambda _b, p: Path(p.path)
+            package_utils.index_build(build, repo)
+
+        files = {
+            i.path.name for i in repo.files.for_build(build.machine, build.build_id)
+        }
+        self.assertEqual(len(files), 10)
+        self.assertIn("libmtdev.so.1.0.0", files)
+
+
+@given(lib.environ, lib.build)
+@where(environ={"GBP_FL_INDEX_EXECUTOR": "process", "GBP_FL_INDEX_DEDUP": "yes"})
+class IndexBuildProcessExecutorDedupTests(TestCase):
+    def test(self, fixtures: Fixtures) -> None:
+        build = fixtures.build
+        other = Build(machine="other", build_id="1")
+        package = Package(
+            "sys-libs/mtdev-1.1.7",
+            repo="gentoo",
+            build_id=1,
+            build_time=123,
+            path=str(lib.TESTDIR / "assets/sys-libs/mtdev/mtdev-1.1.7-1.gpkg.tar"),
+        )
+        repo = mock.Mock(files=files_backend("memory"))
+
+        with mock.patch(f"{MOCK_PREFIX}gateway") as mock_gw:
+            mock_gw.get_packages.return_value = [package]
+            mock_gw.get_full_package_path.side_effect = lambda _b, p: Path(p.path)
+            package_utils.index_build(build, repo)
+            with mock.patch.object(
+                package_utils,
+                "save_package_listing",
+                wraps=package_utils.save_package_listing,
+            ) as save_package_listing:
+                package_utils.index_build(other, repo)
+
+        save_package_listing.assert_not_called()
+        self.assertEqual(repo.files.count("other", "1", None), 10)
+        self.assertEqual(
+            repo.files.find_fingerprint(
+                utils.file_fingerprint(Path(package.path)), package.cpvb
+            ),
+            build,
+        )
+
+
+@given(lib.environ, lib.build)
+@where(
+    environ={
+        "GBP_FL_INDEX_EXECUTOR": "process",
+        "GBP_FL_INDEX_MAX_WORKERS_PER_BUILD": "1",
+    }
+)
+class IndexPackagesInProcessesTests(TestCase):
+    def test_bounds_packages_in_flight(self, fixtures: Fixtures) -> None:
+        build = fixtures.build
+        path = lib.TESTDIR / "assets/sys-libs/mtdev/mtdev-1.1.7-1.gpkg.tar"
+        packages = [
+            Package(
+                "sys-libs/mtdev-1.1.7",
+                repo="gentoo",
+                build_id=build_id,
+                build_time=123,
+                path=str(path),
+            )
+            for build_id in range(1, 7)
+        ]
+        repo = mock.Mock(files=files_backend("memory"))
+        in_flight: list[int] = []
+
+        def wait(futures: Any, **kwargs: Any) -> Any:
+            in_flight.append(len(futures))
+            return futures_wait(futures, **kwargs)
+
+        with (
+            mock.patch(f"{MOCK_PREFIX}gateway") as mock_gw,
+            mock.patch(f"{MOCK_PREFIX}wait", side_effect=wait),
+        ):
+            mock_gw.get_packages.return_value = packages
+            mock_gw.get_full_package_path.side_effect = lambda _b, p: Path(p.path)
+            package_utils.index_build(build, repo)
+
+        states = repo.files.get_index_states(build)
+        self.assertEqual(len(states), 6)
+        self.assertTrue(all(i.state == IndexState.DONE for i in states.values()))
+        self.assertEqual(max(in_flight), 2)
+
+
+@given(lib.environ, lib.build)
+@where(environ={"GBP_FL_INDEX_EXECUTOR": "bogus"})
+class IndexBuildInvalidExecutorTests(TestCase):
+    def test(self, fixtures: Fixtures) -> None:
+        repo = mock.Mock(files=files_backend("memory"))
+
+        with self.assertRaises(ValueError):
+            package_utils.index_build(fixtures.build, repo)
+
+
+class PackageListingTests(TestCase):
+    def test(self) -> None:
+        path = lib.TESTDIR / "assets/sys-libs/mtdev/mtdev-1.1.7-1.gpkg.tar"
+        package = Package(
+            "sys-libs/mtdev-1.1.7",
+            repo="gentoo",
+            build_id=1,
+            build_time=123,
+            path=str(path),
+        )
+
+        listing = package_utils.package_listing(path, package)
+
+        self.assertEqual(len(listing), 10)
+        self.assertTrue(all(isinstance(i, ContentFileInfo) for i in listing))
+
+
 @given(lib.gbp_package, record=testkit.build_record)
 class MakeContentFileTests(TestCase):
     def test(self, fixtures: Fixtures) -> None:
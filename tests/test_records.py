@@ -1,27 +1,64 @@
-# pylint: disable=missing-docstring,unused-argument
+# pylint: disable=missing-docstring,unused-argument,too-many-lines
 
 import datetime as dt
 import inspect
+import sys
+import tracemalloc
+from dataclasses import replace
 from functools import partial
 from importlib import import_module
 from pathlib import PurePath as Path
+from unittest import mock
 
+from django.db import connection
 from django.test import TestCase
-from unittest_fixtures import Fixtures, given, params
-
-from gbp_fl.records import ContentFiles, RecordNotFound, Repo, django_orm, files_backend
+from django.test.utils import CaptureQueriesContext
+from unittest_fixtures import Fixtures, given, params, where
+
+from gbp_fl.django.gbp_fl import models
+from gbp_fl.records import (
+    ContentFiles,
+    RecordNotFound,
+    Repo,
+    directory_prefix,
+    django_blob,
+    django_orm,
+    files_backend,
+)
+from gbp_fl.records.patterns import glob_pattern, is_glob, regex_pattern
 from gbp_fl.settings import Settings
-from gbp_fl.types import Build, ContentFile
+from gbp_fl.types import (
+    Build,
+    BuildStats,
+    ContentFile,
+    IndexState,
+    PackageIndex,
+    SearchGroup,
+)
 
 from . import lib
 
 now = partial(dt.datetime.now, tz=dt.UTC)
 
-BACKENDS = ("memory", "django")
+BACKENDS = ("memory", "django", "django_blob")
+
+
+def empty_files_backend(fixtures: Fixtures) -> ContentFiles:
+    # The django backends share tables and the @params subtests share the test's
+    # transaction, so start each subtest with empty tables
+    for model in (
+        models.Build,
+        models.Directory,
+        models.PackageFingerprint,
+        models.PackageIndex,
+    ):
+        model.objects.all().delete()
+
+    return files_backend(fixtures.backend_type)
 
 
 @params(backend_type=BACKENDS)
-@given(files=lambda f: files_backend(f.backend_type))
+@given(files=empty_files_backend)
 @given(lib.content_file, lib.bulk_content_files)
 class ContentFilesTests(TestCase):
     # pylint: disable=too-many-public-methods
@@ -71,6 +108,29 @@ class ContentFilesTests(TestCase):
 
         self.assertEqual(files.count(None, None, None), 6)
 
+    def test_bulk_save_replaces_existing(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        content_files = fixtures.bulk_content_files
+        files.bulk_save(content_files)
+
+        files.bulk_save([replace(content_files[0], size=1), content_files[1]])
+
+        self.assertEqual(files.count(None, None, None), 6)
+        record = files.get("lighthouse", "34", "app-shells/bash-5.2_p37-1", "/bin/bash")
+        self.assertEqual(record.size, 1)
+
+    def test_bulk_save_duplicates(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        content_file = fixtures.bulk_content_files[0]
+
+        files.bulk_save(
+            [content_file, replace(content_file, size=1), replace(content_file, size=2)]
+        )
+
+        self.assertEqual(files.count(None, None, None), 1)
+        record = files.get("lighthouse", "34", "app-shells/bash-5.2_p37-1", "/bin/bash")
+        self.assertEqual(record.size, 2)
+
     def test_get(self, fixtures: Fixtures) -> None:
         content_file = fixtures.content_file
         files = fixtures.files
@@ -144,6 +204,61 @@ class ContentFilesTests(TestCase):
 
         self.assertEqual(files.count(None, None, None), 6)
 
+    def test_update_build_stats(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        files.bulk_save(fixtures.bulk_content_files)
+        build = Build(machine="polaris", build_id="26")
+
+        stats = files.update_build_stats(build, 4.5)
+
+        expected = BuildStats(
+            build=build,
+            file_count=3,
+            total_size=3 * 850648,
+            package_count=3,
+            index_duration=4.5,
+        )
+        self.assertEqual(stats, expected)
+        self.assertEqual(files.get_build_stats("polaris", "26"), [expected])
+
+    def test_update_build_stats_without_files(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        build = Build(machine="polaris", build_id="26")
+
+        stats = files.update_build_stats(build)
+
+        self.assertEqual(stats, BuildStats(build=build))
+
+    def test_get_build_stats(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        files.bulk_save(fixtures.bulk_content_files)
+        lib.update_build_stats(files)
+
+        self.assertEqual(
+            [(i.build.id, i.file_count) for i in files.get_build_stats()],
+            [("lighthouse.34", 2), ("polaris.26", 3), ("polaris.27", 1)],
+        )
+        self.assertEqual(
+            [i.build.id for i in files.get_build_stats("polaris")],
+            ["polaris.26", "polaris.27"],
+        )
+        self.assertEqual(files.get_build_stats("polaris", "28"), [])
+
+        with self.assertRaises(ValueError):
+            files.get_build_stats(None, "26")
+
+    def test_deindex_build_deletes_build_stats(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        files.bulk_save(fixtures.bulk_content_files)
+        lib.update_build_stats(files)
+
+        files.deindex_build("polaris", "26")
+
+        self.assertEqual(
+            [i.build.id for i in files.get_build_stats()],
+            ["lighthouse.34", "polaris.27"],
+        )
+
     def test_count_cpv_without_build_id(self, fixtures: Fixtures) -> None:
         files = fixtures.files
 
@@ -236,6 +351,202 @@ class ContentFilesTests(TestCase):
         pkg_files = list(files.search("*ash"))
         self.assertEqual(len(pkg_files), 4)
 
+    def test_search_directory(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        site_packages = "/usr/lib/python3.12/site-packages"
+        paths = [
+            f"{site_packages}/requests/__init__.py",
+            f"{site_packages}/requests/packages/urllib3.py",
+            f"{site_packages}/requests-2.32.3.dist-info/METADATA",
+            "/usr/lib/python3.12/os.py",
+        ]
+        files.bulk_save(
+            replace(fixtures.content_file, path=Path(path)) for path in paths
+        )
+
+        for key in [
+            f"{site_packages}/requests/",
+            f"{site_packages}/requests/**",
+            f"{site_packages[1:]}/requests/",
+        ]:
+            found = {str(cf.path) for cf in files.search(key)}
+            self.assertEqual(found, set(paths[:2]), key)
+
+        found = {str(cf.path) for cf in files.search("/usr/lib/python3.12/")}
+        self.assertEqual(found, set(paths))
+
+        self.assertEqual(list(files.search(f"{site_packages}/request/")), [])
+
+    def test_search_directory_machines(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        files.bulk_save(fixtures.bulk_content_files)
+
+        self.assertEqual(len(list(files.search("/"))), 6)
+        self.assertEqual(len(list(files.search("/bin/", machines=["polaris"]))), 4)
+
+    def test_search_directory_after_delete(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        files.bulk_save(fixtures.bulk_content_files)
+        self.assertEqual(len(list(files.search("/etc/"))), 1)
+
+        files.deindex_build("lighthouse", "34")
+
+        self.assertEqual(len(list(files.search("/etc/"))), 0)
+
+    def test_search_glob(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        names = ["libssl.so.3", "libssl3.so", "libcrypto.so.3", "xlibssl.so", "lib.so"]
+        files.bulk_save(
+            replace(fixtures.content_file, path=Path(f"/usr/lib64/{name}"))
+            for name in names
+        )
+
+        for key, expected in [
+            ("lib*ssl*.so*", {"libssl.so.3", "libssl3.so"}),
+            ("lib?s*", {"libssl.so.3", "libssl3.so", "lib.so"}),
+            ("lib[cs]*.3", {"libssl.so.3", "libcrypto.so.3"}),
+            ("*.so", {"libssl3.so", "xlibssl.so", "lib.so"}),
+            ("LIB*", set()),
+        ]:
+            found = {cf.path.name for cf in files.search(key)}
+            self.assertEqual(found, expected, key)
+
+    def test_search_glob_without_asterisk(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        names = ["libc.so", "libcc.so", "lib.so", "lib[c.so"]
+        files.bulk_save(
+            replace(fixtures.content_file, path=Path(f"/usr/lib64/{name}"))
+            for name in names
+        )
+
+        for key, expected in [
+            ("lib?.so", {"libc.so"}),
+            ("lib[cx].so", {"libc.so"}),
+            ("lib[c.so", {"lib[c.so"}),
+        ]:
+            found = {cf.path.name for cf in files.search(key)}
+            self.assertEqual(found, expected, key)
+            count = files.search_count(key)
+            self.assertEqual(count.total, len(expected), key)
+
+    def test_search_regex(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        names = ["libssl.so.3", "libssl3.so", "libcrypto.so.3", "xlibssl.so"]
+        files.bulk_save(
+            replace(fixtures.content_file, path=Path(f"/usr/lib64/{name}"))
+            for name in names
+        )
+
+        for key, expected in [
+            (r"^libssl\.so\.\d+$", {"libssl.so.3"}),
+            (r"ssl.*\.so$", {"libssl3.so", "xlibssl.so"}),
+            (r"crypto|ssl3", {"libcrypto.so.3", "libssl3.so"}),
+            (r"(?i)^LIBSSL", {"libssl.so.3", "libssl3.so"}),
+            (r"/usr", set()),
+            (r"^\x6cibssl3", {"libssl3.so"}),
+            (r"^\154ibssl3", {"libssl3.so"}),
+            (r"^\u006cibcrypto", {"libcrypto.so.3"}),
+        ]:
+            found = {cf.path.name for cf in files.search(key, regex=True)}
+            self.assertEqual(found, expected, key)
+
+    def test_search_invalid_regex(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+
+        with self.assertRaises(ValueError):
+            list(files.search("lib(ssl", regex=True))
+
+    def test_search_page(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        files.bulk_save(fixtures.bulk_content_files)
+        expected = {str(cf.path) for cf in files.search("*")}
+        pages = [files.search_page("*", first=2)]
+
+        while pages[-1].has_next_page:
+            pages.append(files.search_page("*", first=2, after=pages[-1].end_cursor))
+
+        paths = [str(cf.path) for page in pages for cf in page.content_files]
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(len(paths), 6)
+        self.assertEqual(set(paths), expected)
+
+    def test_search_page_filters(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        files.bulk_save(fixtures.bulk_content_files)
+
+        first = files.search_page("bash", ["polaris"], first=2)
+        rest = files.search_page("bash", ["polaris"], first=2, after=first.end_cursor)
+
+        self.assertEqual(len(first.content_files), 2)
+        self.assertTrue(first.has_next_page)
+        self.assertEqual(len(rest.content_files), 1)
+        self.assertFalse(rest.has_next_page)
+        self.assertEqual(rest.content_files[0].binpkg.build.machine, "polaris")
+
+        page = files.search_page("^g.*r$", regex=True)
+        self.assertEqual([str(cf.path) for cf in page.content_files], ["/bin/gtar"])
+
+    def test_search_page_empty(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        files.bulk_save(fixtures.bulk_content_files)
+
+        for key in ["", "python"]:
+            page = files.search_page(key)
+            self.assertEqual(page.content_files, [], key)
+            self.assertIsNone(page.end_cursor, key)
+            self.assertFalse(page.has_next_page, key)
+
+    def test_search_page_invalid_cursor(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+
+        with self.assertRaises(ValueError):
+            files.search_page("bash", after="bogus")
+
+    def test_search_count(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        files.bulk_save(fixtures.bulk_content_files)
+
+        for key, machines, regex, expected in [
+            ("bash", None, False, 4),
+            ("bash", ["polaris"], False, 3),
+            ("/bin/", None, False, 5),
+            ("*a*", None, False, 5),
+            ("b?s*", None, False, 4),
+            ("B*", None, False, 0),
+            ("*[kr]*", None, False, 2),
+            ("^g.*r$", None, True, 1),
+            ("python", None, False, 0),
+            ("", None, False, 0),
+        ]:
+            count = files.search_count(key, machines, regex=regex)
+            self.assertEqual(count.total, expected, key)
+            self.assertEqual(count.groups, {}, key)
+
+    def test_search_count_group_by(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        files.bulk_save(fixtures.bulk_content_files)
+
+        for key, group_by, expected in [
+            ("bash", SearchGroup.MACHINE, {"lighthouse": 1, "polaris": 3}),
+            (
+                "/bin/",
+                SearchGroup.BUILD,
+                {"lighthouse.34": 1, "polaris.26": 3, "polaris.27": 1},
+            ),
+            (
+                "*a*",
+                SearchGroup.CPVB,
+                {
+                    "app-shells/bash-5.2_p37-1": 3,
+                    "app-shells/bash-5.2_p37-2": 1,
+                    "app-arch/tar-1.35-1": 1,
+                },
+            ),
+        ]:
+            count = files.search_count(key, group_by=group_by)
+            self.assertEqual(count.groups, expected, key)
+            self.assertEqual(count.total, sum(expected.values()), key)
+
     def test_search_with_empty_string(self, fixtures: Fixtures) -> None:
         files = fixtures.files
         files.bulk_save(fixtures.bulk_content_files)
@@ -278,6 +589,17 @@ class ContentFilesTests(TestCase):
 
         self.assertEqual("/dev/null", content_file.path)
 
+    def test_unknown_size(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        content_file = replace(fixtures.content_file, size=None)
+        files.bulk_save([content_file, replace(content_file, path=Path("/bin/sh"))])
+
+        [found] = files.search("bash")
+        stats = files.update_build_stats(content_file.binpkg.build)
+
+        self.assertIsNone(found.size)
+        self.assertEqual((stats.file_count, stats.total_size), (2, 0))
+
     def test_get_builds(self, fixtures: Fixtures) -> None:
         files = fixtures.files
         files.bulk_save(fixtures.bulk_content_files)
@@ -291,6 +613,709 @@ class ContentFilesTests(TestCase):
         }
         self.assertEqual(builds, expected)
 
+    def test_copy_packages(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        files.bulk_save(fixtures.bulk_content_files)
+        source = Build(machine="polaris", build_id="26")
+        dest = Build(machine="polaris", build_id="28")
+
+        count = files.copy_packages(
+            source, dest, ["app-shells/bash-5.2_p37-1", "bogus-1"]
+        )
+
+        self.assertEqual(count, 1)
+        copied = list(files.for_build("polaris", "28"))
+        self.assertEqual(len(copied), 1)
+        self.assertEqual(copied[0].binpkg.build, dest)
+        self.assertEqual(copied[0].binpkg.cpvb(), "app-shells/bash-5.2_p37-1")
+        self.assertEqual(copied[0].path, Path("/bin/bash"))
+        self.assertEqual(copied[0].size, 850648)
+        self.assertEqual(files.count("polaris", "26", None), 3)
+
+    def test_copy_packages_already_in_dest(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        files.bulk_save(fixtures.bulk_content_files)
+        source = Build(machine="polaris", build_id="26")
+        dest = Build(machine="polaris", build_id="28")
+        cpvb = "app-shells/bash-5.2_p37-1"
+        files.bulk_save(
+            replace(cf, binpkg=replace(cf.binpkg, build=dest))
+            for cf in files.for_package("polaris", "26", cpvb)
+        )
+        files.save_fingerprint(source, cpvb, "870400:abc")
+        files.save_fingerprint(dest, cpvb, "870400:abc")
+        files.save_index_state(dest, cpvb, IndexState.PENDING)
+
+        files.copy_packages(source, dest, [cpvb])
+
+        copied = [str(cf.path) for cf in files.for_build("polaris", "28")]
+        self.assertEqual(copied, ["/bin/bash"])
+        self.assertEqual(files.get_index_states(dest)[cpvb].state, IndexState.DONE)
+
+    def test_find_fingerprint(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        build = Build(machine="polaris", build_id="26")
+        cpvb = "app-shells/bash-5.2_p37-1"
+
+        self.assertIsNone(files.find_fingerprint("870400:abc", cpvb))
+
+        files.save_fingerprint(build, cpvb, "870400:abc")
+        files.save_index_state(build, cpvb, IndexState.DONE, 1)
+
+        self.assertEqual(files.find_fingerprint("870400:abc", cpvb), build)
+        self.assertIsNone(files.find_fingerprint("870400:abc", "app-shells/bash-5-1"))
+
+    def test_find_fingerprint_of_unfinished_package(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        build = Build(machine="polaris", build_id="26")
+        cpvb = "app-shells/bash-5.2_p37-1"
+        files.save_fingerprint(build, cpvb, "870400:abc")
+
+        self.assertIsNone(files.find_fingerprint("870400:abc", cpvb))
+
+        files.save_index_state(build, cpvb, IndexState.PENDING)
+
+        self.assertIsNone(files.find_fingerprint("870400:abc", cpvb))
+
+    def test_deindex_build_deletes_fingerprints(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        build = Build(machine="polaris", build_id="26")
+        cpvb = "app-shells/bash-5.2_p37-1"
+        files.save_fingerprint(build, cpvb, "870400:abc")
+        files.save_index_state(build, cpvb, IndexState.DONE, 1)
+
+        files.deindex_build("polaris", "26")
+
+        self.assertIsNone(files.find_fingerprint("870400:abc", cpvb))
+
+    def test_copy_packages_copies_fingerprints(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        files.bulk_save(fixtures.bulk_content_files)
+        source = Build(machine="polaris", build_id="26")
+        dest = Build(machine="polaris", build_id="28")
+        cpvb = "app-shells/bash-5.2_p37-1"
+        files.save_fingerprint(source, cpvb, "870400:abc")
+
+        files.copy_packages(source, dest, [cpvb])
+        files.deindex_build("polaris", "26")
+
+        self.assertEqual(files.find_fingerprint("870400:abc", cpvb), dest)
+
+    def test_copy_packages_from_unknown_build(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        source = Build(machine="polaris", build_id="26")
+        dest = Build(machine="polaris", build_id="28")
+
+        count = files.copy_packages(source, dest, ["app-shells/bash-5.2_p37-1"])
+
+        self.assertEqual(count, 0)
+        self.assertEqual(files.get_index_states(dest), {})
+
+    def test_index_states(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        build = Build(machine="polaris", build_id="26")
+        other = Build(machine="polaris", build_id="27")
+
+        files.save_index_state(build, "app-shells/bash-5.2_p37-1", IndexState.PENDING)
+        files.save_index_state(build, "app-shells/bash-5.2_p37-1", IndexState.DONE, 3)
+        files.save_index_state(build, "sys-apps/less-1-1", IndexState.FAILED)
+        files.save_index_state(other, "sys-apps/less-1-1", IndexState.DONE, 1)
+
+        states = files.get_index_states(build)
+
+        expected = {
+            "app-shells/bash-5.2_p37-1": PackageIndex(
+                build=build,
+                cpvb="app-shells/bash-5.2_p37-1",
+                state=IndexState.DONE,
+                file_count=3,
+            ),
+            "sys-apps/less-1-1": PackageIndex(
+                build=build, cpvb="sys-apps/less-1-1", state=IndexState.FAILED
+            ),
+        }
+        self.assertEqual(states, expected)
+
+    def test_deindex_build_deletes_index_states(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        build = Build(machine="polaris", build_id="26")
+        files.save_index_state(build, "app-shells/bash-5.2_p37-1", IndexState.DONE)
+
+        files.deindex_build("polaris", "26")
+
+        self.assertEqual(files.get_index_states(build), {})
+
+    def test_deindex_package(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        files.bulk_save(fixtures.bulk_content_files)
+        build = Build(machine="polaris", build_id="26")
+        cpvb = "app-shells/bash-5.2_p37-1"
+        files.save_fingerprint(build, cpvb, "870400:abc")
+        files.save_index_state(build, cpvb, IndexState.PENDING)
+
+        files.deindex_package(build, cpvb)
+
+        self.assertEqual(files.count("polaris", "26", cpvb), 0)
+        self.assertEqual(files.count("polaris", "26", None), 2)
+        self.assertIsNone(files.find_fingerprint("870400:abc", cpvb))
+        self.assertEqual(files.get_index_states(build), {})
+
+    def test_copy_packages_marks_packages_done(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        files.bulk_save(fixtures.bulk_content_files)
+        source = Build(machine="polaris", build_id="26")
+        dest = Build(machine="polaris", build_id="28")
+
+        files.copy_packages(source, dest, ["app-shells/bash-5.2_p37-1", "bogus-1"])
+
+        expected = {
+            "app-shells/bash-5.2_p37-1": PackageIndex(
+                build=dest,
+                cpvb="app-shells/bash-5.2_p37-1",
+                state=IndexState.DONE,
+                file_count=1,
+            )
+        }
+        self.assertEqual(files.get_index_states(dest), expected)
+
+    def test_copy_packages_with_no_files(self, fixtures: Fixtures) -> None:
+        files = fixtures.files
+        files.bulk_save(fixtures.bulk_content_files)
+        source = Build(machine="polaris", build_id="26")
+        dest = Build(machine="polaris", build_id="28")
+        cpvb = "virtual/libc-1-r1-1"
+        files.save_index_state(source, cpvb, IndexState.DONE)
+        files.save_index_state(source, "bogus-1", IndexState.PENDING)
+        files.save_index_state(dest, cpvb, IndexState.PENDING)
+
+        count = files.copy_packages(
+            source, dest, [cpvb, "app-shells/bash-5.2_p37-1", "bogus-1"]
+        )
+
+        self.assertEqual(count, 2)
+        states = files.get_index_states(dest)
+        self.assertEqual(set(states), {cpvb, "app-shells/bash-5.2_p37-1"})
+        self.assertEqual(states[cpvb].state, IndexState.DONE)
+        self.assertEqual(states[cpvb].file_count, 0)
+        self.assertEqual(states["app-shells/bash-5.2_p37-1"].file_count, 1)
+        self.assertEqual(files.count("polaris", "28", cpvb), 0)
+
+
+@given(lib.content_file, lib.bulk_content_files, lib.environ)
+@where(environ={"GBP_FL_RECORDS_BACKEND_DJANGO_BULK_BATCH_SIZE": "2"})
+class DjangoContentFilesTests(TestCase):
+    def test_bulk_save_writes_each_row_once(self, fixtures: Fixtures) -> None:
+        files = django_orm.ContentFiles()
+
+        with CaptureQueriesContext(connection) as context:
+            files.bulk_save(fixtures.bulk_content_files)
+
+        statements = [query["sql"] for query in context.captured_queries]
+        inserts = [
+            sql
+            for sql in statements
+            if sql.startswith('INSERT INTO "gbp_fl_contentfile"')
+        ]
+        self.assertEqual(len(inserts), 3)
+        self.assertFalse(any(sql.startswith("UPDATE") for sql in statements))
+        self.assertEqual(
+            set(models.ContentFile.objects.values_list("directory__path", "basename")),
+            {("/bin", "bash"), ("/etc", "skel"), ("/bin", "gtar")},
+        )
+
+    def test_save_existing(self, fixtures: Fixtures) -> None:
+        files = django_orm.ContentFiles()
+        content_file = fixtures.content_file
+        files.save(content_file)
+
+        # Look up the BinPkg and Directory and write the row
+        with self.assertNumQueries(3):
+            files.save(content_file, size=1)
+
+        record = models.ContentFile.objects.get()
+        self.assertEqual(record.size, 1)
+        self.assertEqual(record.basename, content_file.path.name)
+
+    def test_builds_and_binpkgs_are_stored_once(self, fixtures: Fixtures) -> None:
+        files = django_orm.ContentFiles()
+
+        files.bulk_save(fixtures.bulk_content_files)
+
+        self.assertEqual(models.Build.objects.count(), 3)
+        self.assertEqual(models.BinPkg.objects.count(), 5)
+        self.assertEqual(models.ContentFile.objects.count(), 6)
+
+    def test_files_of_a_package_share_binpkg(self, fixtures: Fixtures) -> None:
+        files = django_orm.ContentFiles()
+        files.bulk_save(fixtures.bulk_content_files)
+
+        bash, skel = files.for_build("lighthouse", "34")
+
+        self.assertIs(bash.binpkg, skel.binpkg)
+
+    def test_directories_are_stored_once(self, fixtures: Fixtures) -> None:
+        files = django_orm.ContentFiles()
+
+        files.bulk_save(fixtures.bulk_content_files)
+
+        self.assertEqual(
+            set(models.Directory.objects.values_list("path", flat=True)),
+            {"/bin", "/etc"},
+        )
+
+    def test_model_reversed_basename(self, fixtures: Fixtures) -> None:
+        files = django_orm.ContentFiles()
+        files.bulk_save(fixtures.bulk_content_files)
+
+        self.assertEqual(
+            set(models.ContentFile.objects.values_list("reversed_basename", flat=True)),
+            {"hsab", "leks", "ratg"},
+        )
+
+    def test_model_path(self, fixtures: Fixtures) -> None:
+        files = django_orm.ContentFiles()
+        files.save(fixtures.content_file)
+
+        record = models.ContentFile.objects.get()
+
+        self.assertEqual(record.path, str(fixtures.content_file.path))
+
+    def test_deindex_build_deletes_build_rows(self, fixtures: Fixtures) -> None:
+        files = django_orm.ContentFiles()
+        files.bulk_save(fixtures.bulk_content_files)
+
+        files.deindex_build("polaris", "26")
+
+        self.assertFalse(models.Build.objects.filter(machine="polaris", build_id="26"))
+        self.assertEqual(models.BinPkg.objects.count(), 2)
+        self.assertEqual(files.count(None, None, None), 3)
+
+
+class IsGlobTests(TestCase):
+    def test(self) -> None:
+        self.assertTrue(is_glob("lib*.so"))
+        self.assertTrue(is_glob("lib?.so"))
+        self.assertTrue(is_glob("lib[cz].so"))
+        self.assertFalse(is_glob("libc.so"))
+
+
+class GlobPatternTests(TestCase):
+    def test(self) -> None:
+        pattern = glob_pattern("lib*ssl*.so*")
+
+        self.assertEqual(pattern.prefix, "lib")
+        self.assertEqual(pattern.suffix, "")
+        self.assertEqual(pattern.fragments, ("ssl", ".so"))
+        self.assertTrue(pattern.matches("libssl.so.3"))
+        self.assertFalse(pattern.matches("libcrypto.so.3"))
+
+    def test_wildcards(self) -> None:
+        pattern = glob_pattern("a?b[!]x]c*d")
+
+        self.assertEqual(pattern.prefix, "a")
+        self.assertEqual(pattern.suffix, "d")
+        self.assertEqual(pattern.fragments, ("b", "c"))
+        self.assertFalse(pattern.matches("a-b]c--d"))
+        self.assertTrue(pattern.matches("a-byc--d"))
+
+    def test_unclosed_class_is_literal(self) -> None:
+        pattern = glob_pattern("*[abc")
+
+        self.assertEqual(pattern.suffix, "[abc")
+        self.assertTrue(pattern.matches("x[abc"))
+
+
+class RegexPatternTests(TestCase):
+    def test(self) -> None:
+        pattern = regex_pattern(r"^libssl\.so\.\d+$")
+
+        self.assertEqual(pattern.prefix, "libssl.so.")
+        self.assertEqual(pattern.fragments, ())
+        self.assertTrue(pattern.matches("libssl.so.3"))
+
+    def test_fragments(self) -> None:
+        pattern = regex_pattern(r"ab*cd+e{2}f(xyz)?gh[]x]ij\w+k\.l")
+
+        self.assertEqual(pattern.prefix, "")
+        self.assertEqual(pattern.fragments, ("a", "cd", "f", "gh", "ij", "k.l"))
+
+    def test_escapes(self) -> None:
+        for key, fragments in [
+            (r"\x41b", ("b",)),
+            (r"\101b", ("b",)),
+            (r"\0bc", ("bc",)),
+            (r"\u0041b", ("b",)),
+            (r"\U00000041b", ("b",)),
+            (r"\N{LATIN CAPITAL LETTER A}b", ("b",)),
+            (r"(a)\1b", ("b",)),
+        ]:
+            pattern = regex_pattern(key)
+            self.assertEqual((pattern.prefix, pattern.fragments), ("", fragments), key)
+
+    def test_no_literals(self) -> None:
+        for key in ["foo|bar", "(?i)foo", "(?x)f o o", "(?m)^foo"]:
+            pattern = regex_pattern(key)
+            self.assertEqual((pattern.prefix, pattern.fragments), ("", ()), key)
+
+    def test_invalid(self) -> None:
+        with self.assertRaises(ValueError):
+            regex_pattern("lib(ssl")
+
+
+class DirectoryPrefixTests(TestCase):
+    def test(self) -> None:
+        self.assertEqual(directory_prefix("/usr/lib/"), "/usr/lib/")
+        self.assertEqual(directory_prefix("usr/lib/"), "/usr/lib/")
+        self.assertEqual(directory_prefix("/usr/lib/**"), "/usr/lib/")
+        self.assertEqual(directory_prefix("/"), "/")
+
+    def test_not_directory_keys(self) -> None:
+        for key in ["/usr/lib", "bash", "*.so", "/usr/lib/*", "/usr/lib**"]:
+            self.assertIsNone(directory_prefix(key), key)
+
+
+@given(lib.bulk_content_files)
+class DjangoDirectorySearchTests(TestCase):
+    def test_directory_lookup_is_indexed(self, fixtures: Fixtures) -> None:
+        lookups = django_orm.prefix_lookups("path", "/usr/lib/")
+
+        plan = models.Directory.objects.filter(**lookups).explain()
+
+        self.assertIn("INDEX", plan)
+
+
+@given(lib.bulk_content_files)
+class DjangoSearchCountTests(TestCase):
+    def test_counts_in_database(self, fixtures: Fixtures) -> None:
+        files = django_orm.ContentFiles()
+        files.bulk_save(fixtures.bulk_content_files)
+
+        with CaptureQueriesContext(connection) as context:
+            count = files.search_count("bash", group_by=SearchGroup.BUILD)
+
+        self.assertEqual(
+            count.groups, {"lighthouse.34": 1, "polaris.26": 2, "polaris.27": 1}
+        )
+        [query] = context.captured_queries
+        self.assertIn("GROUP BY", query["sql"])
+
+    def test_counts_globs_in_database(self, fixtures: Fixtures) -> None:
+        files = django_orm.ContentFiles()
+        files.bulk_save(fixtures.bulk_content_files)
+
+        with CaptureQueriesContext(connection) as context:
+            count = files.search_count("b?s*")
+
+        self.assertEqual(count.total, 4)
+        [query] = context.captured_queries
+        self.assertIn("COUNT(", query["sql"])
+        self.assertIn("GLOB", query["sql"])
+
+    def test_matches_class_globs_in_python(self, fixtures: Fixtures) -> None:
+        files = django_orm.ContentFiles()
+        files.bulk_save(fixtures.bulk_content_files)
+
+        with CaptureQueriesContext(connection) as context:
+            count = files.search_count("*[kr]*")
+
+        self.assertEqual(count.total, 2)
+        [query] = context.captured_queries
+        self.assertNotIn("COUNT(", query["sql"])
+
+
+@given(lib.bulk_content_files)
+class DjangoTrigramSearchTests(TestCase):
+    def search(self, key: str) -> tuple[list[str], list[str]]:
+        with CaptureQueriesContext(connection) as context:
+            paths = [str(cf.path) for cf in django_orm.ContentFiles().search(key)]
+
+        return paths, [query["sql"] for query in context.captured_queries]
+
+    def test_contains_uses_trigram_table(self, fixtures: Fixtures) -> None:
+        django_orm.ContentFiles().bulk_save(fixtures.bulk_content_files)
+
+        paths, statements = self.search("*kel*")
+
+        self.assertEqual(paths, ["/etc/skel"])
+        self.assertTrue(any(django_orm.TRIGRAM_TABLE in sql for sql in statements))
+
+    def test_endswith_uses_reversed_basename(self, fixtures: Fixtures) -> None:
+        django_orm.ContentFiles().bulk_save(fixtures.bulk_content_files)
+
+        paths, statements = self.search("*ash")
+
+        self.assertEqual(paths, ["/bin/bash"] * 4)
+        self.assertTrue(any("reversed_basename" in sql for sql in statements))
+        self.assertFalse(any(django_orm.TRIGRAM_TABLE in sql for sql in statements))
+
+    def test_reversed_basename_lookup_is_indexed(self, fixtures: Fixtures) -> None:
+        lookups = django_orm.prefix_lookups("reversed_basename", "hsa")
+
+        plan = models.ContentFile.objects.filter(**lookups).explain()
+
+        self.assertIn("reversed_basename", plan)
+        self.assertIn("INDEX", plan)
+
+    def test_glob_uses_indexes(self, fixtures: Fixtures) -> None:
+        django_orm.ContentFiles().bulk_save(fixtures.bulk_content_files)
+
+        paths, statements = self.search("b*ash*")
+
+        self.assertEqual(paths, ["/bin/bash"] * 4)
+        [sql] = [sql for sql in statements if "gbp_fl_contentfile" in sql]
+        self.assertIn(django_orm.TRIGRAM_TABLE, sql)
+        self.assertIn('"gbp_fl_contentfile"."basename" >= ', sql)
+
+    def test_short_substring_does_not(self, fixtures: Fixtures) -> None:
+        django_orm.ContentFiles().bulk_save(fixtures.bulk_content_files)
+
+        paths, statements = self.search("*ta*")
+
+        self.assertEqual(paths, ["/bin/gtar"])
+        self.assertFalse(any(django_orm.TRIGRAM_TABLE in sql for sql in statements))
+
+    def test_trigram_table_follows_updates_and_deletes(
+        self, fixtures: Fixtures
+    ) -> None:
+        files = django_orm.ContentFiles()
+        files.bulk_save(fixtures.bulk_content_files)
+        skel = next(iter(files.search("skel")))
+
+        files.save(skel, path=Path("/etc/skeleton"))
+        self.assertEqual(self.search("*eleto*")[0], ["/etc/skeleton"])
+
+        files.deindex_build(skel.binpkg.build.machine, skel.binpkg.build.build_id)
+        self.assertEqual(self.search("*eleto*")[0], [])
+        self.assertEqual(self.search("*kel*")[0], [])
+
+    def test_falls_back_without_trigram_table(self, fixtures: Fixtures) -> None:
+        django_orm.ContentFiles().bulk_save(fixtures.bulk_content_files)
+
+        with mock.patch.object(django_orm, "TRIGRAM_TABLE", "bogus"):
+            paths, statements = self.search("*kel*")
+
+        self.assertEqual(paths, ["/etc/skel"])
+        self.assertFalse(any("bogus" in sql for sql in statements))
+
+
+@given(lib.content_file, lib.environ)
+@where(environ={"GBP_FL_RECORDS_BACKEND_DJANGO_BULK_BATCH_SIZE": "100"})
+class DjangoBulkSaveMemoryTests(TestCase):
+    def peak_memory(self, content_file: ContentFile, count: int) -> int:
+        # Vary the binpkg rather than the path. pathlib interns path components,
+        # which would count against us
+        binpkg = content_file.binpkg
+        content_files = (
+            replace(content_file, binpkg=replace(binpkg, build_id=i))
+            for i in range(count)
+        )
+        tracemalloc.start()
+        try:
+            django_orm.ContentFiles().bulk_save(content_files)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_peak_memory_is_bounded_by_batch_size(self, fixtures: Fixtures) -> None:
+        small = self.peak_memory(fixtures.content_file, 1_000)
+        models.ContentFile.objects.all().delete()
+        large = self.peak_memory(fixtures.content_file, 10_000)
+
+        self.assertEqual(models.ContentFile.objects.count(), 10_000)
+        self.assertLess(large, small * 2)
+
+
+@given(lib.bulk_content_files, lib.environ)
+@where(
+    environ={
+        "GBP_FL_RECORDS_BACKEND_DJANGO_BULK_BATCH_SIZE": "2",
+        "GBP_FL_RECORDS_BACKEND_DJANGO_INGEST": "copy",
+    }
+)
+class DjangoCopyIngestTests(TestCase):
+    def test_falls_back_to_insert(self, fixtures: Fixtures) -> None:
+        files = django_orm.ContentFiles()
+
+        files.bulk_save(fixtures.bulk_content_files)
+
+        self.assertEqual(files.count(None, None, None), 6)
+
+    def test_postgresql(self, fixtures: Fixtures) -> None:
+        copied: list[str] = []
+        mock_connection = mock.MagicMock(vendor="postgresql")
+        mock_connection.ops.quote_name = lambda name: f'"{name}"'
+        cursor = mock_connection.cursor.return_value.__enter__.return_value
+        copy = cursor.cursor.copy.return_value.__enter__.return_value
+        copy.write.side_effect = copied.append
+        psycopg_any = mock.Mock(is_psycopg3=True)
+        modules = {"django.db.backends.postgresql.psycopg_any": psycopg_any}
+
+        with (
+            mock.patch.object(django_orm, "connection", mock_connection),
+            mock.patch.dict(sys.modules, modules),
+        ):
+            django_orm.ContentFiles().bulk_save(fixtures.bulk_content_files)
+
+        statements = [c.args[0].split()[0] for c in cursor.execute.call_args_list]
+        self.assertEqual(statements, ["CREATE", "ALTER", "TRUNCATE", "INSERT"])
+        self.assertIn("ON CONFLICT", cursor.execute.call_args_list[-1].args[0])
+        self.assertEqual(cursor.cursor.copy.call_count, 3)
+        cursor.cursor.copy.assert_called_with(
+            'COPY "gbp_fl_contentfile_ingest" ("binpkg_id", "directory_id", "basename",'
+            ' "reversed_basename", "size", "timestamp") FROM STDIN'
+        )
+        self.assertEqual(len(copied), 3)
+        self.assertEqual("".join(copied).count("\n"), 6)
+
+
+@given(lib.postgresql, lib.content_file, lib.environ)
+@where(
+    environ={
+        "GBP_FL_RECORDS_BACKEND_DJANGO_BULK_BATCH_SIZE": "2",
+        "GBP_FL_RECORDS_BACKEND_DJANGO_INGEST": "copy",
+    }
+)
+class PostgreSQLCopyIngestTests(TestCase):
+    """Run copy_ingest()'s SQL against a real PostgreSQL server"""
+
+    def test_duplicate_rows(self, fixtures: Fixtures) -> None:
+        pg = fixtures.postgresql
+        content_file = fixtures.content_file
+        other = replace(content_file, path=Path("/bin/sh"))
+        content_files = [
+            content_file,
+            other,
+            replace(content_file, size=1),
+            replace(content_file, size=2),
+            replace(other, size=3),
+        ]
+        with pg.cursor() as cursor:
+            # A stand-in for the ContentFile table in the session's temporary schema
+            cursor.execute(
+                'CREATE TEMPORARY TABLE "gbp_fl_contentfile" ("id" BIGSERIAL,'
+                ' "binpkg_id" BIGINT, "directory_id" BIGINT, "basename" TEXT,'
+                ' "reversed_basename" TEXT, "size" INTEGER,'
+                ' "timestamp" TIMESTAMP WITH TIME ZONE,'
+                ' UNIQUE ("binpkg_id", "directory_id", "basename"))'
+            )
+
+        with mock.patch.object(django_orm, "connection", pg):
+            django_orm.ContentFiles().bulk_save(content_files)
+
+        with pg.cursor() as cursor:
+            cursor.execute(
+                'SELECT "basename", "size" FROM "gbp_fl_contentfile"'
+                ' ORDER BY "basename"'
+            )
+            rows = cursor.fetchall()
+
+        self.assertEqual(rows, [("bash", 2), ("sh", 3)])
+
+
+@given(lib.environ)
+@where(environ={"GBP_FL_RECORDS_BACKEND_DJANGO_INGEST": "bogus"})
+class DjangoInvalidIngestTests(TestCase):
+    def test(self, fixtures: Fixtures) -> None:
+        with self.assertRaises(ValueError):
+            django_orm.ContentFiles().bulk_save([])
+
+
+@given(lib.content_file)
+class CopyRowTests(TestCase):
+    def test(self, fixtures: Fixtures) -> None:
+        content_file = replace(fixtures.content_file, path=Path("/tmp/a\tb\\c\nd"))
+
+        ids = django_orm.RowIds(
+            binpkgs={django_orm.binpkg_key(content_file.binpkg): 1},
+            directories={"/tmp": 2},
+        )
+
+        row = django_orm.copy_row(content_file, ids)
+
+        self.assertTrue(row.endswith("\n"))
+        values = row[:-1].split("\t")
+        self.assertEqual(len(values), len(django_orm.INGEST_COLUMNS))
+        self.assertEqual(values[0], "1")
+        self.assertEqual(values[1], "2")
+        self.assertEqual(values[2], "a\\tb\\\\c\\nd")
+        self.assertEqual(values[3], "d\\nc\\\\b\\ta")
+
+    def test_unknown_size(self, fixtures: Fixtures) -> None:
+        content_file = replace(fixtures.content_file, size=None)
+        ids = django_orm.RowIds(
+            binpkgs={django_orm.binpkg_key(content_file.binpkg): 1},
+            directories={str(content_file.path.parent): 2},
+        )
+
+        row = django_orm.copy_row(content_file, ids)
+
+        size = row.split("\t")[django_orm.INGEST_COLUMNS.index("size")]
+        self.assertEqual(size, "\\N")
+
+
+@given(lib.bulk_content_files)
+class DjangoBlobContentFilesTests(TestCase):
+    def test_stores_a_row_per_package(self, fixtures: Fixtures) -> None:
+        files = django_blob.ContentFiles()
+
+        files.bulk_save(fixtures.bulk_content_files)
+
+        self.assertEqual(models.PackageContents.objects.count(), 5)
+        self.assertFalse(models.ContentFile.objects.exists())
+        contents = models.PackageContents.objects.get(
+            binpkg__build__machine="lighthouse"
+        )
+        self.assertEqual(contents.file_count, 2)
+
+    def test_bulk_save_merges_with_stored_files(self, fixtures: Fixtures) -> None:
+        files = django_blob.ContentFiles()
+        bash, skel = fixtures.bulk_content_files[:2]
+        files.bulk_save([bash])
+
+        files.bulk_save([skel, replace(bash, size=1)])
+
+        self.assertEqual(
+            list(files.for_package("lighthouse", "34", "app-shells/bash-5.2_p37-1")),
+            [replace(bash, size=1), skel],
+        )
+
+    def test_basename_index(self, fixtures: Fixtures) -> None:
+        files = django_blob.ContentFiles()
+        bash, skel = fixtures.bulk_content_files[:2]
+        files.bulk_save([bash, skel])
+
+        files.delete(skel)
+
+        self.assertEqual(
+            list(models.PackageBasename.objects.values_list("basename", flat=True)),
+            ["bash"],
+        )
+
+    def test_search_returns_only_matching_files(self, fixtures: Fixtures) -> None:
+        files = django_blob.ContentFiles()
+        files.bulk_save(fixtures.bulk_content_files)
+
+        result = list(files.search("skel"))
+
+        self.assertEqual([str(cf.path) for cf in result], ["/etc/skel"])
+
+    def test_delete_last_file_deletes_package(self, fixtures: Fixtures) -> None:
+        files = django_blob.ContentFiles()
+        gtar = fixtures.bulk_content_files[2]
+        files.bulk_save([gtar])
+
+        files.delete(gtar)
+
+        self.assertFalse(models.BinPkg.objects.exists())
+
+
+class DjangoBlobEncodeTests(TestCase):
+    def test_round_trip(self) -> None:
+        timestamp = dt.datetime(2025, 2, 16, 12, 0, 1, 5, tzinfo=lib.LOCAL_TIMEZONE)
+        files = {"/bin/bash": (850648, timestamp), "/etc/\tskel\n": (0, timestamp)}
+
+        self.assertEqual(django_blob.decode(django_blob.encode(files)), files)
+
 
 class ContentFilesBackendTests(TestCase):
     def test_gets_given_backend(self) -> None:
@@ -0,0 +1,202 @@
+"""Tests for the scheduler module"""
+
+# pylint: disable=missing-docstring,unused-argument
+import threading
+from unittest import TestCase, mock
+
+from unittest_fixtures import Fixtures, given, where
+
+from gbp_fl import scheduler
+from gbp_fl.types import Build
+
+from . import lib
+
+BUILD = Build(machine="babette", build_id="1505")
+
+
+def make_scheduler(
+    max_workers: int = 4, max_workers_per_build: int = 2, queue_size: int = 4
+) -> scheduler.IndexScheduler:
+    return scheduler.IndexScheduler(
+        max_workers=max_workers,
+        max_workers_per_build=max_workers_per_build,
+        queue_size=queue_size,
+    )
+
+
+class IndexSchedulerTests(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.scheduler = make_scheduler()
+        self.addCleanup(self.scheduler.shutdown)
+
+    def test_run(self) -> None:
+        processed: list[int] = []
+
+        completed = self.scheduler.run(BUILD, processed.append, range(20))
+
+        self.assertTrue(completed)
+        self.assertEqual(sorted(processed), list(range(20)))
+        self.assertEqual(self.scheduler.jobs, {})
+
+    def test_concurrency_is_bounded_per_build(self) -> None:
+        lock = threading.Lock()
+        running = 0
+        max_running = 0
+        barrier = threading.Event()
+
+        def func(_item: int) -> None:
+            nonlocal running, max_running
+
+            with lock:
+                running += 1
+                max_running = max(max_running, running)
+            barrier.wait(0.01)
+            with lock:
+                running -= 1
+
+        self.scheduler.run(BUILD, func, range(20))
+
+        self.assertLessEqual(max_running, 2)
+
+    def test_failed_tasks_do_not_stop_the_build(self) -> None:
+        processed: list[int] = []
+
+        def func(item: int) -> None:
+            if item == 3:
+                raise ValueError(item)
+            processed.append(item)
+
+        with self.assertLogs("gbp_fl.scheduler", level="ERROR"):
+            completed = self.scheduler.run(BUILD, func, range(10))
+
+        self.assertTrue(completed)
+        self.assertEqual(len(processed), 9)
+
+    def test_cancel(self) -> None:
+        started = threading.Event()
+        proceed = threading.Event()
+        self.addCleanup(proceed.set)
+        processed: list[int] = []
+
+        def func(item: int) -> None:
+            started.set()
+            proceed.wait()
+            processed.append(item)
+
+        result: list[bool] = []
+        thread = threading.Thread(
+            target=lambda: result.append(self.scheduler.run(BUILD, func, range(100)))
+        )
+        thread.start()
+        started.wait()
+
+        self.assertFalse(self.scheduler.jobs[BUILD].cancelled.is_set())
+
+        threading.Timer(0.05, proceed.set).start()
+        self.assertTrue(self.scheduler.cancel(BUILD))
+        thread.join()
+
+        self.assertEqual(result, [False])
+        self.assertLess(len(processed), 100)
+        self.assertEqual(self.scheduler.jobs, {})
+
+    def test_run_job(self) -> None:
+        processed: list[int] = []
+
+        with self.scheduler.job(BUILD) as job:
+            completed = self.scheduler.run_job(job, processed.append, range(5))
+
+        self.assertTrue(completed)
+        self.assertEqual(sorted(processed), list(range(5)))
+
+    def test_acquire_worker(self) -> None:
+        with self.scheduler.job(BUILD) as job:
+            for _ in range(4):
+                self.assertTrue(self.scheduler.acquire_worker(job))
+
+            threading.Timer(0.05, self.scheduler.release_worker).start()
+            self.assertTrue(self.scheduler.acquire_worker(job))
+
+    def test_acquire_worker_when_cancelled(self) -> None:
+        with self.scheduler.job(BUILD) as job:
+            for _ in range(4):
+                self.scheduler.acquire_worker(job)
+
+            threading.Timer(0.05, job.cancelled.set).start()
+            self.assertFalse(self.scheduler.acquire_worker(job))
+
+    def test_acquire_worker_when_cancel_check(self) -> None:
+        with (
+            mock.patch.object(scheduler, "CANCEL_CHECK_INTERVAL", 0),
+            self.scheduler.job(BUILD, cancel_check=lambda: True) as job,
+        ):
+            self.assertFalse(self.scheduler.acquire_worker(job))
+            self.assertTrue(job.cancelled.is_set())
+
+    def test_cancel_check(self) -> None:
+        processed: list[int] = []
+        deleted = threading.Event()
+
+        def func(item: int) -> None:
+            processed.append(item)
+            if item == 5:
+                deleted.set()
+
+        with (
+            mock.patch.object(scheduler, "CANCEL_CHECK_INTERVAL", 0),
+            self.scheduler.job(BUILD, cancel_check=deleted.is_set) as job,
+        ):
+            completed = self.scheduler.run_job(job, func, range(100))
+
+        self.assertFalse(completed)
+        self.assertLess(len(processed), 100)
+
+    def test_cancel_check_interval(self) -> None:
+        cancel_check = mock.Mock(return_value=True)
+
+        with self.scheduler.job(BUILD, cancel_check=cancel_check) as job:
+            completed = self.scheduler.run_job(job, lambda _: None, range(5))
+
+        self.assertTrue(completed)
+        cancel_check.assert_not_called()
+
+    def test_cancel_when_not_indexing(self) -> None:
+        self.assertFalse(self.scheduler.cancel(BUILD))
+
+    def test_job_already_running(self) -> None:
+        with self.scheduler.job(BUILD):
+            with self.assertRaises(RuntimeError):
+                with self.scheduler.job(BUILD):
+                    pass
+
+
+@given(lib.environ)
+@where(
+    environ={
+        "GBP_FL_INDEX_MAX_WORKERS": "3",
+        "GBP_FL_INDEX_MAX_WORKERS_PER_BUILD": "2",
+        "GBP_FL_INDEX_QUEUE_SIZE": "5",
+    }
+)
+class GetSchedulerTests(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        scheduler.shutdown()
+        self.addCleanup(scheduler.shutdown)
+
+    def test(self, fixtures: Fixtures) -> None:
+        shared = scheduler.get_scheduler()
+
+        self.assertIs(scheduler.get_scheduler(), shared)
+        self.assertEqual(shared.executor._max_workers, 3)  # pylint: disable=W0212
+        self.assertEqual(shared.max_workers_per_build, 2)
+
+    def test_shutdown(self, fixtures: Fixtures) -> None:
+        shared = scheduler.get_scheduler()
+
+        with mock.patch.object(shared, "shutdown") as shutdown:
+            scheduler.shutdown(cancel=True)
+
+        shutdown.assert_called_once_with(cancel=True)
+        self.assertIsNot(scheduler.get_scheduler(), shared)
@@ -1,14 +1,18 @@
 # pylint: disable=missing-docstring,unused-argument
+import datetime as dt
 import logging
 import shutil
+from dataclasses import replace
 from pathlib import Path
-from unittest import TestCase
+from typing import Any
+from unittest import TestCase, mock
 
 import gbp_testkit.fixtures as testkit
 from unittest_fixtures import Fixtures, fixture, given, params, where
 
-from gbp_fl import gateway
+from gbp_fl import gateway, signals
 from gbp_fl.records import Repo
+from gbp_fl.types import FileStats, MachineStats
 
 from . import lib
 
@@ -100,6 +104,63 @@ class PostDeleteTests(TestCase):
         self.assertEqual(repo.files.count(None, None, None), 3)
 
 
+@given(lib.stats)
+class CacheStatsTests(TestCase):
+    def cache(self, stats: FileStats, age: dt.timedelta = dt.timedelta()) -> None:
+        reconciled = dt.datetime.now(tz=dt.UTC) - age
+        gateway.gateway.set_cached_stats(replace(stats, reconciled=reconciled))
+
+    def test_applies_delta(self, fixtures: Fixtures) -> None:
+        stats: FileStats = fixtures.stats
+        self.cache(stats)
+
+        with (
+            mock.patch.object(gateway.gateway, "get_build_count", return_value=34),
+            mock.patch.object(gateway.gateway, "get_file_stats") as get_file_stats,
+        ):
+            signals.cache_stats(machine="polaris", build_id="34", file_delta=198)
+
+        get_file_stats.assert_not_called()
+        cached = gateway.gateway.get_cached_stats()
+        assert cached
+        self.assertEqual(cached.total, stats.total + 198)
+        self.assertEqual(
+            cached.by_machine["polaris"], MachineStats(total=9606000, build_count=34)
+        )
+
+    def test_reconciles_without_delta(self, fixtures: Fixtures) -> None:
+        self.cache(fixtures.stats)
+
+        self.assert_reconciles(None)
+
+    def test_reconciles_drift(self, fixtures: Fixtures) -> None:
+        self.cache(fixtures.stats)
+
+        self.assert_reconciles(-9605803)
+
+    def test_reconciles_never_reconciled(self, fixtures: Fixtures) -> None:
+        gateway.gateway.set_cached_stats(fixtures.stats)
+
+        self.assert_reconciles(198)
+
+    def test_reconciles_periodically(self, fixtures: Fixtures) -> None:
+        self.cache(fixtures.stats, age=dt.timedelta(hours=2))
+
+        self.assert_reconciles(198)
+
+    def assert_reconciles(self, file_delta: int | None) -> None:
+        reconciled = FileStats(total=1)
+        gbp = gateway.gateway
+
+        with mock.patch.object(gbp, "get_build_count", return_value=34):
+            with mock.patch.object(gbp, "get_file_stats", return_value=reconciled):
+                signals.cache_stats(
+                    machine="polaris", build_id="34", file_delta=file_delta
+                )
+
+        self.assertEqual(gbp.get_cached_stats(), reconciled, file_delta)
+
+
 @given(testkit.publisher, lib.gbp_package, binpkg, build_record=testkit.build_record)
 class GetPackageContentsTests(TestCase):
     def test(self, fixtures: Fixtures) -> None:
@@ -117,7 +178,7 @@ class RegisterSignalTests(TestCase):
         signal = f"gbp_fl_{fixtures.signal}"
         called = False
 
-        def handler(machine: str, build_id: str) -> None:
+        def handler(machine: str, build_id: str, **kwargs: Any) -> None:
             nonlocal called
 
             called = True
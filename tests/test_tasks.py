@@ -4,11 +4,14 @@
 # appropriate functions with the appropriate args
 # pylint: disable=missing-docstring
 
+from typing import Any
 from unittest import TestCase, mock
 
 from gentoo_build_publisher.cache import cache
 from unittest_fixtures import Fixtures, given
 
+from gbp_fl import scheduler
+from gbp_fl.package_utils import index_package
 from gbp_fl.worker import tasks
 
 from . import lib
@@ -16,7 +19,9 @@ from . import lib
 FL_CACHE = cache / "fl"
 
 
-@given(lib.build)
+@given(
+    lib.build, lib.repo, lib.bulk_content_files, lib.package, lib.gateway, lib.tarinfo
+)
 class IndexBuildTests(TestCase):
     @mock.patch("gbp_fl.gateway.GBPGateway.set_process")
     @mock.patch("gbp_fl.package_utils")
@@ -31,7 +36,8 @@ class IndexBuildTests(TestCase):
         set_process.assert_called_once_with(build, "index")
 
     @mock.patch("gbp_fl.gateway.GBPGateway.set_process")
-    def test_caches_stats(self, _: mock.Mock, fixtures: Fixtures) -> None:
+    @mock.patch("gbp_fl.package_utils")
+    def test_caches_stats(self, *_: mock.Mock, fixtures: Fixtures) -> None:
         build = fixtures.build
 
         FL_CACHE.delete("stats")
@@ -39,8 +45,81 @@ class IndexBuildTests(TestCase):
 
         self.assertTrue(FL_CACHE.contains("stats"))
 
+    @mock.patch("gbp_fl.gateway.GBPGateway.emit_signal")
+    @mock.patch("gbp_fl.package_utils")
+    def test_stores_build_stats(
+        self, package_utils: mock.Mock, emit_signal: mock.Mock, fixtures: Fixtures
+    ) -> None:
+        files = fixtures.repo.files
+        content_files = [
+            cf
+            for cf in fixtures.bulk_content_files
+            if cf.binpkg.build.id == "polaris.26"
+        ]
+
+        def index_build(*_args: Any) -> bool:
+            files.bulk_save(content_files)
+            return True
+
+        package_utils.index_build.side_effect = index_build
+
+        tasks.index_build("polaris", "26")
+
+        [stats] = files.get_build_stats("polaris", "26")
+        self.assertEqual(stats.file_count, 3)
+        self.assertIsNotNone(stats.index_duration)
+        emit_signal.assert_called_with(
+            "gbp_fl_postindex", machine="polaris", build_id="26", file_delta=3
+        )
+
+    @mock.patch("gbp_fl.gateway.GBPGateway.set_process")
+    @mock.patch("gbp_fl.gateway.GBPGateway.emit_signal")
+    def test_cancelled(
+        self, emit_signal: mock.Mock, *_: mock.Mock, fixtures: Fixtures
+    ) -> None:
+        build = fixtures.build
+        package = fixtures.package
+        mock_gw = fixtures.gateway
+        mock_gw.packages[build] = [package]
+        mock_gw.contents[build, package] = [fixtures.tarinfo]
+
+        def cancel_and_index(*args: Any, **kwargs: Any) -> None:
+            scheduler.get_scheduler().cancel(build, wait_for_job=False)
+            index_package(*args, **kwargs)
+
+        with (
+            mock.patch("gbp_fl.package_utils.gateway", new=mock_gw),
+            mock.patch(
+                "gbp_fl.package_utils.index_package", side_effect=cancel_and_index
+            ),
+        ):
+            tasks.index_build(build.machine, build.build_id)
+
+        self.assertEqual(fixtures.repo.files.get_build_stats(), [])
+        signals = [call.args[0] for call in emit_signal.call_args_list]
+        self.assertNotIn("gbp_fl_postindex", signals)
+
+    @mock.patch("gbp_fl.gateway.GBPGateway.build_exists", return_value=False)
+    @mock.patch("gbp_fl.package_utils")
+    def test_deleted_while_indexing(
+        self, package_utils: mock.Mock, *_: mock.Mock, fixtures: Fixtures
+    ) -> None:
+        files = fixtures.repo.files
+
+        def index_build(*_args: Any) -> bool:
+            # These were saved after deindex_build ran in another process
+            files.bulk_save(fixtures.bulk_content_files)
+            return False
 
-@given(lib.build)
+        package_utils.index_build.side_effect = index_build
+
+        tasks.index_build("polaris", "26")
+
+        self.assertEqual(files.count("polaris", "26", None), 0)
+        self.assertEqual(files.count("lighthouse", "34", None), 2)
+
+
+@given(lib.build, lib.repo, lib.bulk_content_files)
 class DeindexBuildTests(TestCase):
     @mock.patch("gbp_fl.gateway.GBPGateway.set_process")
     @mock.patch("gbp_fl.records.Repo.from_settings")
@@ -48,13 +127,23 @@ class DeindexBuildTests(TestCase):
         self, repo_from_settings: mock.Mock, set_process: mock.Mock, fixtures: Fixtures
     ) -> None:
         build = fixtures.build
+        repo = repo_from_settings.return_value
+        repo.files.get_build_stats.return_value = []
         tasks.deindex_build(build.machine, build.build_id)
 
-        repo = repo_from_settings.return_value
         repo.files.deindex_build.assert_called_once_with(build.machine, build.build_id)
 
         set_process.assert_called_once_with(build, "deindex")
 
+    @mock.patch("gbp_fl.scheduler.get_scheduler")
+    def test_cancels_indexing(
+        self, get_scheduler: mock.Mock, fixtures: Fixtures
+    ) -> None:
+        build = fixtures.build
+        tasks.deindex_build(build.machine, build.build_id)
+
+        get_scheduler.return_value.cancel.assert_called_once_with(build)
+
     def test_caches_stats(self, fixtures: Fixtures) -> None:
         build = fixtures.build
 
@@ -62,3 +151,15 @@ class DeindexBuildTests(TestCase):
         tasks.deindex_build(build.machine, build.build_id)
 
         self.assertTrue(FL_CACHE.contains("stats"))
+
+    @mock.patch("gbp_fl.gateway.GBPGateway.emit_signal")
+    def test_file_delta(self, emit_signal: mock.Mock, fixtures: Fixtures) -> None:
+        repo = fixtures.repo
+        repo.files.bulk_save(fixtures.bulk_content_files)
+        lib.update_build_stats(repo.files)
+
+        tasks.deindex_build("polaris", "26")
+
+        emit_signal.assert_called_with(
+            "gbp_fl_postdeindex", machine="polaris", build_id="26", file_delta=-3
+        )
@@ -1,7 +1,9 @@
 """Tests for gbp_fl.types"""
 
 # pylint: disable=missing-docstring
-from unittest import TestCase
+import datetime as dt
+from dataclasses import replace
+from unittest import TestCase, mock
 
 from unittest_fixtures import Fixtures, given, where
 
@@ -41,6 +43,7 @@ class FileStatsTests(TestCase):
         machine_counts = {"polaris": 4, "lighthouse": 1}
         files: ContentFiles = fixtures.repo.files
         files.bulk_save(content_files)
+        lib.update_build_stats(files)
 
         file_stats = FileStats.collect(files, machine_counts)
 
@@ -53,6 +56,85 @@ class FileStatsTests(TestCase):
         )
         self.assertEqual(file_stats, expected, file_stats)
 
+    def test_collect_counts_once(self, fixtures: Fixtures) -> None:
+        files: ContentFiles = fixtures.repo.files
+        files.bulk_save(fixtures.bulk_content_files)
+        lib.update_build_stats(files)
+
+        with mock.patch.object(
+            files, "get_build_stats", wraps=files.get_build_stats
+        ) as get_build_stats:
+            file_stats = FileStats.collect(files, {"polaris": 4, "babette": 2})
+
+        get_build_stats.assert_called_once_with()
+        expected = FileStats(
+            total=4,
+            by_machine={
+                "polaris": MachineStats(total=4, build_count=4),
+                "babette": MachineStats(total=0, build_count=2),
+            },
+        )
+        self.assertEqual(file_stats, expected, file_stats)
+
+    def test_collect_sets_reconciled(self, fixtures: Fixtures) -> None:
+        file_stats = FileStats.collect(fixtures.repo.files, {"polaris": 4})
+
+        self.assertIsNotNone(file_stats.reconciled)
+
+
+@given(lib.stats)
+class FileStatsApplyTests(TestCase):
+    def test_add(self, fixtures: Fixtures) -> None:
+        stats: FileStats = fixtures.stats
+
+        new = stats.apply("polaris", 198, 34)
+
+        self.assertEqual(new.total, stats.total + 198)
+        self.assertEqual(
+            new.by_machine["polaris"], MachineStats(total=9606000, build_count=34)
+        )
+        self.assertEqual(new.by_machine["lighthouse"], stats.by_machine["lighthouse"])
+
+    def test_remove(self, fixtures: Fixtures) -> None:
+        stats: FileStats = fixtures.stats
+
+        new = stats.apply("lighthouse", -343, 34)
+
+        self.assertEqual(new.total, stats.total - 343)
+        self.assertEqual(
+            new.by_machine["lighthouse"], MachineStats(total=9540000, build_count=34)
+        )
+
+    def test_new_machine(self, fixtures: Fixtures) -> None:
+        new = fixtures.stats.apply("babette", 10, 1)
+
+        self.assertEqual(list(new.by_machine), ["babette", "lighthouse", "polaris"])
+        self.assertEqual(
+            new.by_machine["babette"], MachineStats(total=10, build_count=1)
+        )
+
+    def test_drops_machine_without_builds(self, fixtures: Fixtures) -> None:
+        stats: FileStats = fixtures.stats
+
+        new = stats.apply("polaris", -9605802, 0)
+
+        self.assertEqual(list(new.by_machine), ["lighthouse"])
+        self.assertEqual(new.total, 9540343)
+
+    def test_keeps_reconciled(self, fixtures: Fixtures) -> None:
+        stats = replace(fixtures.stats, reconciled=dt.datetime.now(tz=dt.UTC))
+
+        self.assertEqual(stats.apply("polaris", 1, 33).reconciled, stats.reconciled)
+
+    def test_drift(self, fixtures: Fixtures) -> None:
+        stats: FileStats = fixtures.stats
+
+        with self.assertRaises(ValueError):
+            stats.apply("polaris", -9605803, 33)
+
+        with self.assertRaises(ValueError):
+            stats.apply("polaris", 1, 0)
+
 
 class MachineStatsTests(TestCase):
     def test_init(self) -> None:
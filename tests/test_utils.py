@@ -1,10 +1,26 @@
 """Tests for gbp_fl.utils"""
 
-from unittest import TestCase
+import io
+import shutil
+import subprocess as sp
+import tempfile
+from pathlib import Path
+from tarfile import REGTYPE, SYMTYPE, TarFile, TarInfo
+from typing import cast
+from unittest import TestCase, mock, skipUnless
 
-from gbp_fl.utils import Parsed, parse_pkgspec
+from gbp_fl import decompressors
+from gbp_fl.types import Package
+from gbp_fl.utils import (
+    Parsed,
+    format_size,
+    iter_members,
+    parse_contents,
+    parse_pkgspec,
+    read_package_contents,
+)
 
-# pylint: disable=missing-docstring
+# pylint: disable=missing-docstring,import-outside-toplevel
 
 
 class ParsePkgspecTests(TestCase):
@@ -25,3 +41,295 @@ class ParsePkgspecTests(TestCase):
 
     def test_invalid_pvb(self) -> None:
         self.assertIsNone(parse_pkgspec("jenkins-python/211/dev-python/?"))
+
+
+def make_gpkg(
+    path: Path,
+    pvb: str,
+    contents: str | None,
+    image_compression: str = "xz",
+    metadata_compression: str = "xz",
+) -> None:
+    """Create a (minimal) gpkg binpkg at the given path"""
+
+    def add(tarfile: TarFile, name: str, data: bytes) -> None:
+        info = TarInfo(name)
+        info.size = len(data)
+        tarfile.addfile(info, io.BytesIO(data))
+
+    def make_tarball(compression: str, files: dict[str, bytes]) -> bytes:
+        data = io.BytesIO()
+        mode = "w" if compression in ("", "zst") else f"w:{compression}"
+        with TarFile.open(mode=mode, fileobj=data) as tarfile:
+            for name, file_data in files.items():
+                add(tarfile, name, file_data)
+
+        return (
+            zstd_compress(data.getvalue()) if compression == "zst" else data.getvalue()
+        )
+
+    metadata = {"metadata/SLOT": b"0\n"}
+    if contents is not None:
+        metadata["metadata/CONTENTS"] = contents.encode()
+    image = {"image/usr/bin/foo": b"#!/bin/sh\n", "image/usr/lib/libfoo.so.1": b"ELF"}
+
+    with TarFile.open(path, "w") as gpkg:
+        add(gpkg, f"{pvb}/gpkg-1", b"")
+        add(
+            gpkg,
+            f"{pvb}/metadata.tar.{metadata_compression}",
+            make_tarball(metadata_compression, metadata),
+        )
+        suffix = f".{image_compression}" if image_compression else ""
+        add(gpkg, f"{pvb}/image.tar{suffix}", make_tarball(image_compression, image))
+
+
+def zstd_compress(data: bytes) -> bytes:
+    try:
+        from compression import zstd  # type: ignore[import-not-found]
+    except ImportError:
+        import zstandard  # pylint: disable=import-error
+
+        return zstandard.ZstdCompressor().compress(data)
+
+    return cast(bytes, zstd.compress(data))
+
+
+def have_zstd() -> bool:
+    try:
+        decompressors.zstd(io.BytesIO())
+    except decompressors.UnsupportedCompression:
+        return False
+    return True
+
+
+CONTENTS = """\
+dir /usr
+dir /usr/bin
+obj /usr/bin/foo d41d8cd98f00b204e9800998ecf8427e 1733595420
+dir /usr/lib
+obj /usr/lib/libfoo.so.1 d41d8cd98f00b204e9800998ecf8427e 1733595420
+sym /usr/lib/libfoo.so -> libfoo.so.1 1733595420
+obj /usr/share/doc/foo/READ ME d41d8cd98f00b204e9800998ecf8427e 1733595421
+"""
+PACKAGE = Package(
+    cpv="app-misc/foo-1.0", repo="gentoo", build_id=1, build_time=0, path="foo"
+)
+
+
+class ReadPackageContentsTests(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(tmpdir.cleanup)
+        self.path = Path(tmpdir.name, "foo-1.0-1.gpkg.tar")
+
+    def test_from_image(self) -> None:
+        make_gpkg(self.path, "foo-1.0-1", CONTENTS)
+
+        items = read_package_contents(self.path, PACKAGE)
+
+        names = {i.name for i in items}
+        self.assertEqual(names, {"image/usr/bin/foo", "image/usr/lib/libfoo.so.1"})
+
+    def test_identifier_not_first(self) -> None:
+        source = self.path.with_name("source.tar")
+        make_gpkg(source, "foo-1.0-1", CONTENTS)
+
+        with TarFile.open(source) as src, TarFile.open(self.path, "w") as dst:
+            members = src.getmembers()
+            # move the gpkg-1 identifier to the end
+            for member in [*members[1:], members[0]]:
+                dst.addfile(member, src.extractfile(member))
+
+        items = read_package_contents(self.path, PACKAGE)
+
+        names = {i.name for i in items}
+        self.assertEqual(names, {"image/usr/bin/foo", "image/usr/lib/libfoo.so.1"})
+
+    def test_plain_tarball(self) -> None:
+        with TarFile.open(self.path, "w") as tarfile:
+            for name in ["usr/bin/foo", "usr/lib/libfoo.so.1"]:
+                tarfile.addfile(TarInfo(name))
+
+        items = read_package_contents(self.path, PACKAGE)
+
+        names = [i.name for i in items]
+        self.assertEqual(names, ["usr/bin/foo", "usr/lib/libfoo.so.1"])
+
+    def test_from_contents(self) -> None:
+        make_gpkg(self.path, "foo-1.0-1", CONTENTS)
+
+        items = list(read_package_contents(self.path, PACKAGE, use_contents=True))
+
+        names = {i.name for i in items if not i.isdir()}
+        self.assertEqual(
+            names,
+            {
+                "image/usr/bin/foo",
+                "image/usr/lib/libfoo.so.1",
+                "image/usr/lib/libfoo.so",
+                "image/usr/share/doc/foo/READ ME",
+            },
+        )
+        self.assertTrue(all(i.size is None for i in items))
+
+    def test_from_contents_when_missing(self) -> None:
+        make_gpkg(self.path, "foo-1.0-1", None)
+
+        items = read_package_contents(self.path, PACKAGE, use_contents=True)
+
+        self.assertEqual(
+            {(i.name, i.size) for i in items},
+            {("image/usr/bin/foo", 10), ("image/usr/lib/libfoo.so.1", 3)},
+        )
+
+    @skipUnless(have_zstd(), "zstd is not available")
+    def test_zstd(self) -> None:
+        make_gpkg(
+            self.path,
+            "foo-1.0-1",
+            CONTENTS,
+            image_compression="zst",
+            metadata_compression="zst",
+        )
+
+        items = read_package_contents(self.path, PACKAGE)
+
+        self.assertEqual(
+            {(i.name, i.size) for i in items},
+            {("image/usr/bin/foo", 10), ("image/usr/lib/libfoo.so.1", 3)},
+        )
+
+    @skipUnless(have_zstd(), "zstd is not available")
+    def test_zstd_from_contents(self) -> None:
+        make_gpkg(
+            self.path,
+            "foo-1.0-1",
+            CONTENTS,
+            image_compression="zst",
+            metadata_compression="zst",
+        )
+
+        items = read_package_contents(self.path, PACKAGE, use_contents=True)
+
+        self.assertEqual(len([i for i in items if not i.isdir()]), 4)
+
+    @skipUnless(shutil.which("xz"), "xz is not installed")
+    def test_external_decompressor(self) -> None:
+        make_gpkg(self.path, "foo-1.0-1", CONTENTS)
+
+        with mock.patch.object(sp, "Popen", wraps=sp.Popen) as popen:
+            items = list(
+                read_package_contents(self.path, PACKAGE, external_decompress_size=1)
+            )
+
+        popen.assert_called_once()
+        self.assertEqual(
+            {(i.name, i.size) for i in items},
+            {("image/usr/bin/foo", 10), ("image/usr/lib/libfoo.so.1", 3)},
+        )
+
+    def test_external_decompressor_below_threshold(self) -> None:
+        make_gpkg(self.path, "foo-1.0-1", CONTENTS)
+        size = 1024 * 1024
+
+        with mock.patch.object(sp, "Popen", wraps=sp.Popen) as popen:
+            items = list(
+                read_package_contents(self.path, PACKAGE, external_decompress_size=size)
+            )
+
+        popen.assert_not_called()
+        self.assertEqual(len(items), 2)
+
+    def test_from_contents_when_image_not_compressed(self) -> None:
+        make_gpkg(self.path, "foo-1.0-1", CONTENTS, image_compression="")
+
+        items = read_package_contents(self.path, PACKAGE, use_contents=True)
+
+        self.assertEqual(
+            {(i.name, i.size) for i in items},
+            {("image/usr/bin/foo", 10), ("image/usr/lib/libfoo.so.1", 3)},
+        )
+
+    def test_from_contents_size_lookup(self) -> None:
+        make_gpkg(self.path, "foo-1.0-1", CONTENTS)
+        size = 1024 * 1024
+
+        items = read_package_contents(
+            self.path, PACKAGE, use_contents=True, size_lookup_size=size
+        )
+
+        self.assertEqual(
+            {(i.name, i.size) for i in items},
+            {("image/usr/bin/foo", 10), ("image/usr/lib/libfoo.so.1", 3)},
+        )
+
+    def test_from_contents_above_size_lookup(self) -> None:
+        make_gpkg(self.path, "foo-1.0-1", CONTENTS)
+
+        items = read_package_contents(
+            self.path, PACKAGE, use_contents=True, size_lookup_size=1
+        )
+
+        self.assertEqual(len([i for i in items if not i.isdir()]), 4)
+
+
+class ParseContentsTests(TestCase):
+    def test(self) -> None:
+        items = list(parse_contents(io.BytesIO(CONTENTS.encode())))
+
+        self.assertEqual(len(items), 7)
+
+        sym = items[5]
+        self.assertEqual(sym.name, "image/usr/lib/libfoo.so")
+        self.assertEqual(sym.type, SYMTYPE)
+        self.assertEqual(sym.mtime, 1733595420)
+
+        obj = items[6]
+        self.assertEqual(obj.name, "image/usr/share/doc/foo/READ ME")
+        self.assertEqual(obj.type, REGTYPE)
+        self.assertEqual(obj.mtime, 1733595421)
+
+        self.assertTrue(items[0].isdir())
+        self.assertIsNone(obj.size)
+
+
+class FormatSizeTests(TestCase):
+    def test(self) -> None:
+        self.assertEqual(format_size(850648), "850648")
+        self.assertEqual(format_size(0), "0")
+        self.assertEqual(format_size(None), "?")
+
+
+class IterMembersTests(TestCase):
+    def test_does_not_retain_members(self) -> None:
+        path = Path(__file__).parent / "assets/sys-libs/mtdev/mtdev-1.1.7-1.gpkg.tar"
+        names = []
+
+        with TarFile.open(path) as tarfile:
+            for member in iter_members(tarfile):
+                names.append(member.name)
+                self.assertEqual(tarfile.members, [])
+
+        self.assertEqual(len(names), 4)
+        self.assertEqual(names[0], "mtdev-1.1.7-1/gpkg-1")
+
+    def test_tarfile_members(self) -> None:
+        # iter_members() relies on these CPython TarFile implementation details
+        path = Path(__file__).parent / "assets/sys-libs/mtdev/mtdev-1.1.7-1.gpkg.tar"
+
+        with TarFile.open(path) as tarfile:
+            first = tarfile.next()
+            assert first is not None
+            self.assertEqual(tarfile.members, [first])
+
+            tarfile.members.clear()
+            second = tarfile.next()
+            assert second is not None
+            self.assertEqual(second.name, "mtdev-1.1.7-1/metadata.tar.xz")
+
+            tarfile.members.clear()
+            fp = tarfile.extractfile(second)
+            assert fp is not None
+            self.assertEqual(len(fp.read()), second.size)